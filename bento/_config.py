@@ -29,6 +29,7 @@ _DEBUG_YACC = 0
 _SUB_BUILD_DIR = "bento"
 
 CONFIGURED_STATE_DUMP = os.path.join(_SUB_BUILD_DIR, ".config.bin")
+CONFIGURE_FINGERPRINT = os.path.join(_SUB_BUILD_DIR, ".configure_fingerprint")
 DB_FILE = os.path.join(_SUB_BUILD_DIR, "cache.db")
 DISTCHECK_DIR = os.path.join(_SUB_BUILD_DIR, "distcheck")
 IPKG_PATH = os.path.join(_SUB_BUILD_DIR, "ipkg.info")
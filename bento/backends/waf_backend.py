@@ -56,6 +56,9 @@ from bento.commands.options \
 from bento.commands.command_contexts \
     import \
         ConfigureContext, BuildContext
+from bento.commands.build_yaku \
+    import \
+        create_object_cache, close_object_cache
 
 WAF_TOP = os.path.join(WAFDIR, os.pardir)
 
@@ -198,8 +201,8 @@ class ConfigureWafContext(ConfigureContext):
         ConfigureContext.post_recurse(self)
 
     def finish(self):
-        super(ConfigureWafContext, self).finish()
         self.waf_context.store()
+        super(ConfigureWafContext, self).finish()
 
 def ext_name_to_path(name):
     """Convert extension name to path - the path does not include the
@@ -261,6 +264,80 @@ def apply_register_outputs(self):
     name = translate_name(self.target, ref_node, bento_context.top_node)
     self.bld.register_outputs(category, name, self.link_task.outputs)
 
+def _cached_exec_command(exec_command):
+    def _exec_command(self, cmd, **kw):
+        bld = self.generator.bld
+        object_cache = getattr(bld, "object_cache", None)
+        if object_cache is None or not isinstance(cmd, list):
+            return exec_command(self, cmd, **kw)
+
+        # Same default as waflib.Task.TaskBase.exec_command
+        cwd = kw.get("cwd", None)
+        if not cwd:
+            cwd = getattr(bld, "cwd", bld.variant_dir)
+        ret = []
+        def _run():
+            # waf prints the command output itself: it is not cached
+            ret.append(exec_command(self, cmd, **kw))
+            return ret[0], None
+        outputs = [n.abspath() for n in self.outputs]
+        if object_cache.run(cmd, outputs, _run, cwd, kw.get("env", None)) is not None:
+            tracer = getattr(bld, "tracer", None)
+            if tracer is not None:
+                tracer.add_instant("object cache hit", "cache", {"task": str(self).strip()})
+            return 0
+        else:
+            return ret[0]
+    return _exec_command
+
+def enable_object_cache():
+    """Make waf c and cxx tasks go through the build context object_cache."""
+    from waflib.Tools import c, cxx
+    for klass in [c.c, cxx.cxx]:
+        if not getattr(klass, "_bento_object_cache", False):
+            klass.exec_command = _cached_exec_command(klass.exec_command)
+            klass._bento_object_cache = True
+
+def _task_tracer(task):
+    return getattr(getattr(task.generator, "bld", None), "tracer", None)
+
+def _traced_process(process):
+    def _process(self):
+        tracer = _task_tracer(self)
+        if tracer is None:
+            return process(self)
+        return tracer.span(str(self).strip(), "task", process, self)
+    return _process
+
+def _traced_exec_command(exec_command):
+    def _exec_command(self, cmd, **kw):
+        tracer = _task_tracer(self)
+        if tracer is None:
+            return exec_command(self, cmd, **kw)
+        if isinstance(cmd, list):
+            name = os.path.basename(str(cmd[0]))
+            args = {"cmd": " ".join([str(c) for c in cmd])}
+        else:
+            name = cmd.split(" ", 1)[0]
+            args = {"cmd": cmd}
+        start = tracer.now()
+        try:
+            return exec_command(self, cmd, **kw)
+        finally:
+            tracer.add_span(name, "subprocess", start, tracer.now(), args)
+    return _exec_command
+
+def enable_tracing():
+    """Record a span for every waf task and command in the build context
+    tracer. Must be called before enable_object_cache, so that commands
+    skipped thanks to the object cache are not recorded."""
+    from waflib import Task
+    klass = Task.TaskBase
+    if not getattr(klass, "_bento_tracing", False):
+        klass.process = _traced_process(klass.process)
+        klass.exec_command = _traced_exec_command(klass.exec_command)
+        klass._bento_tracing = True
+
 class BuildWafContext(BuildContext):
     def pre_recurse(self, local_node):
         super(BuildWafContext, self).pre_recurse(local_node)
@@ -318,6 +395,12 @@ class BuildWafContext(BuildContext):
         if self.progress_bar:
             waf_context.progress_bar = 1
         waf_context.bento_context = self
+        waf_context.tracer = self.tracer
+        if waf_context.tracer is not None:
+            enable_tracing()
+        waf_context.object_cache = create_object_cache(o)
+        if waf_context.object_cache is not None:
+            enable_object_cache()
         self.waf_context = waf_context
 
         def _default_extension_builder(extension, **kw):
@@ -372,6 +455,8 @@ class BuildWafContext(BuildContext):
     def finish(self):
         super(BuildWafContext, self).finish()
         self.waf_context.store()
+        if self.waf_context.object_cache is not None:
+            close_object_cache(self.waf_context.object_cache)
 
 class WafBackend(AbstractBackend):
     def register_command_contexts(self, context):
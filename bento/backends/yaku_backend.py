@@ -1,8 +1,9 @@
+import os
 import os.path as op
 
 from bento.utils.utils \
     import \
-        extract_exception
+        extract_exception, pprint
 from bento.core.node_package \
     import \
         translate_name
@@ -21,6 +22,19 @@ from bento.backends.core \
 
 import yaku.context
 import yaku.errors
+import yaku.conf_cache
+import yaku.utils
+
+def create_conf_cache(options):
+    """Create the configuration checks cache from the parsed configure
+    options, or return None if it is not enabled."""
+    if not getattr(options, "conf_cache", None):
+        return None
+    if options.conf_cache_size:
+        max_size = options.conf_cache_size * 1024 ** 2
+    else:
+        max_size = yaku.conf_cache.DEFAULT_MAX_SIZE
+    return yaku.conf_cache.ConfCheckCache(options.conf_cache, max_size)
 
 class ConfigureYakuContext(ConfigureContext):
     def __init__(self, global_context, cmd_argv, options_context, pkg, run_node):
@@ -29,6 +43,10 @@ class ConfigureYakuContext(ConfigureContext):
         source_path = run_node._ctx.srcnode.path_from(run_node)
         self.yaku_context = yaku.context.get_cfg(src_path=source_path, build_path=build_path)
 
+        o, a = options_context.parser.parse_args(cmd_argv)
+        self.yaku_context.conf_cache = create_conf_cache(o)
+        self.yaku_context.tracer = self.tracer
+
     def configure(self):
         extensions = get_extensions(self.pkg, self.run_node)
         libraries = get_compiled_libraries(self.pkg, self.run_node)
@@ -42,9 +60,22 @@ class ConfigureYakuContext(ConfigureContext):
                     e = extract_exception()
                     raise ConfigurationError(str(e))
 
+    def configured_tools(self):
+        tools = set()
+        for name, value in self.yaku_context.env.items():
+            if yaku.conf_cache.is_tool_var(name) and isinstance(value, list) and value:
+                path = yaku.utils.find_program(value[0])
+                if path is not None:
+                    tools.add(os.path.realpath(path))
+        return sorted(tools)
+
     def finish(self):
-        super(ConfigureYakuContext, self).finish()
         self.yaku_context.store()
+        conf_cache = self.yaku_context.conf_cache
+        if conf_cache is not None:
+            conf_cache.close()
+            pprint("PINK", conf_cache.summary())
+        super(ConfigureYakuContext, self).finish()
 
     def pre_recurse(self, local_node):
         super(ConfigureYakuContext, self).pre_recurse(local_node)
@@ -58,7 +89,8 @@ class ConfigureYakuContext(ConfigureContext):
 
 class BuildYakuContext(BuildContext):
     def __init__(self, global_context, cmd_argv, options_context, pkg, run_node):
-        from bento.commands.build_yaku import build_extension, build_compiled_library
+        from bento.commands.build_yaku import build_extension, build_compiled_library, \
+            create_object_cache
 
         super(BuildYakuContext, self).__init__(global_context, cmd_argv, options_context, pkg, run_node)
         build_path = run_node._ctx.bldnode.path_from(run_node)
@@ -72,6 +104,8 @@ class BuildYakuContext(BuildContext):
             jobs = 1
         self.verbose = o.verbose
         self.jobs = jobs
+        self.yaku_context.object_cache = create_object_cache(o)
+        self.yaku_context.tracer = self.tracer
 
         def _builder_factory(category, builder):
             def _build(extension, include_dirs=None, **kw):
@@ -99,8 +133,12 @@ class BuildYakuContext(BuildContext):
             _builder_factory("compiled_libraries", build_compiled_library))
 
     def finish(self):
+        from bento.commands.build_yaku import close_object_cache
+
         super(BuildYakuContext, self).finish()
         self.yaku_context.store()
+        if self.yaku_context.object_cache is not None:
+            close_object_cache(self.yaku_context.object_cache)
 
     def compile(self):
         super(BuildYakuContext, self).compile()
@@ -23,9 +23,11 @@ class SectionWriter(object):
     def __init__(self):
         self.sections = {}
 
-    def store(self, filename, pkg):
+    def store(self, filename, pkg, src_root_node=None):
         meta = ipkg_meta_from_pkg(pkg)
         p = BuildManifest(self.sections, meta, pkg.executables)
+        if src_root_node is not None:
+            p.update_file_digests(src_root_node)
         if not op.exists(op.dirname(filename)):
             os.makedirs(op.dirname(filename))
         p.write(filename)
@@ -43,7 +45,16 @@ Usage:   bentomaker build [OPTIONS]."""
                                   dest="jobs"),
                            Option("-v", "--verbose",
                                   help="Verbose output (yaku build only)",
-                                  action="store_true")]
+                                  action="store_true"),
+                           Option("--object-cache",
+                                  help="Directory of a compiled objects cache shared between builds",
+                                  dest="object_cache"),
+                           Option("--object-cache-size",
+                                  help="Maximum size of the compiled objects cache (in MB)",
+                                  dest="object_cache_size", type="int"),
+                           Option("--byte-compile",
+                                  help="Byte-compile the python files (hash-based pyc with python >= 3.7)",
+                                  action="store_true", dest="byte_compile")]
 
     def run(self, ctx):
         p = ctx.options_context.parser
@@ -53,12 +64,18 @@ Usage:   bentomaker build [OPTIONS]."""
             return
 
         ctx.compile()
+        if o.byte_compile:
+            if o.jobs:
+                jobs = int(o.jobs)
+            else:
+                jobs = None
+            ctx.byte_compile(jobs)
         ctx.post_compile()
 
     def finish(self, ctx):
         super(BuildCommand, self).finish(ctx)
         n = ctx.build_node.make_node(IPKG_PATH)
-        ctx.section_writer.store(n.abspath(), ctx.pkg)
+        ctx.section_writer.store(n.abspath(), ctx.pkg, ctx.build_node)
 
 def _config_content(paths):
     keys = sorted(paths.keys())
@@ -1,6 +1,7 @@
 import os
-import warnings
-
+import time
+import zlib
+import zipfile
 from bento._config \
     import \
         IPKG_PATH
@@ -10,18 +11,25 @@ from bento.commands.core \
 from bento.commands.egg_utils \
     import \
         EggInfo, egg_filename
-from bento.utils.utils import pprint, extract_exception
+from bento.utils.os2 \
+    import \
+        rename
+from bento.utils.archive \
+    import \
+        ZipWriter, deflate, read_raw_member
+from bento.utils.parallel \
+    import \
+        ThreadPool
 from bento.core \
     import \
         PackageMetadata
-from bento.private.bytecode \
+from bento.commands.bytecode_utils \
     import \
-        bcompile, PyCompileError
+        compile_files
 from bento.installed_package_description \
     import \
-        BuildManifest, iter_files
+        BuildManifest
 
-import bento.compat.api as compat
 import bento.utils.path
 
 class BuildEggCommand(Command):
@@ -33,7 +41,10 @@ Usage:   bentomaker build_egg [OPTIONS]"""
                         + [Option("--output-dir",
                                   help="Output directory", default="dist"),
                            Option("--output-file",
-                                  help="Output filename")]
+                                  help="Output filename"),
+                           Option("-j", "--jobs",
+                                  help="Number of parallel jobs (default: number of CPUs)",
+                                  dest="jobs", type="int")]
 
     def run(self, ctx):
         argv = ctx.command_argv
@@ -47,9 +58,129 @@ Usage:   bentomaker build_egg [OPTIONS]"""
 
         n = ctx.build_node.make_node(IPKG_PATH)
         build_manifest = BuildManifest.from_file(n.abspath())
-        build_egg(build_manifest, ctx.build_node, ctx.build_node, output_dir, output_file)
+        build_egg(build_manifest, ctx.build_node, ctx.build_node, output_dir, output_file, o.jobs)
+
+def _read_previous_egg(egg):
+    """Return the {name: ZipInfo} members of the previous egg, if any."""
+    if not os.path.exists(egg):
+        return {}
+    try:
+        zid = zipfile.ZipFile(egg)
+        try:
+            return dict([(info.filename, info) for info in zid.infolist()])
+        finally:
+            zid.close()
+    except Exception:
+        # Not reusing anything from an unreadable egg is always correct
+        return {}
+
+_CHUNK_SIZE = 2 ** 16
+
+def _read(filename):
+    fid = open(filename, "rb")
+    try:
+        return fid.read()
+    finally:
+        fid.close()
+
+def _crc32(filename):
+    crc = 0
+    fid = open(filename, "rb")
+    try:
+        while True:
+            chunk = fid.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    finally:
+        fid.close()
+    return crc & 0xffffffff
+
+class _EggMember(object):
+    def __init__(self, name, data=None, date_time=None, external_attr=0, crc=None, info=None,
+                 filename=None):
+        self.name = name.replace(os.sep, "/")
+        self.data = data
+        self.date_time = date_time
+        self.external_attr = external_attr
+        self.crc = crc
+        # ZipInfo of the identical member in the previous egg, if any
+        self.info = info
+        # File read when the member is written, if data is None
+        self.filename = filename
+
+def _can_copy_raw(info):
+    # Only deflated, unencrypted members can be copied as is
+    return info is not None and info.compress_type == zipfile.ZIP_DEFLATED \
+            and not info.flag_bits & 0x1
+
+def _reusable(info, size, crc):
+    return _can_copy_raw(info) and info.file_size == size and info.CRC == crc
 
-def build_egg(build_manifest, build_node, source_root, output_dir=None, output_file=None):
+def _egg_member(name, data, date_time, external_attr, previous):
+    """Create a member for data, reusing the member of the previous egg if
+    the content did not change."""
+    crc = zlib.crc32(data) & 0xffffffff
+    info = previous.get(name.replace(os.sep, "/"), None)
+    if _reusable(info, len(data), crc):
+        return _EggMember(name, info=info)
+    else:
+        return _EggMember(name, data, date_time, external_attr, crc)
+
+def _egg_file_member(name, filename, previous):
+    """Like _egg_member for the content of filename, which is only read
+    again when the member is written."""
+    st = os.stat(filename)
+    crc = _crc32(filename)
+    info = previous.get(name.replace(os.sep, "/"), None)
+    if _reusable(info, st.st_size, crc):
+        return _EggMember(name, info=info)
+    else:
+        return _EggMember(name, None, time.localtime(st.st_mtime)[:6],
+                          (st.st_mode & int("177777", 8)) << 16, filename=filename)
+
+def _deflate_member(member):
+    if member.data is None:
+        return deflate(_read(member.filename))
+    else:
+        return deflate(member.data, member.crc)
+
+def write_egg(egg, members, previous_egg=None, jobs=None):
+    """Write members into egg. Members to be reused from the previous egg
+    are copied without being decompressed, others are read and compressed
+    in parallel."""
+    pool = ThreadPool(jobs)
+    try:
+        if previous_egg is not None and os.path.exists(previous_egg):
+            previous_fid = open(previous_egg, "rb")
+        else:
+            previous_fid = None
+        try:
+            tmp = egg + ".tmp"
+            fid = open(tmp, "wb")
+            try:
+                writer = ZipWriter(fid)
+                compressed = pool.imap(_deflate_member, [m for m in members if m.info is None])
+                for member in members:
+                    info = member.info
+                    if info is None:
+                        crc, size, data = next(compressed)
+                        writer.add(member.name, crc, size, data, member.date_time, member.external_attr)
+                    else:
+                        writer.add(member.name, info.CRC, info.file_size,
+                                   read_raw_member(previous_fid, info), info.date_time,
+                                   info.external_attr)
+                writer.close()
+            finally:
+                fid.close()
+        finally:
+            if previous_fid is not None:
+                previous_fid.close()
+        rename(tmp, egg)
+    finally:
+        pool.close()
+
+def build_egg(build_manifest, build_node, source_root, output_dir=None, output_file=None, jobs=None):
     meta = PackageMetadata.from_ipkg(build_manifest)
     egg_info = EggInfo.from_ipkg(build_manifest, build_node)
 
@@ -70,23 +201,52 @@ def build_egg(build_manifest, build_node, source_root, output_dir=None, output_f
                   "eprefix": source_root.abspath(),
                   "sitedir": source_root.abspath()}
 
-    zid = compat.ZipFile(egg, "w", compat.ZIP_DEFLATED)
-    try:
-        for filename, cnt in egg_info.iter_meta(build_node):
-            zid.writestr(os.path.join("EGG-INFO", filename), cnt)
-
-        for kind, source, target in build_manifest.iter_built_files(source_root, egg_scheme):
-            if not kind in ["executables"]:
-                zid.write(source.abspath(), target.path_from(source_root))
-            if kind == "pythonfiles":
-                try:
-                    bytecode = bcompile(source.abspath())
-                except PyCompileError:
-                    e = extract_exception()
-                    warnings.warn("Error byte-compiling %r" % source.abspath())
-                else:
-                    zid.writestr("%sc" % target.path_from(source_root), bcompile(source.abspath()))
-    finally:
-        zid.close()
+    # Members whose content did not change since the last build are copied
+    # from the previous egg
+    previous = _read_previous_egg(egg)
+
+    members = []
+    now = time.localtime(time.time())[:6]
+    for filename, cnt in egg_info.iter_meta(build_node):
+        if not isinstance(cnt, bytes):
+            cnt = cnt.encode("utf-8")
+        members.append(_egg_member(os.path.join("EGG-INFO", filename), cnt, now,
+                                   int("600", 8) << 16, previous))
+
+    # bytecode member -> source filename, for bytecode to be compiled
+    to_compile = {}
+    for kind, source, target in build_manifest.iter_built_files(source_root, egg_scheme):
+        if kind == "bytecode":
+            # The egg bytecode is compiled below, consistently with the
+            # member dates
+            continue
+        name = target.path_from(source_root)
+        filename = source.abspath()
+        reused = False
+        if not kind in ["executables"]:
+            member = _egg_file_member(name, filename, previous)
+            members.append(member)
+            reused = member.info is not None
+        if kind == "pythonfiles":
+            # The bytecode embeds the source mtime, which must be consistent
+            # with the source member date: only reuse both together
+            info = previous.get(("%sc" % name).replace(os.sep, "/"), None)
+            if reused and _can_copy_raw(info):
+                member = _EggMember("%sc" % name, info=info)
+            else:
+                member = _EggMember("%sc" % name)
+                to_compile[member] = filename
+            members.append(member)
+
+    bytecodes = compile_files(list(to_compile.values()), jobs)
+    for member, filename in to_compile.items():
+        bytecode = bytecodes[filename]
+        if bytecode is None:
+            members.remove(member)
+        else:
+            st = os.stat(filename)
+            member.data = bytecode
+            member.date_time = time.localtime(st.st_mtime)[:6]
+            member.external_attr = int("600", 8) << 16
 
-    return
+    write_egg(egg, members, egg, jobs)
@@ -11,7 +11,7 @@ from bento.commands.msi_utils \
         create_msi_installer
 from bento.installed_package_description \
     import \
-        BuildManifest, iter_files
+        BuildManifest
 from bento.private.bytecode \
     import \
         bcompile, PyCompileError
@@ -18,7 +18,7 @@ from bento.core \
         PackageMetadata
 from bento.installed_package_description \
     import \
-        BuildManifest, iter_files
+        BuildManifest
 
 import bento.compat.api as compat
 import bento.utils.path
@@ -74,13 +74,11 @@ def create_wininst(ipkg, src_root_node, build_node, egg_info=None, wininst=None,
         d = {}
         for k in ipkg._path_variables:
             d[k] = wininst_paths[k]
-        ipkg.update_paths(d)
-        file_sections = ipkg.resolve_paths(src_root_node)
 
         def write_content(source, target, kind):
             zid.write(source.abspath(), target.abspath())
 
-        for kind, source, target in iter_files(file_sections):
+        for kind, source, target in ipkg.iter_built_files(src_root_node, d):
             write_content(source, target, kind)
 
     finally:
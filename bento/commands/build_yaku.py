@@ -10,13 +10,14 @@ from bento.errors \
         CommandExecutionFailure
 from bento.utils.utils \
     import \
-        cpu_count, extract_exception
+        cpu_count, extract_exception, pprint
 import bento.errors
 
 import yaku.task_manager
 import yaku.context
 import yaku.scheduler
 import yaku.errors
+import yaku.object_cache
 
 def build_extension(bld, extension, env=None):
     builder = bld.builders["pyext"]
@@ -49,3 +50,18 @@ def build_compiled_library(bld, clib, env=None):
         e = extract_exception()
         msg = "Building library %s failed: %s" % (clib.name, str(e))
         raise CommandExecutionFailure(msg)
+
+def create_object_cache(options):
+    """Create the compiled objects cache from the parsed build options, or
+    return None if it is not enabled."""
+    if not options.object_cache:
+        return None
+    if options.object_cache_size:
+        max_size = options.object_cache_size * 1024 ** 2
+    else:
+        max_size = yaku.object_cache.DEFAULT_MAX_SIZE
+    return yaku.object_cache.ObjectCache(options.object_cache, max_size)
+
+def close_object_cache(object_cache):
+    object_cache.close()
+    pprint("PINK", object_cache.summary())
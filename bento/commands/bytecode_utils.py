@@ -0,0 +1,164 @@
+"""Byte-compilation of python files, in a pool of processes, into pyc files
+or in memory.
+
+With python >= 3.7, the bytecode is written as checked hash-based pyc files
+(PEP 552): a pyc embeds a hash of its source instead of the source
+modification time, so that it stays valid once installed, whatever the mtime
+of the installed source. Older pythons only support timestamp-based pyc
+files.
+
+A pyc file is only written again if its header does not match its source
+anymore (different hash or timestamp, or a different python magic)."""
+import os
+import sys
+import struct
+import marshal
+import warnings
+
+from bento.utils.utils \
+    import \
+        extract_exception
+from bento.utils.parallel \
+    import \
+        process_map
+
+if sys.version_info >= (3, 4):
+    import importlib.util
+    MAGIC = importlib.util.MAGIC_NUMBER
+    cache_from_source = importlib.util.cache_from_source
+else:
+    import imp
+    MAGIC = imp.get_magic()
+    if hasattr(imp, "cache_from_source"):
+        cache_from_source = imp.cache_from_source
+    else:
+        def cache_from_source(path):
+            return path + "c"
+
+HASH_BASED = sys.version_info >= (3, 7)
+
+# PEP 552 flags: hash-based, checked against the source at import time
+_CHECKED_HASH_FLAGS = 0x3
+
+def bytecode_header(data, mtime):
+    """Return the pyc header of the source data, last modified at mtime."""
+    if HASH_BASED:
+        return MAGIC + struct.pack("<I", _CHECKED_HASH_FLAGS) + importlib.util.source_hash(data)
+    elif sys.version_info >= (3, 3):
+        return MAGIC + struct.pack("<II", int(mtime) & 0xffffffff, len(data) & 0xffffffff)
+    else:
+        return MAGIC + struct.pack("<I", int(mtime) & 0xffffffff)
+
+def _read_header(filename, size):
+    try:
+        fid = open(filename, "rb")
+        try:
+            return fid.read(size)
+        finally:
+            fid.close()
+    except (IOError, OSError):
+        return None
+
+def _read_source(source):
+    fid = open(source, "rb")
+    try:
+        data = fid.read()
+        mtime = os.fstat(fid.fileno()).st_mtime
+    finally:
+        fid.close()
+    return data, mtime
+
+def compile_bytecode(data, mtime, dfile, header=None):
+    """Return the content of the pyc file of the python source data, last
+    modified at mtime. dfile is the filename recorded in the bytecode, and
+    header the pyc header, if already computed."""
+    if header is None:
+        header = bytecode_header(data, mtime)
+    return header + marshal.dumps(compile(data, dfile, "exec", 0, True))
+
+def _compile(args):
+    # Return (compiled, error): compiled is False if the bytecode was up to
+    # date
+    source, target, dfile = args
+    try:
+        data, mtime = _read_source(source)
+        header = bytecode_header(data, mtime)
+        if _read_header(target, len(header)) == header:
+            return False, None
+
+        pyc = compile_bytecode(data, mtime, dfile, header)
+
+        dirname = os.path.dirname(target)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Created concurrently by another worker
+                if not os.path.isdir(dirname):
+                    raise
+        tmp = "%s.%d.tmp" % (target, os.getpid())
+        fid = open(tmp, "wb")
+        try:
+            fid.write(pyc)
+        finally:
+            fid.close()
+        if sys.platform == "win32" and os.path.exists(target):
+            os.remove(target)
+        os.rename(tmp, target)
+        return True, None
+    except Exception:
+        e = extract_exception()
+        return False, "%s: %s" % (source, e)
+
+def byte_compile(files, jobs=None):
+    """Byte-compile the given python files, in a pool of processes if
+    possible.
+
+    Parameters
+    ----------
+    files: seq
+        list of (source filename, pyc filename, filename recorded in the
+        bytecode) triplets
+    jobs: int, None
+        number of processes (default: number of CPUs)
+
+    Returns the list of sources which were compiled, and the list of sources
+    which could not be compiled (one warning is emitted for each of them)."""
+    files = list(files)
+    results = process_map(_compile, files, jobs)
+
+    compiled = []
+    failed = []
+    for (source, target, dfile), (updated, error) in zip(files, results):
+        if error is not None:
+            warnings.warn("Error byte-compiling %s" % error)
+            failed.append(source)
+        elif updated:
+            compiled.append(source)
+    return compiled, failed
+
+def _compile_in_memory(source):
+    # Return (bytecode, error)
+    try:
+        data, mtime = _read_source(source)
+        return compile_bytecode(data, mtime, source), None
+    except Exception:
+        e = extract_exception()
+        return None, "%s: %s" % (source, e)
+
+def compile_files(filenames, jobs=None):
+    """Byte-compile the given python files in memory, in a pool of processes
+    if possible.
+
+    Returns a dictionary {filename: bytecode}, the bytecode being None for
+    files which could not be compiled (one warning is emitted for each of
+    them)."""
+    filenames = list(filenames)
+    results = process_map(_compile_in_memory, filenames, jobs)
+
+    ret = {}
+    for filename, (data, error) in zip(filenames, results):
+        if error is not None:
+            warnings.warn("Error byte-compiling %s" % error)
+        ret[filename] = data
+    return ret
@@ -4,6 +4,12 @@ import string
 
 import os.path as op
 
+from bento._config \
+    import \
+        CONFIGURE_FINGERPRINT
+from bento.compat.api \
+    import \
+        json
 from bento.errors \
     import \
         InvalidPackage
@@ -34,6 +40,9 @@ from bento.commands.install \
 from bento.installed_package_description \
     import \
         InstalledSection
+from bento.commands.bytecode_utils \
+    import \
+        byte_compile, cache_from_source
 
 class DummyContextManager(object):
     def __init__(self, pre, post):
@@ -51,6 +60,10 @@ class CmdContext(object):
         self._global_context = global_context
         self.pkg = pkg
 
+        # Tracer (bento.utils.trace.Tracer) if tracing is enabled, None
+        # otherwise
+        self.tracer = getattr(global_context, "tracer", None)
+
         self.options_context = options_context
         self.command_argv = command_argv
 
@@ -166,7 +179,25 @@ class ContextWithBuildDirectory(CmdContext):
         return n
 
 class ConfigureContext(ContextWithBuildDirectory):
-    pass
+    def __init__(self, *a, **kw):
+        super(ConfigureContext, self).__init__(*a, **kw)
+        # Fingerprint of the configure inputs, set by the configure command
+        # once it succeeded
+        self.fingerprint = None
+
+    def configured_tools(self):
+        """Return the absolute paths of the programs found at configure time
+        (compilers, linkers...). The configuration is considered out of date
+        if one of them changes."""
+        return []
+
+    def finish(self):
+        # Subclasses store the configured state before calling this: the
+        # fingerprint is written last, so that an interrupted configure is
+        # never considered up to date
+        super(ConfigureContext, self).finish()
+        if self.fingerprint is not None:
+            self.make_build_node(CONFIGURE_FINGERPRINT).safe_write(json.dumps(self.fingerprint))
 
 def _generic_iregistrer(category, name, nodes, from_node, target_dir):
     source_dir = os.path.join("$_srcrootdir", from_node.bldpath())
@@ -374,6 +405,39 @@ class BuildContext(ContextWithBuildDirectory):
                 target_nodes.append(target_node)
             self.outputs_registry.register_outputs("modules", "meta_from_template", target_nodes,
                                                self.build_node, "$sitedir")
+
+    def byte_compile(self, jobs=None):
+        """Byte-compile every python file registered so far (pythonfiles
+        sections) into the build directory, in up to jobs processes.
+
+        The bytecode is registered in bytecode sections, installed along the
+        sources. Files whose bytecode is up to date are not compiled again."""
+        if not "bytecode" in self.outputs_registry.categories:
+            self.register_category("bytecode", "bytecode")
+
+        files = []
+        sections = []
+        for category, name, nodes, from_node, target_dir in list(self.outputs_registry.iter_over_category()):
+            if self.outputs_registry.installed_categories[category] != "pythonfiles":
+                continue
+            bytecode_root = from_node.get_bld()
+            bytecode_nodes = []
+            for node in nodes:
+                if node.name.endswith(".py"):
+                    path = node.path_from(from_node)
+                    target = bytecode_root.make_node(cache_from_source(path))
+                    files.append((node.abspath(), target.abspath(), path))
+                    bytecode_nodes.append((node, target))
+            if bytecode_nodes:
+                sections.append(("%s_%s" % (category, name), bytecode_nodes, bytecode_root, target_dir))
+
+        compiled, failed = byte_compile(files, jobs)
+        failed = set(failed)
+        for name, bytecode_nodes, bytecode_root, target_dir in sections:
+            nodes = [target for node, target in bytecode_nodes if not node.abspath() in failed]
+            self.outputs_registry.register_outputs("bytecode", name, nodes, bytecode_root, target_dir)
+        return compiled
+
     def post_compile(self):
         # Do the output_registry -> installed sections registry convertion
         section_writer = self.section_writer
@@ -4,14 +4,17 @@ import os.path as op
 
 from six import moves
 
+from bento.compat.api \
+    import \
+        json
 from bento.utils.utils \
     import \
-        subst_vars, virtualenv_prefix
+        subst_vars, virtualenv_prefix, md5
 from bento.core.platforms import \
         get_scheme
 from bento._config \
     import \
-        CONFIGURED_STATE_DUMP, BENTO_SCRIPT
+        CONFIGURED_STATE_DUMP, CONFIGURE_FINGERPRINT, BENTO_SCRIPT
 
 from bento.commands.core \
     import \
@@ -173,6 +176,13 @@ class ConfigureCommand(Command):
 Purpose: configure the project
 Usage: bentomaker configure [OPTIONS]"""
     short_descr = "configure the project."
+    common_options = Command.common_options \
+                        + [Option("--conf-cache",
+                                  help="Directory of a configuration checks cache shared between builds",
+                                  dest="conf_cache"),
+                           Option("--conf-cache-size",
+                                  help="Maximum size of the configuration checks cache (in MB)",
+                                  dest="conf_cache_size", type="int")]
 
     def __init__(self, *a, **kw):
         super(ConfigureCommand, self).__init__(*a, **kw)
@@ -185,6 +195,12 @@ Usage: bentomaker configure [OPTIONS]"""
         self.scheme.update(_compute_scheme(package_options))
         self.flags.extend(package_options.flag_options.keys())
 
+    def init(self, ctx):
+        # A failed configure must not be considered up to date
+        node = ctx.build_node.find_node(CONFIGURE_FINGERPRINT)
+        if node is not None:
+            node.delete()
+
     def run(self, ctx):
         bento_script = ctx.top_node.find_node(BENTO_SCRIPT)
         if bento_script is None:
@@ -198,6 +214,76 @@ Usage: bentomaker configure [OPTIONS]"""
 
         set_scheme_options(self.scheme, o, ctx.pkg)
 
+    def finish(self, ctx):
+        # Written by the context once it stored the configured state
+        ctx.fingerprint = configure_fingerprint(ctx.command_argv, ctx.top_node,
+                                                configure_inputs(ctx.pkg), ctx.configured_tools())
+
+# Environment variables which may change the configuration results
+CONFIGURE_ENV_VARS = ["PATH", "CC", "CXX", "CPP", "LD", "AR", "FC", "F77", "F90", "CFLAGS",
+                      "CXXFLAGS", "CPPFLAGS", "LDFLAGS", "FFLAGS", "LIBS", "CPATH",
+                      "C_INCLUDE_PATH", "CPLUS_INCLUDE_PATH", "LIBRARY_PATH", "INCLUDE",
+                      "LIB", "LIBPATH", "SDKROOT", "MACOSX_DEPLOYMENT_TARGET"]
+
+def configure_inputs(pkg):
+    """Return the files read by configure (bento.info and hook files,
+    including the subentos ones), relatively to the top source directory."""
+    files = [BENTO_SCRIPT] + list(pkg.hook_files)
+    for key in sorted(pkg.subpackages):
+        subpackage = pkg.subpackages[key]
+        files.append(key)
+        files.extend([op.normpath(op.join(subpackage.rdir, h)) for h in subpackage.hook_files])
+    return files
+
+def _file_checksum(top_node, filename):
+    node = top_node.find_node(filename)
+    if node is None:
+        return None
+    return md5(node.read(flags="rb")).hexdigest()
+
+def _tool_identity(tool):
+    try:
+        st = os.stat(tool)
+    except OSError:
+        return None
+    return [st.st_size, int(st.st_mtime)]
+
+def configure_fingerprint(configure_argv, top_node, filenames, tools):
+    """Return the fingerprint of the inputs of configure, as a json
+    serializable dictionary.
+
+    Parameters
+    ----------
+    configure_argv: seq
+        configure arguments
+    top_node: Node
+        top source node
+    filenames: seq
+        files read by configure, relatively to top_node
+    tools: seq
+        absolute paths of the programs (compilers...) found by configure
+    """
+    return {"argv": list(configure_argv),
+            "python": [sys.executable, sys.version],
+            "environ": dict([(k, os.environ.get(k)) for k in CONFIGURE_ENV_VARS]),
+            "files": dict([(f, _file_checksum(top_node, f)) for f in filenames]),
+            "tools": dict([(t, _tool_identity(t)) for t in tools])}
+
+def is_configure_up_to_date(configure_argv, top_node, build_node):
+    """Return True if configure has already been run successfully with the
+    same inputs: the same arguments, bento.info and hook files, python
+    interpreter, compiler related environment variables and tools."""
+    node = build_node.find_node(CONFIGURE_FINGERPRINT)
+    if node is None:
+        return False
+    try:
+        stored = json.loads(node.read())
+        current = configure_fingerprint(configure_argv, top_node, stored["files"].keys(),
+                                        stored["tools"].keys())
+    except (IOError, OSError, ValueError, KeyError, AttributeError):
+        return False
+    return current == stored
+
 def _compute_scheme(package_options):
     """Compute path and flags-related options as defined in the script file(s)
 
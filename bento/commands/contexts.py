@@ -32,6 +32,8 @@ class GlobalContext(object):
 
         self.backend = None
         self._package_options = None
+        # Set to a bento.utils.trace.Tracer instance to trace commands
+        self.tracer = None
 
         self._command_data_db = command_data_db
         if command_data_db is None:
@@ -61,6 +63,21 @@ class GlobalContext(object):
         """
         self._commands_registry.register(cmd_name, cmd, public)
 
+    def register_command_lazy(self, cmd_name, module_name, klass_name, public=True):
+        """Register a command name to a command class which is only imported
+        and instantiated when the command is retrieved.
+
+        Parameters
+        ----------
+        cmd_name: str
+            name of the command
+        module_name: str
+            name of the module defining the command class
+        klass_name: str
+            name of the command class (a subclass of Command)
+        """
+        self._commands_registry.register_lazy(cmd_name, module_name, klass_name, public)
+
     def retrieve_command(self, cmd_name):
         """Return the command instance registered for the given command name."""
         return self._commands_registry.retrieve(cmd_name)
@@ -81,6 +98,9 @@ class GlobalContext(object):
     def register_command_context(self, cmd_name, klass):
         self._contexts_registry.register(cmd_name, klass)
 
+    def register_command_context_lazy(self, cmd_name, module_name, klass_name):
+        self._contexts_registry.register_lazy(cmd_name, module_name, klass_name)
+
     def retrieve_command_context(self, cmd_name):
         return self._contexts_registry.retrieve(cmd_name)
 
@@ -106,6 +126,18 @@ class GlobalContext(object):
 
         return self._options_registry.register(cmd_name, context)
 
+    def register_options_context_lazy(self, cmd_name, factory):
+        """Register a callable creating the options context of the given
+        command, which is only called when the options context is
+        retrieved."""
+        def _factory():
+            context = factory()
+            cmd = self.retrieve_command(cmd_name)
+            if self._package_options is not None and hasattr(cmd, "register_options"):
+                cmd.register_options(context, self._package_options)
+            return context
+        return self._options_registry.register_lazy(cmd_name, _factory)
+
     def retrieve_options_context(self, cmd_name):
         return self._options_registry.retrieve(cmd_name)
 
@@ -33,8 +33,10 @@ class EggInfo(object):
         meta = PackageMetadata.from_ipkg(ipkg)
         executables = ipkg.executables
 
-        file_sections = ipkg.resolve_paths(src_node)
-        sources = list([n.abspath() for n in iter_source_files(file_sections)])
+        # Only the source paths are needed: nodes are resolved lazily, one
+        # section at a time
+        file_sections = ipkg._resolve_paths(src_node, use_destdir=False, lazy=True)
+        sources = [n.abspath() for n in iter_source_files(file_sections)]
 
         ret = cls(meta, executables, sources)
         ret.ipkg = ipkg
@@ -2,17 +2,20 @@ import os
 import shutil
 import subprocess
 import errno
+import threading
 
 from bento._config \
     import \
         IPKG_PATH
 from bento.installed_package_description import \
-    BuildManifest, iter_files
+    BuildManifest
 
 from bento.commands.core import \
     Command, Option
 from bento.utils.utils import \
-    pprint, extract_exception, MODE_755, MODE_777
+    pprint, extract_exception, same_content, cpu_count, MODE_755, MODE_777
+from bento.utils.os2 import \
+    copyfile
 
 def _rollback_operation(line):
     operation, arg = line.split()
@@ -21,11 +24,17 @@ def _rollback_operation(line):
             os.rmdir(arg)
         except OSError:
             e = extract_exception()
-            # FIXME: hardcoded errno !!
-            if e.errno != 66:
+            # Journal entries are written before the operation is done, so
+            # the directory may not exist
+            if not e.errno in (errno.ENOTEMPTY, errno.EEXIST, errno.ENOENT):
                 raise
     elif operation == "COPY":
-        os.remove(arg)
+        try:
+            os.remove(arg)
+        except OSError:
+            e = extract_exception()
+            if e.errno != errno.ENOENT:
+                raise
     else:
         raise ValueError("Unknown operation: %s" % operation)
 
@@ -57,16 +66,7 @@ class TransactionLog(object):
         self.journal_filename = journal_filename
 
     def copy(self, source, target, category):
-        if os.path.exists(target):
-            self.rollback()
-            raise ValueError("File %s already exists, rolled back installation" % target)
-        d = os.path.dirname(target)
-        if not os.path.exists(d):
-            self.makedirs(d)
-        self.f.write("COPY %s\n" % target)
-        shutil.copy(source, target)
-        if category == "executables":
-            os.chmod(target, MODE_755)
+        InstallEngine(journal=self).install([(category, source, target)])
 
     def makedirs(self, name, mode=MODE_777):
         head, tail = os.path.split(name)
@@ -84,10 +84,17 @@ class TransactionLog(object):
         self.mkdir(name, mode)
 
     def mkdir(self, name, mode=MODE_777):
-        self.f.write("MKDIR %s\n" % name) 
-        self.f.flush()
+        self.log("MKDIR", [name])
         os.mkdir(name, mode)
 
+    def log(self, operation, names):
+        """Record the given operation for every name, before the operations
+        are executed.
+
+        The journal is only flushed once for all the names."""
+        self.f.writelines(["%s %s\n" % (operation, name) for name in names])
+        self.f.flush()
+
     def close(self):
         if self.f is not None:
             self.f.close()
@@ -101,13 +108,125 @@ class TransactionLog(object):
         self.f = None
 
 def copy_installer(source, target, kind):
-    dtarget = os.path.dirname(target)
-    if not os.path.exists(dtarget):
-        os.makedirs(dtarget)
-    shutil.copy(source, target)
+    InstallEngine().install([(kind, source, target)])
+
+def _install_file(source, target, kind):
+    copyfile(source, target)
+    shutil.copymode(source, target)
     if kind == "executables":
         os.chmod(target, MODE_755)
 
+def _is_up_to_date(source, target):
+    try:
+        target_size = os.stat(target).st_size
+    except OSError:
+        return False
+    return os.stat(source).st_size == target_size and same_content(source, target)
+
+def _missing_directories(directories):
+    """Return the directories (and their parents) which do not exist yet,
+    parents first. Each directory is only looked at once."""
+    exists = {}
+    missing = []
+    def _visit(d):
+        if not d in exists:
+            exists[d] = os.path.isdir(d)
+            if not exists[d]:
+                parent = os.path.dirname(d)
+                if parent and parent != d:
+                    _visit(parent)
+                missing.append(d)
+    for d in directories:
+        _visit(d)
+    # a parent is a prefix of its children, so it is sorted before them
+    return sorted(missing)
+
+class InstallEngine(object):
+    """Install a list of files.
+
+    Target directories are created first, in one batch, and files are then
+    copied by a pool of threads. Without journal, targets with the same
+    content as their source are not copied again. With a journal
+    (TransactionLog instance), installing over an existing file is an error,
+    and the installation is rolled back."""
+    def __init__(self, jobs=1, journal=None):
+        self.jobs = max(jobs, 1)
+        self.journal = journal
+
+    def install(self, files):
+        """Install the (kind, source, target) triples from files, source and
+        target being paths."""
+        files = list(files)
+        if self.journal is not None:
+            for kind, source, target in files:
+                if os.path.exists(target):
+                    self.journal.rollback()
+                    raise ValueError("File %s already exists, rolled back installation" % target)
+        else:
+            files = self._filter_up_to_date(files)
+
+        directories = _missing_directories(set([os.path.dirname(target) for kind, source, target in files]))
+        if self.journal is not None:
+            self.journal.log("MKDIR", directories)
+        for d in directories:
+            try:
+                os.mkdir(d, MODE_777)
+            except OSError:
+                e = extract_exception()
+                if e.errno != errno.EEXIST:
+                    raise
+
+        if self.journal is not None:
+            self.journal.log("COPY", [target for kind, source, target in files])
+        self._run(files)
+
+    def _filter_up_to_date(self, files):
+        ret = []
+        for kind, source, target in files:
+            if _is_up_to_date(source, target):
+                if kind == "executables":
+                    os.chmod(target, MODE_755)
+            else:
+                ret.append((kind, source, target))
+        return ret
+
+    def _run(self, files):
+        if self.jobs == 1 or len(files) < 2:
+            for kind, source, target in files:
+                _install_file(source, target, kind)
+            return
+
+        lock = threading.Lock()
+        todo = files[::-1]
+        errors = []
+        def _worker():
+            while True:
+                lock.acquire()
+                try:
+                    if errors or not todo:
+                        return
+                    kind, source, target = todo.pop()
+                finally:
+                    lock.release()
+                try:
+                    _install_file(source, target, kind)
+                except Exception:
+                    e = extract_exception()
+                    lock.acquire()
+                    try:
+                        errors.append(e)
+                    finally:
+                        lock.release()
+
+        workers = [threading.Thread(target=_worker) for i in range(min(self.jobs, len(files)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+
 def unix_installer(source, target, kind):
     if kind in ["executables"]:
         mode = "755"
@@ -130,7 +249,10 @@ Usage:   bentomaker install [OPTIONS]."""
                                 help="Do a transaction-based install", action="store_true"),
                          Option("-n", "--dry-run", "--list-files",
                                 help="List installed files (do not install anything)",
-                                action="store_true", dest="list_files")]
+                                action="store_true", dest="list_files"),
+                         Option("-j", "--jobs",
+                                help="Number of files copied in parallel (default: number of CPUs)",
+                                dest="jobs", type="int")]
     def run(self, ctx):
         argv = ctx.command_argv
         p = ctx.options_context.parser
@@ -142,24 +264,26 @@ Usage:   bentomaker install [OPTIONS]."""
         n = ctx.build_node.make_node(IPKG_PATH)
         ipkg = BuildManifest.from_file(n.abspath())
         scheme = ctx.retrieve_configured_scheme()
-        ipkg.update_paths(scheme)
-        node_sections = ipkg.resolve_paths_with_destdir(ctx.build_node)
+        built_files = ipkg.iter_built_files(ctx.build_node, scheme, use_destdir=True)
 
         if o.list_files:
             # XXX: this won't take into account action in post install scripts.
             # A better way would be to log install steps and display those, but
             # this will do for now.
-            for kind, source, target in iter_files(node_sections):
+            for kind, source, target in built_files:
                 print(target.abspath())
             return
 
+        if o.jobs is None:
+            jobs = cpu_count()
+        else:
+            jobs = o.jobs
+        files = [(kind, source.abspath(), target.abspath()) for kind, source, target in built_files]
         if o.transaction:
             trans = TransactionLog("transaction.log")
             try:
-                for kind, source, target in iter_files(node_sections):
-                    trans.copy(source.abspath(), target.abspath(), kind)
+                InstallEngine(jobs, trans).install(files)
             finally:
                 trans.close()
         else:
-            for kind, source, target in iter_files(node_sections):
-                copy_installer(source.abspath(), target.abspath(), kind)
+            InstallEngine(jobs).install(files)
@@ -1,57 +1,97 @@
+import sys
+
 from bento.compat.api \
     import \
         defaultdict
 
+def import_object(module_name, name):
+    """Import the given module, and return its attribute name."""
+    __import__(module_name)
+    return getattr(sys.modules[module_name], name)
+
 class CommandRegistry(object):
     def __init__(self):
         # command line name -> command class
         self._klasses = {}
+        # command line name -> (module name, class name) for commands not
+        # imported yet
+        self._lazy_klasses = {}
         # command line name -> None for private commands
         self._privates = {}
 
     def register(self, name, cmd_klass, public=True):
-        if name in self._klasses:
+        if self.is_registered(name):
             raise ValueError("context for command %r already registered !" % name)
         else:
             self._klasses[name] = cmd_klass
             if not public:
                 self._privates[name] = None
 
+    def register_lazy(self, name, module_name, klass_name, public=True):
+        """Register a command whose module is only imported, and class
+        instantiated, the first time the command is retrieved."""
+        if self.is_registered(name):
+            raise ValueError("context for command %r already registered !" % name)
+        else:
+            self._lazy_klasses[name] = (module_name, klass_name)
+            if not public:
+                self._privates[name] = None
+
     def retrieve(self, name):
         cmd_klass = self._klasses.get(name, None)
         if cmd_klass is None:
+            if name in self._lazy_klasses:
+                module_name, klass_name = self._lazy_klasses.pop(name)
+                cmd_klass = import_object(module_name, klass_name)()
+                self._klasses[name] = cmd_klass
+                return cmd_klass
             raise ValueError("No command class registered for name %r" % name)
         else:
             return cmd_klass
 
     def is_registered(self, name):
-        return name in self._klasses
+        return name in self._klasses or name in self._lazy_klasses
 
     def command_names(self):
-        return self._klasses.keys()
+        return list(self._klasses.keys()) + list(self._lazy_klasses.keys())
 
     def public_command_names(self):
-        return [k for k in self._klasses.keys() if not k in self._privates]
+        return [k for k in self.command_names() if not k in self._privates]
 
 class ContextRegistry(object):
     def __init__(self, default=None):
         self._contexts = {}
+        # command line name -> (module name, class name) for contexts not
+        # imported yet
+        self._lazy_contexts = {}
         self.set_default(default)
 
     def set_default(self, default):
         self._default = default
 
     def is_registered(self, cmd_name):
-        return cmd_name in self._contexts
+        return cmd_name in self._contexts or cmd_name in self._lazy_contexts
 
     def register(self, cmd_name, context):
-        if cmd_name in self._contexts:
+        if self.is_registered(cmd_name):
             raise ValueError("context for command %r already registered !" % cmd_name)
         else:
             self._contexts[cmd_name] = context
 
+    def register_lazy(self, cmd_name, module_name, klass_name):
+        """Register a context class whose module is only imported the first
+        time the context is retrieved."""
+        if self.is_registered(cmd_name):
+            raise ValueError("context for command %r already registered !" % cmd_name)
+        else:
+            self._lazy_contexts[cmd_name] = (module_name, klass_name)
+
     def retrieve(self, cmd_name):
         context = self._contexts.get(cmd_name, None)
+        if context is None and cmd_name in self._lazy_contexts:
+            module_name, klass_name = self._lazy_contexts.pop(cmd_name)
+            context = import_object(module_name, klass_name)
+            self._contexts[cmd_name] = context
         if context is None:
             if self._default is None:
                 raise ValueError("No context registered for command %r" % cmd_name)
@@ -65,18 +105,32 @@ class OptionsRegistry(object):
     def __init__(self):
         # command line name -> context *instance*
         self._contexts = {}
+        # command line name -> callable creating the context instance, for
+        # contexts not created yet
+        self._factories = {}
 
     def register(self, cmd_name, options_context):
-        if cmd_name in self._contexts:
+        if self.is_registered(cmd_name):
             raise ValueError("options context for command %r already registered !" % cmd_name)
         else:
             self._contexts[cmd_name] = options_context
 
+    def register_lazy(self, cmd_name, factory):
+        """Register a callable which creates the options context the first
+        time it is retrieved."""
+        if self.is_registered(cmd_name):
+            raise ValueError("options context for command %r already registered !" % cmd_name)
+        else:
+            self._factories[cmd_name] = factory
+
     def is_registered(self, cmd_name):
-        return cmd_name in self._contexts
+        return cmd_name in self._contexts or cmd_name in self._factories
 
     def retrieve(self, cmd_name):
         options_context = self._contexts.get(cmd_name, None)
+        if options_context is None and cmd_name in self._factories:
+            options_context = self._factories.pop(cmd_name)()
+            self._contexts[cmd_name] = options_context
         if options_context is None:
             raise ValueError("No options context registered for cmd_name %r" % cmd_name)
         else:
@@ -1,13 +1,13 @@
-import tarfile
-
 import os.path as op
 
-import bento.compat.api as compat
 import bento.errors
 
 from bento.commands.core \
     import \
         Command, Option
+from bento.utils.archive \
+    import \
+        write_tarball, write_zip
 
 def archive_basename(pkg):
     if pkg.version:
@@ -15,33 +15,26 @@ def archive_basename(pkg):
     else:
         return pkg.name
 
-def create_tarball(node_pkg, archive_root, archive_node):
-    tf = tarfile.open(archive_node.abspath(), "w:gz")
-    try:
-        for filename, alias in node_pkg.iter_source_files():
-            tf.add(filename, op.join(archive_root, alias))
-    finally:
-        tf.close()
+def _archive_files(node_pkg, archive_root):
+    return [(filename, op.join(archive_root, alias)) for filename, alias in node_pkg.iter_source_files()]
+
+def create_tarball(node_pkg, archive_root, archive_node, jobs=None):
+    write_tarball(archive_node.abspath(), _archive_files(node_pkg, archive_root), jobs)
 
-def create_zarchive(node_pkg, archive_root, archive_node):
-    zid = compat.ZipFile(archive_node.abspath(), "w", compat.ZIP_DEFLATED)
-    try:
-        for filename, alias in node_pkg.iter_source_files():
-            zid.write(filename, op.join(archive_root, alias))
-    finally:
-        zid.close()
+def create_zarchive(node_pkg, archive_root, archive_node, jobs=None):
+    write_zip(archive_node.abspath(), _archive_files(node_pkg, archive_root), jobs)
 
 _FORMATS = {"gztar": {"ext": ".tar.gz", "func": create_tarball},
             "zip": {"ext": ".zip", "func": create_zarchive}}
 
-def create_archive(archive_name, archive_root, node_pkg, top_node, run_node, format="tgz", output_directory="dist"):
+def create_archive(archive_name, archive_root, node_pkg, top_node, run_node, format="tgz", output_directory="dist", jobs=None):
     if not format in _FORMATS:
         raise ValueError("Unknown format: %r" % (format,))
 
     archive_node = top_node.make_node(op.join(output_directory, archive_name))
     archive_node.parent.mkdir()
 
-    _FORMATS[format]["func"](node_pkg, archive_root, archive_node) 
+    _FORMATS[format]["func"](node_pkg, archive_root, archive_node, jobs)
     return archive_root, archive_node
 
 class SdistCommand(Command):
@@ -55,7 +48,10 @@ Usage:   bentomaker sdist [OPTIONS]."""
                            Option("--format",
                                   help="Archive format (supported: 'gztar', 'zip')", default="gztar"),
                            Option("--output-file",
-                                  help="Archive filename (default: $pkgname-$version.$archive_extension)")]
+                                  help="Archive filename (default: $pkgname-$version.$archive_extension)"),
+                           Option("-j", "--jobs",
+                                  help="Number of compression threads (default: number of CPUs)",
+                                  dest="jobs", type="int")]
 
     def run(self, ctx):
         argv = ctx.command_argv
@@ -80,4 +76,4 @@ Usage:   bentomaker sdist [OPTIONS]."""
         # XXX: find a better way to pass archive name from other commands (used
         # by distcheck ATM)
         self.archive_root, self.archive_node = create_archive(archive_name, archive_root, ctx._node_pkg,
-                ctx.top_node, ctx.run_node, o.format, o.output_dir)
+                ctx.top_node, ctx.run_node, o.format, o.output_dir, o.jobs)
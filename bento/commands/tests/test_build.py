@@ -28,6 +28,9 @@ from bento.core.node \
 from bento.utils.utils \
     import \
         subst_vars
+from bento.utils.trace \
+    import \
+        Tracer
 from bento.backends.distutils_backend \
     import \
         DistutilsBuildContext, DistutilsConfigureContext
@@ -46,6 +49,15 @@ from bento.commands.options \
 from bento.commands.build \
     import \
         BuildCommand
+from bento.commands.bytecode_utils \
+    import \
+        cache_from_source
+from bento.installed_package_description \
+    import \
+        BuildManifest
+from bento._config \
+    import \
+        IPKG_PATH
 from bento.core.testing \
     import \
         create_fake_package_from_bento_infos, create_fake_package_from_bento_info, \
@@ -305,6 +317,22 @@ class TestBuildYaku(_TestBuildSimpleExtension):
     def test_disable_nonexisting_extension(self):
         super(TestBuildYaku, self).test_disable_nonexisting_extension()
 
+    @require_c_compiler("yaku")
+    def test_trace(self):
+        conf, configure, bld, build = self._run_configure({"bento.info": BENTO_INFO_WITH_CLIB})
+        tracer = Tracer()
+        bld.tracer = bld.yaku_context.tracer = tracer
+        pre_hook = PreHookWrapper(lambda context: None, "build", self.d)
+        run_command_in_context(bld, build, pre_hooks=[pre_hook])
+
+        spans = dict([(e["name"], e["cat"]) for e in tracer.trace_events()])
+        for phase in ["context init", "command init", "pre-hooks", "hook <lambda>", "configure",
+                      "run", "post-hooks", "command finish", "context finish"]:
+            self.assertEqual(spans["BuildCommand: %s" % phase], "command")
+        self.assertEqual(spans["BuildCommand"], "command")
+        self.assertTrue("task" in spans.values())
+        self.assertTrue("subprocess" in spans.values())
+
 def _not_has_waf():
     try:
         import bento.backends.waf_backend
@@ -416,7 +444,9 @@ class TestBuildCommand(unittest.TestCase):
         os.chdir(self.old_dir)
         shutil.rmtree(self.d)
 
-    def _execute_build(self, bento_info):
+    def _execute_build(self, bento_info, build_argv=None):
+        if build_argv is None:
+            build_argv = []
         create_fake_package_from_bento_info(self.top_node, bento_info)
         # FIXME: this should be done automatically in create_fake_package_from_bento_info
         self.top_node.make_node("bento.info").safe_write(bento_info)
@@ -428,11 +458,32 @@ class TestBuildCommand(unittest.TestCase):
         conf, configure = prepare_command(global_context, "configure", [], package, self.run_node)
         run_command_in_context(conf, configure)
 
-        bld, build = prepare_command(global_context, "build", [], package, self.run_node)
+        bld, build = prepare_command(global_context, "build", build_argv, package, self.run_node)
         run_command_in_context(bld, build)
 
         return bld
 
+    def test_byte_compile(self):
+        bento_info = """\
+Name: foo
+
+ConfigPy: foo/__config.py
+
+Library:
+    Packages: foo
+"""
+        self._execute_build(bento_info, ["--byte-compile", "-j", "1"])
+
+        build_manifest = BuildManifest.from_file(self.build_node.find_node(IPKG_PATH).abspath())
+        self.assertTrue("bytecode" in build_manifest.file_sections)
+        built = dict([(target.abspath(), source.abspath()) for kind, source, target in
+                      build_manifest.iter_built_files(self.build_node, {"prefix": "/usr"})
+                      if kind in ["pythonfiles", "bytecode"]])
+        for path in [op.join("foo", "__init__.py"), op.join("foo", "__config.py")]:
+            target = [t for t in built if t.endswith(path)][0]
+            bytecode = built[cache_from_source(target)]
+            self.assertTrue(os.path.exists(bytecode))
+
     def test_simple(self):
         self._execute_build(BENTO_INFO)
 
@@ -0,0 +1,79 @@
+import os
+import shutil
+import marshal
+import tempfile
+import warnings
+
+import os.path as op
+
+from bento.compat.api.moves \
+    import \
+        unittest
+
+from bento.commands.bytecode_utils \
+    import \
+        byte_compile, bytecode_header, cache_from_source, HASH_BASED, MAGIC
+
+def _read(filename):
+    fid = open(filename, "rb")
+    try:
+        return fid.read()
+    finally:
+        fid.close()
+
+def _write(filename, data):
+    fid = open(filename, "w")
+    try:
+        fid.write(data)
+    finally:
+        fid.close()
+
+class TestByteCompile(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.files = []
+        for i in range(4):
+            source = op.join(self.d, "mod%d.py" % i)
+            _write(source, "X = %d\n" % i)
+            self.files.append((source, cache_from_source(source), "mod%d.py" % i))
+
+    def tearDown(self):
+        shutil.rmtree(self.d)
+
+    def test_simple(self):
+        compiled, failed = byte_compile(self.files, jobs=2)
+        self.assertEqual(compiled, [f[0] for f in self.files])
+        self.assertEqual(failed, [])
+
+        source, target, dfile = self.files[1]
+        data = _read(target)
+        self.assertEqual(data[:len(MAGIC)], MAGIC)
+        header = bytecode_header(_read(source), os.stat(source).st_mtime)
+        self.assertEqual(data[:len(header)], header)
+        code = marshal.loads(data[len(header):])
+        self.assertEqual(code.co_filename, dfile)
+        ns = {}
+        exec(code, ns)
+        self.assertEqual(ns["X"], 1)
+
+    def test_up_to_date(self):
+        byte_compile(self.files, jobs=1)
+        source = self.files[2][0]
+        _write(source, "X = 'changed'\n")
+        if not HASH_BASED:
+            # make sure the timestamp changes
+            st = os.stat(source)
+            os.utime(source, (st.st_atime, st.st_mtime + 10))
+
+        compiled, failed = byte_compile(self.files, jobs=1)
+        self.assertEqual(compiled, [source])
+
+    def test_error(self):
+        source = self.files[0][0]
+        _write(source, "def f(:\n")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            compiled, failed = byte_compile(self.files, jobs=1)
+        self.assertEqual(failed, [source])
+        self.assertEqual(len(compiled), 3)
+        self.assertFalse(os.path.exists(self.files[0][1]))
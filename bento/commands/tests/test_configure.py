@@ -31,7 +31,7 @@ from bento.backends.yaku_backend \
         ConfigureYakuContext
 from bento.commands.configure \
     import \
-        _compute_scheme, set_scheme_unix, set_scheme_win32
+        _compute_scheme, set_scheme_unix, set_scheme_win32, is_configure_up_to_date
 
 BENTO_INFO = """\
 Name: Sphinx
@@ -82,6 +82,83 @@ Flag: floupi
         conf, configure = prepare_configure(run_node, bento_info, ConfigureYakuContext, ["--floupi=false"])
         run_command_in_context(conf, configure)
 
+    def test_conf_cache(self):
+        run_node = self.root.find_node(self.d)
+
+        cache_dir = os.path.join(self.d, "conf_cache")
+        conf, configure = prepare_configure(run_node, BENTO_INFO, ConfigureYakuContext,
+                                            ["--conf-cache=%s" % cache_dir, "--conf-cache-size=10"])
+        conf_cache = conf.yaku_context.conf_cache
+        self.assertEqual(conf_cache.directory, cache_dir)
+        self.assertEqual(conf_cache.max_size, 10 * 1024 ** 2)
+        run_command_in_context(conf, configure)
+
+class TestConfigureFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.root = create_root_with_source_tree(self.d, os.path.join(self.d, "build"))
+        self.run_node = self.root.find_node(self.d)
+        self.top_node = self.run_node._ctx.srcnode
+        self.build_node = self.run_node._ctx.bldnode
+
+        self.old_dir = os.getcwd()
+        os.chdir(self.d)
+
+    def tearDown(self):
+        os.chdir(self.old_dir)
+        shutil.rmtree(self.d)
+
+    def _configure(self, cmd_argv):
+        conf, configure = prepare_configure(self.run_node, BENTO_INFO, ConfigureYakuContext,
+                                            cmd_argv)
+        run_command_in_context(conf, configure)
+
+    def _is_up_to_date(self, cmd_argv):
+        return is_configure_up_to_date(cmd_argv, self.top_node, self.build_node)
+
+    def test_simple(self):
+        self.assertFalse(self._is_up_to_date([]))
+        self._configure(["--prefix=/usr"])
+        self.assertTrue(self._is_up_to_date(["--prefix=/usr"]))
+        self.assertFalse(self._is_up_to_date([]))
+
+    def test_bento_info_changed(self):
+        self._configure([])
+        self.top_node.find_node("bento.info").safe_write(BENTO_INFO + "Platforms: any\n")
+        self.assertFalse(self._is_up_to_date([]))
+
+    def test_environ_changed(self):
+        self._configure([])
+        old = os.environ.get("CFLAGS")
+        os.environ["CFLAGS"] = "-O0 -bento-test"
+        try:
+            self.assertFalse(self._is_up_to_date([]))
+        finally:
+            if old is None:
+                del os.environ["CFLAGS"]
+            else:
+                os.environ["CFLAGS"] = old
+
+    def test_failed_configure(self):
+        self._configure([])
+        conf, configure = prepare_configure(self.run_node, BENTO_INFO, ConfigureYakuContext)
+        run = mock.Mock(side_effect=ValueError("failed"))
+        try:
+            configure.run = run
+            self.assertRaises(ValueError, lambda: run_command_in_context(conf, configure))
+        finally:
+            del configure.run
+        self.assertFalse(self._is_up_to_date([]))
+
+    def test_failed_store(self):
+        # The fingerprint must not be written if the configured state could
+        # not be stored
+        self._configure([])
+        conf, configure = prepare_configure(self.run_node, BENTO_INFO, ConfigureYakuContext)
+        conf.yaku_context.store = mock.Mock(side_effect=IOError("failed"))
+        self.assertRaises(IOError, lambda: run_command_in_context(conf, configure))
+        self.assertFalse(self._is_up_to_date([]))
+
 UNIX_REFERENCE = {
         'destdir': "/",
         'prefix': None,
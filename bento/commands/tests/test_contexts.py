@@ -44,3 +44,43 @@ Path: floupi
     Default: /yeah
 """)
         self._test(package_options, {"floupi": "/yeah"})
+
+class TestGlobalContextLazyRegistration(unittest.TestCase):
+    def setUp(self):
+        self.context = GlobalContext(None)
+
+    def test_command(self):
+        self.context.register_command_lazy("parse", "bento.commands.parse", "ParseCommand", public=False)
+        self.assertTrue(self.context.is_command_registered("parse"))
+        self.assertEqual(self.context.command_names(), [])
+        self.assertEqual(self.context.command_names(public_only=False), ["parse"])
+
+        from bento.commands.parse import ParseCommand
+        cmd = self.context.retrieve_command("parse")
+        self.assertTrue(isinstance(cmd, ParseCommand))
+        self.assertTrue(self.context.retrieve_command("parse") is cmd)
+
+    def test_options_context(self):
+        from bento.commands.options import OptionsContext
+
+        self.context.register_command_lazy("configure", "bento.commands.configure", "ConfigureCommand")
+        self.context.register_package_options(PackageOptions.from_string("""\
+Name: foo
+
+Flag: debug
+    Description: debug flag
+    Default: false
+"""))
+
+        created = []
+        def _factory():
+            created.append(True)
+            return OptionsContext.from_command(self.context.retrieve_command("configure"))
+        self.context.register_options_context_lazy("configure", _factory)
+        self.assertTrue(self.context.is_options_context_registered("configure"))
+        self.assertEqual(created, [])
+
+        options_context = self.context.retrieve_options_context("configure")
+        self.assertTrue(options_context.parser.has_option("--debug"))
+        self.assertTrue(self.context.retrieve_options_context("configure") is options_context)
+        self.assertEqual(created, [True])
@@ -1,6 +1,7 @@
 import os
 import shutil
 import tempfile
+import zipfile
 
 from bento.compat.api.moves \
     import \
@@ -25,6 +26,19 @@ from bento.core.pkg_objects \
 from bento.commands.egg_utils \
     import \
         EggInfo
+from bento.commands.wrapper_utils \
+    import \
+        run_command_in_context
+from bento.commands.tests.utils \
+    import \
+        prepare_configure, prepare_build
+from bento.core.testing \
+    import \
+        create_fake_package_from_bento_info
+from bento.installed_package_description \
+    import \
+        BuildManifest
+import bento.commands.build_egg
 
 DESCR = """\
 Name: Sphinx
@@ -161,3 +175,72 @@ Platform: UNKNOWN
         egg_info = self._prepare_egg_info()
         for name, content in egg_info.iter_meta(self.build_node):
             pass
+
+class TestBuildEgg(unittest.TestCase):
+    def setUp(self):
+        self.old_dir = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+
+        os.chdir(self.tmpdir)
+        self.top_node, self.build_node, self.run_node = \
+                create_base_nodes(self.tmpdir, os.path.join(self.tmpdir, "build"))
+
+        self.compiled = []
+        self.old_compile_files = bento.commands.build_egg.compile_files
+        def _compile_files(filenames, jobs=None):
+            self.compiled.extend(filenames)
+            return self.old_compile_files(filenames, jobs)
+        bento.commands.build_egg.compile_files = _compile_files
+
+    def tearDown(self):
+        bento.commands.build_egg.compile_files = self.old_compile_files
+        os.chdir(self.old_dir)
+        shutil.rmtree(self.tmpdir)
+
+    def _build_egg(self):
+        bento_info = """\
+Name: foo
+Version: 1.0
+
+Library:
+    Packages: foo
+    Modules: bar, fubar
+"""
+        if self.top_node.find_node("bar.py") is None:
+            create_fake_package_from_bento_info(self.top_node, bento_info)
+            for name in ["bar.py", "fubar.py"]:
+                self.top_node.find_node(name).write("a = 1\n")
+
+        for prepare in [prepare_configure, prepare_build]:
+            context, cmd = prepare(self.run_node, bento_info)
+            run_command_in_context(context, cmd)
+
+        n = self.build_node.make_node(IPKG_PATH)
+        build_manifest = BuildManifest.from_file(n.abspath())
+        bento.commands.build_egg.build_egg(build_manifest, self.build_node, self.build_node,
+                                           "dist", "foo.egg", 2)
+
+        egg = os.path.join(self.tmpdir, "dist", "foo.egg")
+        zid = zipfile.ZipFile(egg)
+        try:
+            self.assertEqual(zid.testzip(), None)
+            return dict([(name, zid.read(name)) for name in zid.namelist()])
+        finally:
+            zid.close()
+
+    def test_incremental(self):
+        members = self._build_egg()
+        self.assertEqual(sorted([os.path.basename(f) for f in self.compiled]),
+                         ["__init__.py", "bar.py", "fubar.py"])
+        self.assertEqual(members["bar.py"], "a = 1\n".encode("ascii"))
+        self.assertTrue("bar.pyc" in members)
+
+        # Unchanged modules should not be compiled again
+        self.compiled = []
+        self.top_node.find_node("bar.py").write("a = 2\n")
+        new_members = self._build_egg()
+        self.assertEqual([os.path.basename(f) for f in self.compiled], ["bar.py"])
+        self.assertEqual(new_members["bar.py"], "a = 2\n".encode("ascii"))
+        self.assertNotEqual(new_members["bar.pyc"], members["bar.pyc"])
+        self.assertEqual(new_members["fubar.pyc"], members["fubar.pyc"])
+        self.assertEqual(sorted(new_members.keys()), sorted(members.keys()))
@@ -28,7 +28,7 @@ from bento.commands.tests.utils \
         prepare_configure, prepare_build
 from bento.commands.install \
     import \
-        InstallCommand, TransactionLog, rollback_transaction
+        InstallCommand, InstallEngine, TransactionLog, rollback_transaction
 from bento.commands.options \
     import \
         OptionsContext
@@ -221,3 +221,81 @@ class TestTransactionLog(unittest.TestCase):
             self.fail("Expected failure at this point !")
         finally:
             log.close()
+
+class TestInstallEngine(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.files = write_simple_tree(op.join(self.base_dir, "src"))
+        self.target_prefix = op.join(self.base_dir, "foo")
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _files(self, kind=None):
+        ret = []
+        for source in self.files:
+            target = op.join(self.target_prefix, op.relpath(source, self.base_dir))
+            ret.append((kind, source, target))
+        return ret
+
+    def _check_installed(self, files):
+        for kind, source, target in files:
+            self.assertTrue(op.exists(target))
+            self.assertEqual(open(source).read(), open(target).read())
+
+    def test_parallel(self):
+        files = self._files()
+        InstallEngine(4).install(files)
+        self._check_installed(files)
+
+    def test_executables(self):
+        files = self._files("executables")
+        InstallEngine(2).install(files)
+        for kind, source, target in files:
+            self.assertTrue(os.access(target, os.X_OK))
+
+    def test_up_to_date(self):
+        files = self._files()
+        InstallEngine(2).install(files)
+
+        # Only the modified file should be copied again
+        modified = files[3][2]
+        fid = open(modified, "w")
+        try:
+            fid.write("modified")
+        finally:
+            fid.close()
+        for kind, source, target in files:
+            os.utime(target, (0, 0))
+        InstallEngine(2).install(files)
+
+        self._check_installed(files)
+        for kind, source, target in files:
+            if target == modified:
+                self.assertNotEqual(os.stat(target).st_mtime, 0)
+            else:
+                self.assertEqual(os.stat(target).st_mtime, 0)
+
+    def test_transaction(self):
+        files = self._files()
+        trans_file = op.join(self.base_dir, "trans.log")
+        log = TransactionLog(trans_file)
+        try:
+            InstallEngine(4, log).install(files)
+        finally:
+            log.close()
+        self._check_installed(files)
+
+        rollback_transaction(trans_file)
+        self.assertFalse(op.exists(self.target_prefix))
+
+    def test_transaction_existing_file(self):
+        files = self._files()
+        InstallEngine(2).install(files[-1:])
+
+        log = TransactionLog(op.join(self.base_dir, "trans.log"))
+        try:
+            self.assertRaises(ValueError, lambda: InstallEngine(2, log).install(files))
+        finally:
+            log.close()
+        self.assertFalse(op.exists(files[0][2]))
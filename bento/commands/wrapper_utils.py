@@ -12,11 +12,21 @@ def run_with_dependencies(global_context, cmd_name, cmd_argv, run_node, top_node
     """Run the given command, including its dependencies as defined in the
     global_context."""
     deps = global_context.retrieve_dependencies(cmd_name)
+    # configure is only a dependency through build (autoconfigure): it is
+    # skipped if its inputs did not change since it last succeeded
+    if "configure" in deps and \
+            _is_configure_up_to_date(global_context, top_node, run_node._ctx.bldnode):
+        deps = [dep for dep in deps if dep != "configure"]
     for dep_cmd_name in deps:
         dep_cmd_argv = global_context.retrieve_command_argv(dep_cmd_name)
         resolve_and_run_command(global_context, dep_cmd_name, dep_cmd_argv, run_node, package)
     resolve_and_run_command(global_context, cmd_name, cmd_argv, run_node, package)
 
+def _is_configure_up_to_date(global_context, top_node, build_node):
+    from bento.commands.configure import is_configure_up_to_date
+    configure_argv = global_context.retrieve_command_argv("configure")
+    return is_configure_up_to_date(configure_argv, top_node, build_node)
+
 def resolve_and_run_command(global_context, cmd_name, cmd_argv, run_node, package):
     """Run the given Command instance inside its context, including any hook
     and/or override."""
@@ -43,23 +53,25 @@ def run_command_in_context(context, cmd, pre_hooks=None, post_hooks=None):
     top_node = context.top_node
     cmd_funcs = [(cmd.run, top_node.abspath())]
 
+    tracer = getattr(context, "tracer", None)
+    cmd_name = getattr(cmd, "name", None) or cmd.__class__.__name__
+
+    def _traced(phase, func, *a):
+        if tracer is None:
+            return func(*a)
+        else:
+            return tracer.span("%s: %s" % (cmd_name, phase), "command", func, *a)
+
     def _run_hooks(hooks):
         for hook in hooks:
             local_node = top_node.find_dir(relpath(hook.local_dir, top_node.abspath()))
             context.pre_recurse(local_node)
             try:
-                hook(context)
+                _traced("hook %s" % hook.name, hook, context)
             finally:
                 context.post_recurse()
 
-    context.init()
-    try:
-        cmd.init(context)
-
-        _run_hooks(pre_hooks)
-
-        context.configure()
-
+    def _run():
         while cmd_funcs:
             cmd_func, local_dir = cmd_funcs.pop(0)
             local_node = top_node.find_dir(relpath(local_dir, top_node.abspath()))
@@ -69,11 +81,25 @@ def run_command_in_context(context, cmd, pre_hooks=None, post_hooks=None):
             finally:
                 context.post_recurse()
 
-        _run_hooks(post_hooks)
+    if tracer is not None:
+        start = tracer.now()
+    _traced("context init", context.init)
+    try:
+        _traced("command init", cmd.init, context)
+
+        _traced("pre-hooks", _run_hooks, pre_hooks)
+
+        _traced("configure", context.configure)
+
+        _traced("run", _run)
+
+        _traced("post-hooks", _run_hooks, post_hooks)
 
-        cmd.finish(context)
+        _traced("command finish", cmd.finish, context)
     finally:
-        context.finish()
+        _traced("context finish", context.finish)
+        if tracer is not None:
+            tracer.add_span(cmd_name, "command", start, tracer.now())
 
     return cmd, context
 
@@ -83,6 +83,99 @@ if sys.platform == 'cygwin':
 elif sys.platform == 'win32':
     split_path = split_path_win32
 
+def _scan_directory(path):
+    """Return the sorted list of (name, isdir) for the entries of path."""
+    try:
+        scandir = os.scandir
+    except AttributeError:
+        ret = [(name, op.isdir(op.join(path, name))) for name in os.listdir(path)]
+    else:
+        ret = []
+        for entry in scandir(path):
+            try:
+                isdir = entry.is_dir()
+            except OSError:
+                isdir = False
+            ret.append((entry.name, isdir))
+    ret.sort()
+    return ret
+
+class GlobCache(object):
+    """Cache of directory listings, to be shared by ant_glob calls walking the
+    same directories.
+
+    The cache is never invalidated: it should only be used while the
+    globbed directories are not modified."""
+    def __init__(self):
+        self._listings = {}
+
+    def scan(self, path):
+        try:
+            return self._listings[path]
+        except KeyError:
+            ret = self._listings[path] = _scan_directory(path)
+            return ret
+
+# pattern string (or tuple of pattern strings) -> compiled patterns
+_PATTERNS_CACHE = {}
+
+def _compile_pattern_component(k):
+    k = k.replace('.', '[.]').replace('*','.*').replace('?', '.').replace('+', '\\+')
+    return re.compile('^%s$' % k).match
+
+def _compile_patterns(s):
+    """Compile ant patterns into a tuple of patterns, each pattern being a
+    tuple of path components: either '**', or the match method of a
+    compiled regex."""
+    if isinstance(s, list):
+        key = tuple(s)
+    else:
+        key = s
+    try:
+        return _PATTERNS_CACHE[key]
+    except KeyError:
+        pass
+
+    ret = []
+    for x in to_list(s):
+        x = x.replace('\\', '/').replace('//', '/')
+        if x.endswith('/'):
+            x += '**'
+        accu = []
+        for k in x.split('/'):
+            if k == '**':
+                accu.append(k)
+            else:
+                accu.append(_compile_pattern_component(k))
+        ret.append(tuple(accu))
+    ret = _PATTERNS_CACHE[key] = tuple(ret)
+    return ret
+
+def _filtre(name, nn):
+    """Return the patterns still to be matched below name (the empty tuple
+    meaning name is matched)."""
+    ret = set()
+    for lst in nn:
+        if not lst:
+            pass
+        elif lst[0] == '**':
+            ret.add(lst)
+            if len(lst) > 1:
+                if lst[1](name):
+                    ret.add(lst[2:])
+            else:
+                ret.add(())
+        elif lst[0](name):
+            ret.add(lst[1:])
+    return ret
+
+def _accept(name, pats):
+    nacc = _filtre(name, pats[0])
+    nrej = _filtre(name, pats[1])
+    if () in nrej:
+        nacc = set()
+    return [nacc, nrej]
+
 class Node(object):
     __slots__ = ('name', 'sig', 'children', 'parent', 'cache_abspath', 'cache_isdir')
     def __init__(self, name, parent):
@@ -340,7 +433,7 @@ class Node(object):
             p = p.parent
         return id(p) == id(node)
 
-    def _ant_iter(self, accept=None, maxdepth=25, pats=[], dir=False, src=True, remove=True):
+    def _ant_iter(self, accept=None, maxdepth=25, pats=[], dir=False, src=True, remove=True, cache=None):
         """
         Semi-private and recursive method used by ant_glob.
 
@@ -356,26 +449,29 @@ class Node(object):
         :type src: bool
         :param remove: remove files/folders that do not exist (True by default)
         :type remove: bool
+        :param cache: directory listings cache
+        :type cache: GlobCache
         """
-        dircont = self.listdir()
-        dircont.sort()
+        if cache is None:
+            dircont = _scan_directory(self.abspath())
+        else:
+            dircont = cache.scan(self.abspath())
 
         try:
             lst = set(self.children.keys())
             if remove:
-                for x in lst - set(dircont):
+                for x in lst - set([name for name, isdir in dircont]):
                     del self.children[x]
         except:
             self.children = {}
 
-        for name in dircont:
+        for name, isdir in dircont:
             npats = accept(name, pats)
             if npats and npats[0]:
-                accepted = [] in npats[0]
+                accepted = () in npats[0]
 
                 node = self.make_node([name])
 
-                isdir = os.path.isdir(node.abspath())
                 if accepted:
                     if isdir:
                         if dir:
@@ -386,10 +482,10 @@ class Node(object):
 
                 if getattr(node, 'cache_isdir', None) or isdir:
                     node.cache_isdir = True
-                    if maxdepth:
-                        for k in node._ant_iter(accept=accept, maxdepth=maxdepth - 1, pats=npats, dir=dir, src=src):
+                    # Do not look into directories where no pattern can match
+                    if maxdepth and len(npats[0]) > accepted:
+                        for k in node._ant_iter(accept=accept, maxdepth=maxdepth - 1, pats=npats, dir=dir, src=src, remove=remove, cache=cache):
                             yield k
-        raise StopIteration
 
     def ant_glob(self, *k, **kw):
         """
@@ -422,6 +518,8 @@ class Node(object):
         :type remove: bool
         :param maxdepth: maximum depth of recursion
         :type maxdepth: int
+        :param cache: directory listings shared between several ant_glob calls
+        :type cache: GlobCache
         """
 
         src = kw.get('src', True)
@@ -430,49 +528,7 @@ class Node(object):
         excl = kw.get('excl', exclude_regs)
         incl = k and k[0] or kw.get('incl', '**')
 
-        def to_pat(s):
-            lst = to_list(s)
-            ret = []
-            for x in lst:
-                x = x.replace('\\', '/').replace('//', '/')
-                if x.endswith('/'):
-                    x += '**'
-                lst2 = x.split('/')
-                accu = []
-                for k in lst2:
-                    if k == '**':
-                        accu.append(k)
-                    else:
-                        k = k.replace('.', '[.]').replace('*','.*').replace('?', '.').replace('+', '\\+')
-                        k = '^%s$' % k
-                        accu.append(re.compile(k))
-                ret.append(accu)
-            return ret
-
-        def filtre(name, nn):
-            ret = []
-            for lst in nn:
-                if not lst:
-                    pass
-                elif lst[0] == '**':
-                    ret.append(lst)
-                    if len(lst) > 1:
-                        if lst[1].match(name):
-                            ret.append(lst[2:])
-                    else:
-                        ret.append([])
-                elif lst[0].match(name):
-                    ret.append(lst[1:])
-            return ret
-
-        def accept(name, pats):
-            nacc = filtre(name, pats[0])
-            nrej = filtre(name, pats[1])
-            if [] in nrej:
-                nacc = []
-            return [nacc, nrej]
-
-        ret = [x for x in self._ant_iter(accept=accept, pats=[to_pat(incl), to_pat(excl)], maxdepth=25, dir=dir, src=src, remove=kw.get('remove', True))]
+        ret = [x for x in self._ant_iter(accept=_accept, pats=[_compile_patterns(incl), _compile_patterns(excl)], maxdepth=25, dir=dir, src=src, remove=kw.get('remove', True), cache=kw.get('cache', None))]
         if kw.get('flat', False):
             return ' '.join([x.path_from(self) for x in ret])
 
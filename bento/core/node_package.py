@@ -7,7 +7,7 @@ from bento.core.pkg_objects \
         Extension
 from bento.core.node \
     import \
-        split_path
+        split_path, GlobCache
 
 def translate_name(name, ref_node, from_node):
     if from_node != ref_node:
@@ -111,10 +111,13 @@ class NodeRepresentation(object):
         self._extra_source_nodes = []
         self._aliased_source_nodes = {}
 
+        # Directory listings shared by the globs of update_package
+        self._glob_cache = None
+
     def to_node_extension(self, extension, source_node, ref_node):
         nodes = []
         for s in extension.sources:
-            _nodes = source_node.ant_glob(s)
+            _nodes = source_node.ant_glob(s, cache=self._glob_cache)
             if len(_nodes) < 1:
                 #name = translate_name(extension.name, ref_node, self.top_or_sub_directory_node)
                 raise IOError("Sources glob entry %r for extension %r did not return any result" \
@@ -195,7 +198,7 @@ class NodeRepresentation(object):
             ref_node = self.top_node.find_node(data_section.source_dir)
             nodes = []
             for f in data_section.files:
-                ns = ref_node.ant_glob(f)
+                ns = ref_node.ant_glob(f, cache=self._glob_cache)
                 if len(ns) < 1:
                     raise IOError("File/glob %s could not be resolved (data file section %s)" % (f, name))
                 else:
@@ -212,20 +215,24 @@ class NodeRepresentation(object):
 
     def _update_extra_sources(self, pkg):
         for s in pkg.extra_source_files:
-            nodes = self.top_node.ant_glob(s)
+            nodes = self.top_node.ant_glob(s, cache=self._glob_cache)
             if len(nodes) < 1:
                 warnings.warn("extra source files glob entry %r did not return any result" % (s,))
             self._extra_source_nodes.extend(nodes)
 
     def update_package(self, pkg):
-        self._update_py_packages(pkg)
-        self._update_py_modules(pkg)
+        self._glob_cache = GlobCache()
+        try:
+            self._update_py_packages(pkg)
+            self._update_py_modules(pkg)
 
-        self._update_extensions(pkg)
-        self._update_libraries(pkg)
+            self._update_extensions(pkg)
+            self._update_libraries(pkg)
 
-        self._update_data_files(pkg)
-        self._update_extra_sources(pkg)
+            self._update_data_files(pkg)
+            self._update_extra_sources(pkg)
+        finally:
+            self._glob_cache = None
 
     def iter_category(self, category):
         if category in self._registry:
@@ -261,7 +268,16 @@ class NodeRepresentation(object):
                 yield n
 
     def iter_source_files(self):
+        # Nodes below run_node are the common case: avoid walking the tree
+        # in path_from for those
+        run_prefix = self.run_node.abspath()
+        if not run_prefix.endswith(os.sep):
+            run_prefix += os.sep
         for n in self.iter_source_nodes():
-            filename = n.path_from(self.run_node)
+            path = n.abspath()
+            if path.startswith(run_prefix):
+                filename = path[len(run_prefix):]
+            else:
+                filename = n.path_from(self.run_node)
             alias = self._aliased_source_nodes.get(n, filename)
             yield filename, alias
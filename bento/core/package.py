@@ -1,8 +1,22 @@
 import os
+import collections
 
 from copy \
     import \
-        deepcopy
+        copy, deepcopy
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+import six
+
+from six.moves import cPickle
 
 from bento.core.pkg_objects \
     import \
@@ -24,7 +38,10 @@ from bento.core.parse_helpers \
         extract_top_dicts, extract_top_dicts_subento
 from bento.errors \
     import \
-        InvalidPackage, InternalBentoError
+        InvalidPackage, InternalBentoError, ParseError
+from bento.utils.utils \
+    import \
+        cpu_count, extract_exception
 import bento.utils.path
 
 def _parse_libraries(libraries):
@@ -49,35 +66,139 @@ def _parse_libraries(libraries):
                     CompiledLibrary.from_parse_dict(v)
     return ret
 
-def recurse_subentos(subentos, source_dir):
+class _BoundedCache(dict):
+    """Dictionary keeping at most max_size entries, the oldest ones being
+    dropped first."""
+    def __init__(self, max_size):
+        dict.__init__(self)
+        self.max_size = max_size
+        self._order = collections.deque()
+
+    def __setitem__(self, key, value):
+        if not key in self:
+            self._order.append(key)
+            while len(self._order) > self.max_size:
+                dict.__delitem__(self, self._order.popleft())
+        dict.__setitem__(self, key, value)
+
+    def clear(self):
+        dict.clear(self)
+        self._order.clear()
+
+# md5 of a subento file content -> pickled (kw, subentos), as returned by
+# raw_to_subpkg_kw. Pickled so that every user of a cached entry gets its own
+# objects. Bounded, as it lives as long as the process (test runs, package
+# cache...).
+_SUBENTOS_CACHE = _BoundedCache(512)
+
+# Below this number of subento files to parse at once, starting a pool of
+# processes costs more than it saves
+_PARALLEL_THRESHOLD = 8
+
+def _parse_subento(args):
+    data, filename = args
+    try:
+        d = raw_parse(data, filename)
+        return cPickle.dumps(raw_to_subpkg_kw(d), 2), None
+    except Exception:
+        # Raised later, so that the error is the same as when parsing
+        # subentos one after the other
+        e = extract_exception()
+        token = getattr(e, "token", None)
+        if token is not None and hasattr(token, "lexer"):
+            # The lexer cannot be sent back from a worker process
+            e.token = copy(token)
+            del e.token.lexer
+        return None, e
+
+def _subento_file(cwd, subento):
+    return os.path.normpath(os.path.join(cwd, subento, "bento.info"))
+
+def recurse_subentos(subentos, source_dir, jobs=None):
+    """Parse the given subentos and the ones they recursively refer to.
+
+    Subento files are parsed breadth-first, each level in a pool of
+    processes when large enough. Results are merged in declaration order,
+    and errors raised for the first failing subento in that order, as if
+    files were parsed one after the other."""
+    if jobs is None:
+        jobs = cpu_count()
+
+    # filename -> (kw, subento files) or exception to raise
+    results = {}
+    pool = None
+    try:
+        level = [_subento_file(source_dir, s) for s in subentos]
+        while level:
+            # newly seen files of this level -> pickled (kw, subentos)
+            pickled = {}
+            new_files = []
+            to_parse = []
+            for f in level:
+                if f in results or f in pickled:
+                    continue
+                if not os.path.exists(f):
+                    results[f] = ValueError("%s not found !" % f)
+                    continue
+                fid = open(f)
+                try:
+                    data = fid.read()
+                finally:
+                    fid.close()
+                if isinstance(data, six.text_type):
+                    checksum = md5(data.encode("utf-8")).hexdigest()
+                else:
+                    checksum = md5(data).hexdigest()
+                new_files.append(f)
+                pickled[f] = _SUBENTOS_CACHE.get(checksum)
+                if pickled[f] is None:
+                    to_parse.append((f, data, checksum))
+
+            args = [(data, f) for f, data, checksum in to_parse]
+            if pool is None and multiprocessing is not None and jobs > 1 \
+                    and len(to_parse) >= _PARALLEL_THRESHOLD:
+                pool = multiprocessing.Pool(min(jobs, len(to_parse)))
+            if pool is None:
+                parsed = [_parse_subento(a) for a in args]
+            else:
+                parsed = pool.map(_parse_subento, args)
+            for (f, data, checksum), (p, error) in zip(to_parse, parsed):
+                if error is None:
+                    pickled[f] = _SUBENTOS_CACHE[checksum] = p
+                else:
+                    if isinstance(error, ParseError):
+                        error.filename = f
+                    results[f] = error
+
+            level = []
+            for f in new_files:
+                if f not in results:
+                    kw, children = cPickle.loads(pickled[f])
+                    children = [_subento_file(os.path.dirname(f), s) for s in children]
+                    results[f] = (kw, children)
+                    level.extend(children)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
     filenames = []
     subpackages = {}
-
-    # FIXME: this is damn ugly - using nodes would be good here
-    def _recurse(subento, cwd):
-        f = os.path.normpath(os.path.join(cwd, subento, "bento.info"))
-        if not os.path.exists(f):
-            raise ValueError("%s not found !" % f)
-        filenames.append(relpath(f, source_dir))
-
-        fid = open(f)
-        try:
-            key = relpath(f, source_dir)
-            rdir = relpath(os.path.join(cwd, subento), source_dir)
-
-            d = raw_parse(fid.read(), f)
-            kw, subentos = raw_to_subpkg_kw(d)
-            subpackages[key] = SubPackageDescription(rdir, **kw)
-            hooks_as_abspaths = [os.path.normpath(os.path.join(cwd, subento, h)) \
-                                 for h in subpackages[key].hook_files]
-            filenames.extend([relpath(f, source_dir) for f in hooks_as_abspaths])
-            for s in subentos:
-                _recurse(s, os.path.join(cwd, subento))
-        finally:
-            fid.close()
+    def _merge(f):
+        if isinstance(results[f], Exception):
+            raise results[f]
+        kw, children = results[f]
+        key = relpath(f, source_dir)
+        filenames.append(key)
+        cwd = os.path.dirname(f)
+        subpackages[key] = SubPackageDescription(relpath(cwd, source_dir), **kw)
+        filenames.extend([relpath(os.path.normpath(os.path.join(cwd, h)), source_dir) \
+                          for h in subpackages[key].hook_files])
+        for child in children:
+            _merge(child)
 
     for s in subentos:
-        _recurse(s, source_dir)
+        _merge(_subento_file(source_dir, s))
     return subpackages, filenames
 
 def build_libs_from_dict(libraries_d):
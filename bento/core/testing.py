@@ -211,7 +211,7 @@ def create_fake_package(top_node, packages=None, modules=None, extensions=None,
             n = top_or_lib_node.make_node(f)
             n.write("")
 
-    for section in data_files.itervalues():
+    for section in data_files.values():
         source_dir_node = top_or_lib_node.make_node(section.source_dir)
         source_dir_node.mkdir()
         for f in section.files:
@@ -12,7 +12,7 @@ from bento.compat.api.moves \
         unittest
 from bento.core.node \
     import \
-        Node, create_root_with_source_tree, find_root, split_path_win32, split_path_cygwin
+        Node, GlobCache, create_root_with_source_tree, find_root, split_path_win32, split_path_cygwin
 
 class TestNode(unittest.TestCase):
     def setUp(self):
@@ -126,6 +126,48 @@ class TestNodeInsideTemp(unittest.TestCase):
         foobar = self.d_node.find_node("foo.bar")
         self.assertEqual(set(node.abspath() for node in nodes), set([foobar.abspath()]))
 
+    def _make_tree(self):
+        for filename in ["a.txt", op.join("sub", "b.txt"), op.join("sub", "c.py"),
+                         op.join("sub", "deep", "d.txt"), op.join("other", "e.txt"),
+                         op.join(".git", "f.txt")]:
+            n = self.d_node.make_node(filename)
+            n.parent.mkdir()
+            n.write("")
+
+    def test_ant_recursive(self):
+        self._make_tree()
+        nodes = self.d_node.ant_glob("**/*.txt")
+        self.assertEqual([n.path_from(self.d_node) for n in nodes],
+                         ["a.txt", op.join("other", "e.txt"), op.join("sub", "b.txt"),
+                          op.join("sub", "deep", "d.txt")])
+        nodes = self.d_node.ant_glob("sub/")
+        self.assertEqual([n.path_from(self.d_node) for n in nodes],
+                         [op.join("sub", "b.txt"), op.join("sub", "c.py"), op.join("sub", "deep", "d.txt")])
+
+    def test_ant_cache(self):
+        self._make_tree()
+        ref = [self.d_node.ant_glob(pattern) for pattern in ["**/*.txt", "sub/*.py"]]
+
+        cache = GlobCache()
+        scanned = []
+        old_scan = cache.scan
+        def _scan(path):
+            scanned.append(path)
+            return old_scan(path)
+        cache.scan = _scan
+
+        nodes = [self.d_node.ant_glob(pattern, cache=cache) for pattern in ["**/*.txt", "sub/*.py"]]
+        # Same node instances as without the cache
+        self.assertEqual(nodes, ref)
+        for n, r_n in zip(nodes[0], ref[0]):
+            self.assertTrue(n is r_n)
+
+        # .git is excluded, and sub/deep cannot match sub/*.py: neither
+        # should be looked into, and each directory is listed only once
+        self.assertFalse(self.d_node.find_node(".git").abspath() in scanned)
+        self.assertEqual(scanned[4:], [self.d_node.abspath(), self.d_node.find_node("sub").abspath()])
+        self.assertEqual(len(cache._listings), 4)
+
 class TestNodeWithBuild(unittest.TestCase):
     def setUp(self):
         top = os.getcwd()
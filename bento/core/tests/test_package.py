@@ -1,12 +1,20 @@
 import os
+import shutil
 import tempfile
 
 from bento.compat.api.moves \
     import \
         unittest
+from bento.errors \
+    import \
+        ParseError
+from bento.utils.utils \
+    import \
+        extract_exception
 from bento.core.package \
     import \
-        PackageDescription
+        PackageDescription, recurse_subentos
+import bento.core.package
 from bento.core.package import static_representation
 from bento.core.meta import PackageMetadata
 from bento.core.pkg_objects import DataFiles
@@ -81,3 +89,101 @@ class TestPackageMetadata(unittest.TestCase):
         self.assertEqual(meta.fullname, "foo-1.0")
         self.assertEqual(meta.contact, "John Doe")
         self.assertEqual(meta.contact_email, "john@doe.com")
+
+class TestRecurseSubentos(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.old_threshold = bento.core.package._PARALLEL_THRESHOLD
+        self.old_raw_parse = bento.core.package.raw_parse
+        bento.core.package._SUBENTOS_CACHE.clear()
+
+        self.nparses = 0
+        def _raw_parse(*a, **kw):
+            self.nparses += 1
+            return self.old_raw_parse(*a, **kw)
+        bento.core.package.raw_parse = _raw_parse
+
+        self._write("foo/bento.info", "HookFile: hook.py\nRecurse: sub2, sub1\n")
+        self._write("foo/sub1/bento.info", "Library:\n    Packages: sub1\n")
+        self._write("foo/sub2/bento.info", "Library:\n    Packages: sub2\n")
+        self._write("bar/bento.info", "Library:\n    Packages: bar\n")
+
+    def tearDown(self):
+        bento.core.package._PARALLEL_THRESHOLD = self.old_threshold
+        bento.core.package.raw_parse = self.old_raw_parse
+        shutil.rmtree(self.d)
+
+    def _write(self, filename, content):
+        filename = os.path.join(self.d, filename)
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        fid = open(filename, "w")
+        try:
+            fid.write(content)
+        finally:
+            fid.close()
+
+    def test_declaration_order(self):
+        r_filenames = [os.path.join("foo", "bento.info"), os.path.join("foo", "hook.py"),
+                       os.path.join("foo", "sub2", "bento.info"),
+                       os.path.join("foo", "sub1", "bento.info"),
+                       os.path.join("bar", "bento.info")]
+        for jobs in [1, 2]:
+            # Force the use of a pool of processes
+            bento.core.package._PARALLEL_THRESHOLD = 1
+            bento.core.package._SUBENTOS_CACHE.clear()
+            subpackages, filenames = recurse_subentos(["foo", "bar"], self.d, jobs=jobs)
+            self.assertEqual(filenames, r_filenames)
+            self.assertEqual(sorted(subpackages.keys()), sorted(r_filenames[:1] + r_filenames[2:]))
+            self.assertEqual(subpackages[os.path.join("foo", "sub1", "bento.info")].rdir,
+                             os.path.join("foo", "sub1"))
+            self.assertEqual(subpackages[os.path.join("foo", "sub1", "bento.info")].packages,
+                             ["sub1"])
+
+    def test_cache(self):
+        recurse_subentos(["foo", "bar"], self.d, jobs=1)
+        self.assertEqual(self.nparses, 4)
+        subpackages, filenames = recurse_subentos(["foo", "bar"], self.d, jobs=1)
+        self.assertEqual(self.nparses, 4)
+        self.assertEqual(subpackages[os.path.join("bar", "bento.info")].packages, ["bar"])
+
+        # Cached results are not shared between calls
+        subpackages[os.path.join("bar", "bento.info")].packages.append("fubar")
+        subpackages, filenames = recurse_subentos(["bar"], self.d, jobs=1)
+        self.assertEqual(subpackages[os.path.join("bar", "bento.info")].packages, ["bar"])
+
+        self._write("bar/bento.info", "Library:\n    Packages: fubar\n")
+        subpackages, filenames = recurse_subentos(["bar"], self.d, jobs=1)
+        self.assertEqual(subpackages[os.path.join("bar", "bento.info")].packages, ["fubar"])
+        self.assertEqual(self.nparses, 5)
+
+    def test_cache_size(self):
+        old_max_size = bento.core.package._SUBENTOS_CACHE.max_size
+        bento.core.package._SUBENTOS_CACHE.max_size = 2
+        try:
+            recurse_subentos(["foo", "bar"], self.d, jobs=1)
+            self.assertEqual(len(bento.core.package._SUBENTOS_CACHE), 2)
+            # sub1, parsed last, is still cached, but not bar
+            recurse_subentos([os.path.join("foo", "sub1")], self.d, jobs=1)
+            self.assertEqual(self.nparses, 4)
+            recurse_subentos(["bar"], self.d, jobs=1)
+            self.assertEqual(self.nparses, 5)
+        finally:
+            bento.core.package._SUBENTOS_CACHE.max_size = old_max_size
+
+    def test_errors(self):
+        self._write("foo/sub1/bento.info", "Library:\n    Packages: sub1,\n")
+        # Lexer error
+        self._write("bar/bento.info", "Library:\n    Packages bar\n")
+        for jobs in [1, 2]:
+            bento.core.package._PARALLEL_THRESHOLD = 1
+            try:
+                recurse_subentos(["foo", "bar"], self.d, jobs=jobs)
+                self.fail("ParseError not raised")
+            except ParseError:
+                e = extract_exception()
+                # sub1 comes before bar in declaration order, even though bar
+                # is parsed first
+                self.assertEqual(e.filename, os.path.join(self.d, "foo", "sub1", "bento.info"))
+
+        self.assertRaises(ValueError, lambda: recurse_subentos(["fubar", "foo"], self.d, jobs=1))
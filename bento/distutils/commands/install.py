@@ -15,7 +15,7 @@ from bento._config \
         IPKG_PATH
 from bento.installed_package_description \
     import \
-        BuildManifest, iter_files
+        BuildManifest
 from bento.utils.utils import subst_vars
 import bento.utils.io2
 
@@ -151,10 +151,9 @@ class install(Command):
         n = context.build_node.make_node(IPKG_PATH)
         ipkg = BuildManifest.from_file(n.abspath())
         scheme = context.retrieve_configured_scheme()
-        ipkg.update_paths(scheme)
-        file_sections = ipkg.resolve_paths_with_destdir(src_root_node=context.build_node)
 
         def writer(fid):
-            for kind, source, target in iter_files(file_sections):
+            for kind, source, target in ipkg.iter_built_files(context.build_node, scheme,
+                                                              use_destdir=True):
                 fid.write("%s\n" % target.abspath())
         bento.utils.io2.safe_write(self.record, writer, "w")
@@ -1,8 +1,11 @@
 import os
 import sys
 import copy
+import struct
 import warnings
 
+import six
+
 from bento.compat.api import json
 import bento.compat.api as compat
 
@@ -12,7 +15,7 @@ from bento.core.node \
 from bento.core.platforms \
     import \
         get_scheme
-from bento.utils.utils import subst_vars, same_content, fix_kw, explode_path
+from bento.utils.utils import subst_vars, fix_kw, explode_path, md5
 from bento.core.pkg_objects \
     import \
         Executable
@@ -67,55 +70,270 @@ InstalledSection(%(category)s,
 
 def iter_source_files(file_sections):
     for kind in file_sections:
-        if not kind in ["executables"]:
+        if not kind in ["executables", "bytecode"]:
             for name, section in file_sections[kind].items():
                 for f in section:
                     yield f[0]
 
-def iter_files(file_sections):
+class FileDigests(object):
+    """Sizes and md5 digests of files, each digest being computed at most
+    once.
+
+    Entries are keyed by absolute path, and only reused while the file size
+    and mtime are unchanged, so that they can be stored in the build
+    manifest."""
+    def __init__(self, entries=None):
+        if entries is None:
+            entries = {}
+        # path -> [size, mtime, hexdigest]
+        self._entries = entries
+        self._stats = {}
+
+    def _stat(self, path):
+        try:
+            return self._stats[path]
+        except KeyError:
+            st = os.stat(path)
+            ret = self._stats[path] = (st.st_size, st.st_mtime)
+            return ret
+
+    def size(self, path):
+        return self._stat(path)[0]
+
+    def digest(self, path):
+        size, mtime = self._stat(path)
+        entry = self._entries.get(path, None)
+        if entry is not None and entry[0] == size and entry[1] == mtime:
+            return entry[2]
+
+        m = md5()
+        fid = open(path, "rb")
+        try:
+            while True:
+                data = fid.read(65536)
+                if not data:
+                    break
+                m.update(data)
+        finally:
+            fid.close()
+        digest = m.hexdigest()
+        self._entries[path] = [size, mtime, digest]
+        return digest
+
+    def same_content(self, f1, f2):
+        """Return true if files f1 and f2 have the same content. Digests are
+        only computed for files of the same size."""
+        if f1 == f2:
+            return True
+        return self.size(f1) == self.size(f2) and self.digest(f1) == self.digest(f2)
+
+    def to_json_dict(self):
+        return self._entries
+
+def _find_duplicates(file_sections, digests, path, is_src, is_bld):
     # XXX: what to do with multiple source for a same target ? It is not always
     # easy to avoid this situation, especially for python files and files
-    # installed from wildcards. For now, we raise an exception unless the
-    # sources have the exact same content, but this may not be enough (what if
+    # installed from wildcards. For now, we reject the sources unless they
+    # have the exact same content, but this may not be enough (what if
     # category changes ? This may cause different target permissions and other
     # category-specific post-processing during install)
+    #
+    # Files are identified by their (kind, name, index in section) position.
+    # Return (selected, conflicts): selected maps each target path to the
+    # position of its first source, or to the set of positions of its sources
+    # to install if there are several
+    selected = {}
+    conflicts = []
     installed_files = {}
-    def _is_redundant(source, target):
-        source_path = source.abspath()
-        target_path = target.abspath()
-        # If this install already installs something @ target, we raise an
-        # error unless the content is exactly the same
-        if not target in installed_files:
-            installed_files[target] = source
-            return False
-        else:
-            if not same_content(source_path, installed_files[target].abspath()):
+    for kind in file_sections:
+        for name, section in file_sections[kind].items():
+            for i, (source, target) in enumerate(section):
+                target_path = path(target)
+                # If this install already installs something @ target, we
+                # reject it unless the content is exactly the same
+                if not target_path in installed_files:
+                    installed_files[target_path] = source
+                    selected[target_path] = (kind, name, i)
+                    continue
+                installed = installed_files[target_path]
+                if digests.same_content(path(source), path(installed)):
+                    continue
                 # See top comment: not sure there is any good solution to
                 # select which one should be selected when a target has
                 # multiple sources
-                if source.is_src() and installed_files[target].is_bld():
-                    return False
-                if source.is_bld() and installed_files[target].is_src():
-                    return True
-                else:
-                    raise IOError("Multiple source_path for same target_path %r ! %s and %s" % \
-                                  (target_path, source_path, installed_files[target].abspath()))
-            else:
-                return True
-
+                if is_src(source) and is_bld(installed):
+                    positions = selected[target_path]
+                    if not isinstance(positions, set):
+                        positions = selected[target_path] = set([positions])
+                    positions.add((kind, name, i))
+                elif not (is_bld(source) and is_src(installed)):
+                    conflicts.append((target_path, path(source), path(installed)))
+    return selected, conflicts
+
+def _check_conflicts(conflicts):
+    if conflicts:
+        raise IOError("Multiple source_path for same target_path:\n" + \
+                      "\n".join(["    %r: %s and %s" % conflict for conflict in conflicts]))
+
+def _iter_selected_files(file_sections, selected):
     for kind in file_sections:
         for name, section in file_sections[kind].items():
-            for source, target in section:
-                if not _is_redundant(source, target):
+            for i, (source, target) in enumerate(section):
+                positions = selected.get(target.abspath(), None)
+                position = (kind, name, i)
+                if position == positions or \
+                        (isinstance(positions, set) and position in positions):
                     yield kind, source, target
 
+def iter_files(file_sections, digests=None):
+    """Iterate over the (kind, source node, target node) of the given
+    resolved sections, skipping sources redundant with a previous source of
+    the same target.
+
+    Raises an IOError listing every target with conflicting sources before
+    anything is yielded."""
+    if digests is None:
+        digests = FileDigests()
+    selected, conflicts = _find_duplicates(file_sections, digests, lambda n: n.abspath(),
+                                           lambda n: n.is_src(), lambda n: n.is_bld())
+    _check_conflicts(conflicts)
+    for f in _iter_selected_files(file_sections, selected):
+        yield f
+
+# Binary build manifest format (all integers little endian):
+#   - magic, version (uint16), header size (uint32), json header (meta,
+#     executables, install paths and file digests)
+#   - string table: count (uint32), then for each string its size (uint32)
+#     and utf-8 content. Section attributes and file directories are
+#     interned in this table
+#   - section index: count (uint32), then for each section the string
+#     indices of its category, name, source and target directories, its
+#     number of files, and the offset and size of its file records
+#   - file records, one block per section: the number of files and of
+#     targets differing from their source (uint32), the source directory
+#     index of every file (uint32), the (file position, target directory
+#     index) pairs of differing targets (uint32), and the null-separated
+#     basenames of every source, then of every differing target
+_MANIFEST_MAGIC = "BMF\x00".encode("ascii")
+_MANIFEST_VERSION = 1
+
+_INDEX_ENTRY = struct.Struct("<IIIIIII")
+
+def _encode(s):
+    if isinstance(s, bytes):
+        return s
+    else:
+        return s.encode("utf-8")
+
+def _encode_records(files, intern_string):
+    dirs = []
+    targets = []
+    names = []
+    target_names = []
+    for source, target in files:
+        i = source.rfind("/") + 1
+        dirs.append(intern_string(source[:i]))
+        names.append(source[i:])
+        if target != source:
+            i = target.rfind("/") + 1
+            targets.extend([len(dirs) - 1, intern_string(target[:i])])
+            target_names.append(target[i:])
+    return struct.pack("<II", len(dirs), len(targets) // 2) \
+            + struct.pack("<%dI" % len(dirs), *dirs) \
+            + struct.pack("<%dI" % len(targets), *targets) \
+            + _encode("\x00".join(names + target_names))
+
+def _decode_records(data, strings):
+    count, n_targets = struct.unpack("<II", data[:8])
+    offset = 8
+    dirs = struct.unpack("<%dI" % count, data[offset:offset+4*count])
+    offset += 4 * count
+    targets = struct.unpack("<%dI" % (2 * n_targets), data[offset:offset+8*n_targets])
+    offset += 8 * n_targets
+    names = data[offset:].decode("utf-8").split("\x00")
+
+    sources = [strings[d] + name for d, name in zip(dirs, names)]
+    files = list(zip(sources, sources))
+    for i in range(n_targets):
+        position = targets[2*i]
+        files[position] = (sources[position], strings[targets[2*i+1]] + names[count+i])
+    return files
+
+class _ManifestFiles(object):
+    """Read-only sequence of the (source, target) pairs of a section, decoded
+    from the binary manifest each time it is iterated over."""
+    def __init__(self, read_block, offset, size, count, strings):
+        self._read_block = read_block
+        self._offset = offset
+        self._size = size
+        self._count = count
+        self._strings = strings
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(_decode_records(self._read_block(self._offset, self._size), self._strings))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+def _read_exactly(fid, size):
+    data = fid.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated build manifest")
+    return data
+
+def _read_binary_manifest(fid, read_block):
+    """Read the header, string table and section index of a binary manifest
+    from fid, positioned after the magic. File records are read lazily
+    through read_block(offset, size), offsets being relative to the end of
+    the section index."""
+    version, header_size = struct.unpack("<HI", _read_exactly(fid, 6))
+    if version != _MANIFEST_VERSION:
+        raise ValueError("Unsupported build manifest version %d" % version)
+    data = json.loads(_read_exactly(fid, header_size).decode("utf-8"))
+
+    n_strings = struct.unpack("<I", _read_exactly(fid, 4))[0]
+    strings = []
+    for i in range(n_strings):
+        size = struct.unpack("<I", _read_exactly(fid, 4))[0]
+        strings.append(_read_exactly(fid, size).decode("utf-8"))
+
+    n_sections = struct.unpack("<I", _read_exactly(fid, 4))[0]
+    index = _read_exactly(fid, n_sections * _INDEX_ENTRY.size)
+    base = fid.tell()
+
+    def _read_records(offset, size):
+        return read_block(base + offset, size)
+
+    file_sections = []
+    for i in range(n_sections):
+        category, name, source_dir, target_dir, count, offset, size = \
+                _INDEX_ENTRY.unpack_from(index, i * _INDEX_ENTRY.size)
+        file_sections.append({"category": strings[category], "name": strings[name],
+                              "source_dir": strings[source_dir],
+                              "target_dir": strings[target_dir],
+                              "files": _ManifestFiles(_read_records, offset, size, count, strings)})
+    data["file_sections"] = file_sections
+    return data
+
+def _iter_nodes(srcdir_node, target_node, files):
+    for f, g in files:
+        yield srcdir_node.find_node(f), target_node.make_node(g)
+
 class BuildManifest(object):
     @classmethod
     def from_egg(cls, egg_path):
         zid = compat.ZipFile(egg_path)
         try:
-            data = json.loads(zid.read("EGG-INFO/ipkg.info"))
-            return cls.from_json_dict(data)
+            return cls.from_string(zid.read("EGG-INFO/ipkg.info"))
         finally:
             zid.close()
 
@@ -125,13 +343,38 @@ class BuildManifest(object):
 
     @classmethod
     def from_string(cls, s):
-        return cls.__from_data(json.loads(s))
+        """Create a build manifest from the content of a binary or json
+        manifest."""
+        if isinstance(s, bytes) and s.startswith(_MANIFEST_MAGIC):
+            fid = six.BytesIO(s)
+            fid.seek(len(_MANIFEST_MAGIC))
+            return cls.__from_data(_read_binary_manifest(fid,
+                                       lambda offset, size: s[offset:offset+size]))
+        else:
+            if isinstance(s, bytes):
+                s = s.decode("utf-8")
+            return cls.__from_data(json.loads(s))
 
     @classmethod
     def from_file(cls, filename):
-        fid = open(filename)
+        """Create a build manifest from a binary or json manifest file.
+
+        Only the header and section index of binary manifests are read here,
+        the files of each section are read when iterated over."""
+        fid = open(filename, "rb")
         try:
-            return cls.__from_data(json.load(fid))
+            if fid.read(len(_MANIFEST_MAGIC)) == _MANIFEST_MAGIC:
+                def read_block(offset, size):
+                    fid = open(filename, "rb")
+                    try:
+                        fid.seek(offset)
+                        return _read_exactly(fid, size)
+                    finally:
+                        fid.close()
+                return cls.__from_data(_read_binary_manifest(fid, read_block))
+            else:
+                fid.seek(0)
+                return cls.__from_data(json.loads(fid.read().decode("utf-8")))
         finally:
             fid.close()
 
@@ -162,9 +405,10 @@ class BuildManifest(object):
                 file_sections[category][name] = files
             else:
                 file_sections[category] = {name: files}
-        return cls(file_sections, meta_vars, executables, install_paths)
+        file_digests = FileDigests(data.get("file_digests", None))
+        return cls(file_sections, meta_vars, executables, install_paths, file_digests)
 
-    def __init__(self, file_sections, meta, executables, path_variables=None):
+    def __init__(self, file_sections, meta, executables, path_variables=None, file_digests=None):
         self.file_sections = file_sections
         self.meta = meta
         if path_variables is None:
@@ -172,30 +416,51 @@ class BuildManifest(object):
         else:
             self._path_variables = path_variables
         self.executables = executables
+        if file_digests is None:
+            self.file_digests = FileDigests()
+        else:
+            self.file_digests = file_digests
 
         self._variables = {"pkgname": self.meta["name"],
                            "py_version_short": ".".join([str(i) for i in sys.version_info[:2]])}
 
     def write(self, filename):
+        """Write the build manifest in the binary format."""
+        fid = open(filename, "wb")
+        try:
+            return self._write_binary(fid)
+        finally:
+            fid.close()
+
+    def write_json(self, filename):
+        """Write the build manifest as json, e.g. to export it."""
         fid = open(filename, "w")
         try:
             return self._write(fid)
         finally:
             fid.close()
 
-    def _write(self, fid):
+    def _iter_sections(self):
+        for category, value in self.file_sections.items():
+            if category in ["pythonfiles", "bentofiles"]:
+                for i in value.values():
+                    i.srcdir = "$_srcrootdir"
+                    yield i
+            elif category in ["datafiles", "extensions", "executables",
+                        "compiled_libraries", "bytecode"]:
+                for i in value.values():
+                    yield i
+            else:
+                warnings.warn("Unknown category %r" % category)
+                for i in value.values():
+                    yield i
+
+    def _header(self):
         def executable_to_json(executable):
             return {"name": executable.name,
                     "module": executable.module,
                     "function": executable.function}
 
-        def section_to_json(section):
-            return {"name": section.name,
-                    "category": section.category,
-                    "source_dir": section.source_dir,
-                    "target_dir": section.target_dir,
-                    "files": section.files}
-
         data = {}
         data["meta"] = self.meta
 
@@ -203,36 +468,101 @@ class BuildManifest(object):
                             for k, v in self.executables.items()])
         data["executables"] = executables
         data["install_paths"] = self._path_variables
+        return data
 
-        file_sections = []
-        for category, value in self.file_sections.items():
-            if category in ["pythonfiles", "bentofiles"]:
-                for i in value.values():
-                    i.srcdir = "$_srcrootdir"
-                    file_sections.append(section_to_json(i))
-            elif category in ["datafiles", "extensions", "executables",
-                        "compiled_libraries"]:
-                for i in value.values():
-                    file_sections.append(section_to_json(i))
-            else:
-                warnings.warn("Unknown category %r" % category)
-                for i in value.values():
-                    file_sections.append(section_to_json(i))
-        data["file_sections"] = file_sections
+    def _write(self, fid):
+        def section_to_json(section):
+            return {"name": section.name,
+                    "category": section.category,
+                    "source_dir": section.source_dir,
+                    "target_dir": section.target_dir,
+                    "files": list(section.files)}
+
+        data = self._header()
+        data["file_sections"] = [section_to_json(section) for section in self._iter_sections()]
         if "BENTOMAKER_PRETTY" in os.environ:
             json.dump(data, fid, sort_keys=True, indent=4)
         else:
             json.dump(data, fid, separators=(',', ':'))
 
+    def _write_binary(self, fid):
+        strings = []
+        string_indices = {}
+        def intern_string(s):
+            try:
+                return string_indices[s]
+            except KeyError:
+                string_indices[s] = len(strings)
+                strings.append(s)
+                return string_indices[s]
+
+        index = []
+        records = []
+        offset = 0
+        for section in self._iter_sections():
+            block = _encode_records(section.files, intern_string)
+            index.append(_INDEX_ENTRY.pack(intern_string(section.category),
+                                           intern_string(section.name),
+                                           intern_string(section.source_dir),
+                                           intern_string(section.target_dir),
+                                           len(section.files), offset, len(block)))
+            records.append(block)
+            offset += len(block)
+
+        # File digests are keyed by absolute paths of the build machine:
+        # they are not part of the json export
+        header = self._header()
+        header["file_digests"] = self.file_digests.to_json_dict()
+        header = _encode(json.dumps(header, separators=(',', ':')))
+        fid.write(_MANIFEST_MAGIC)
+        fid.write(struct.pack("<HI", _MANIFEST_VERSION, len(header)))
+        fid.write(header)
+        fid.write(struct.pack("<I", len(strings)))
+        for s in strings:
+            s = _encode(s)
+            fid.write(struct.pack("<I", len(s)))
+            fid.write(s)
+        fid.write(struct.pack("<I", len(index)))
+        fid.writelines(index)
+        fid.writelines(records)
+
     def update_paths(self, paths):
         for k, v in paths.items():
             self._path_variables[k] = v
 
-    def iter_built_files(self, src_root_node, scheme=None):
+    def iter_built_files(self, src_root_node, scheme=None, use_destdir=False):
+        """Iterate over the (kind, source node, target node) of every file to
+        install. Duplicate targets are looked for on the path strings first,
+        then sections are resolved to nodes as the iteration goes, so that
+        the nodes of every file do not need to be created upfront."""
         if scheme is None:
             scheme = {}
         self.update_paths(scheme)
-        return iter_files(self.resolve_paths(src_root_node))
+        selected = self._find_duplicates(src_root_node, use_destdir)
+        for f in _iter_selected_files(self._resolve_paths(src_root_node, use_destdir, lazy=True),
+                                      selected):
+            yield f
+
+    def update_file_digests(self, src_root_node):
+        """Compute the digests needed to resolve duplicate targets, so that
+        they are stored with the manifest instead of being computed by every
+        command using it."""
+        self._find_duplicates(src_root_node, False)
+
+    def _find_duplicates(self, src_root_node, use_destdir):
+        srcdir = src_root_node._ctx.srcnode.abspath()
+        blddir = src_root_node._ctx.bldnode.abspath()
+        def _is_below(path, directory):
+            return path == directory or path.startswith(directory + os.sep)
+        def _is_src(path):
+            return _is_below(path, srcdir) and not _is_below(path, blddir)
+        def _is_bld(path):
+            return _is_below(path, blddir)
+
+        selected, conflicts = _find_duplicates(self._resolve_path_strings(src_root_node, use_destdir),
+                                               self.file_digests, lambda p: p, _is_src, _is_bld)
+        _check_conflicts(conflicts)
+        return selected
 
     def resolve_path(self, path):
         variables = copy.copy(self._path_variables)
@@ -246,13 +576,13 @@ class BuildManifest(object):
     def resolve_paths(self, src_root_node):
         return self._resolve_paths(src_root_node, use_destdir=False)
 
-    def _resolve_paths(self, src_root_node, use_destdir):
+    def _iter_section_directories(self, src_root_node, use_destdir):
+        # Yield (category, name, section, source directory, target
+        # directory) for every section, with resolved directories
         variables = copy.copy(self._path_variables)
         variables.update(self._variables)
         variables['_srcrootdir'] = src_root_node.abspath()
 
-        root = find_root(src_root_node)
-
         def _prefix_destdir(path):
             destdir = subst_vars("$destdir", variables)
             if path:
@@ -265,22 +595,45 @@ class BuildManifest(object):
                 raise ValueError("Invalid target directory in section "
                                  "%r: %r" % (name, path))
 
-        node_sections = {}
         for category in self.file_sections:
-            node_sections[category] = {}
             for name, section in self.file_sections[category].items():
                 srcdir = subst_vars(section.source_dir, variables)
                 target = subst_vars(section.target_dir, variables)
 
                 if use_destdir:
                     target = _prefix_destdir(target)
+                yield category, name, section, srcdir, target
+
+    def _resolve_path_strings(self, src_root_node, use_destdir):
+        # Same as _resolve_paths(..., lazy=True), with (source path, target
+        # path) pairs instead of nodes
+        def _iter_paths(srcdir, target, files):
+            for f, g in files:
+                yield os.path.normpath(os.path.join(srcdir, f)), \
+                      os.path.normpath(os.path.join(target, g))
+
+        path_sections = {}
+        for category, name, section, srcdir, target in \
+                self._iter_section_directories(src_root_node, use_destdir):
+            if not category in path_sections:
+                path_sections[category] = {}
+            path_sections[category][name] = _iter_paths(srcdir, target, section.files)
+        return path_sections
+
+    def _resolve_paths(self, src_root_node, use_destdir, lazy=False):
+        root = find_root(src_root_node)
 
-                srcdir_node = root.find_node(srcdir)
-                if srcdir_node is None:
-                    raise IOError("directory %r not found !" % (srcdir,))
-                target_node = root.make_node(target)
-                node_sections[category][name] = \
-                        [(srcdir_node.find_node(f), target_node.make_node(g))
-                         for f, g in section.files]
+        node_sections = dict([(category, {}) for category in self.file_sections])
+        for category, name, section, srcdir, target in \
+                self._iter_section_directories(src_root_node, use_destdir):
+            srcdir_node = root.find_node(srcdir)
+            if srcdir_node is None:
+                raise IOError("directory %r not found !" % (srcdir,))
+            target_node = root.make_node(target)
+            files = _iter_nodes(srcdir_node, target_node, section.files)
+            if lazy:
+                node_sections[category][name] = files
+            else:
+                node_sections[category][name] = list(files)
 
         return node_sections
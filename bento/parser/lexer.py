@@ -1,3 +1,5 @@
+import re
+
 from ply.lex \
     import \
         LexToken, lex
@@ -193,38 +195,221 @@ class MyLexer(object):
     def __init__(self, stage="raw", module=None, object=None, debug=0, optimize=0,
                  lextab='lextab', reflags=0, nowarn=0, outputdir='',
                  debuglog=None, errorlog=None):
-        self.lexer = lex(module, object, debug, optimize, lextab,
-                         reflags, nowarn, outputdir, debuglog,
-                         errorlog)
         if not stage in self._stages:
             raise ValueError("Unrecognized stage %r" % (stage,))
         self.stage = stage
         self._stage_level = self._stages[stage]
-
-    def input(self, *a, **kw):
-        self.lexer.input(*a, **kw)
-        token_stream = iter(self.lexer.token, None)
-        if self._stage_level >= 2:
-            token_stream = detect_escaped(token_stream)
-        if self._stage_level >= 3:
-            token_stream = merge_escaped(token_stream)
-        if self._stage_level >= 4:
-            token_stream = indent_generator(token_stream)
-        if self._stage_level >= 5:
-            token_stream = remove_comments(token_stream)
-        if self._stage_level >= 6:
-            token_stream = post_process(token_stream, self.lexer.lexdata)
+        self.lexdata = None
+        # The PLY lexer is only needed to look at the intermediate stages:
+        # the later ones are produced by tokenize
+        if self._stage_level < self._stages["comment_removed"]:
+            self.lexer = lex(module, object, debug, optimize, lextab,
+                             reflags, nowarn, outputdir, debuglog,
+                             errorlog)
+        else:
+            self.lexer = None
+
+    def input(self, data):
+        self.lexdata = data
+        if self.lexer is None:
+            token_stream = iter(tokenize(data))
+            if self._stage_level >= 6:
+                token_stream = post_process(token_stream, data)
+        else:
+            self.lexer.input(data)
+            token_stream = iter(self.lexer.token, None)
+            if self._stage_level >= 2:
+                token_stream = detect_escaped(token_stream)
+            if self._stage_level >= 3:
+                token_stream = merge_escaped(token_stream)
+            if self._stage_level >= 4:
+                token_stream = indent_generator(token_stream)
         self.token_stream = token_stream
+        try:
+            self._next = token_stream.__next__
+        except AttributeError:
+            self._next = token_stream.next
 
     def token(self, *a, **kw):
         try:
-            return six.advance_iterator(self.token_stream)
+            return self._next()
         except StopIteration:
             return None
 
     def __iter__(self):
         return iter(self.token, None)
 
+# Same tokens as the t_* rules above, in the same order of precedence
+_TOKEN_RE = re.compile(r"""
+    (?P<WORD>[^#^:,\s\\()]+)
+  | (?P<WS>[ ]+)
+  | (?P<NEWLINE>\n+|(?:\r\n)+)
+  | (?P<DOUBLE_COLON>::)
+  | (?P<BACKSLASH>\\)
+  | (?P<LPAR>\()
+  | (?P<RPAR>\))
+  | (?P<SHARP>\#)
+  | (?P<COLON>:)
+  | (?P<COMMA>,)
+""", re.VERBOSE)
+
+def _illegal_character(data, pos, lineno):
+    if data[pos] == "\t":
+        return SyntaxError("Illegal tab character at line %d" % lineno)
+    else:
+        return SyntaxError("Illegal character '%s' at line %d" % (data[pos], lineno))
+
+def tokenize(data):
+    """Return the list of tokens of the given bento.info content, with
+    escaped characters merged, indentation tokens generated and comments
+    removed.
+
+    This is equivalent to running the PLY lexer through detect_escaped,
+    merge_escaped, indent_generator and remove_comments, but the text is
+    scanned only once, and each later step is a plain loop over a list
+    instead of a generator wrapping every token."""
+    match = _TOKEN_RE.match
+    end = len(data)
+
+    # Scan + escaping: escaped tokens, and words next to them, are merged
+    # into a single WORD token (the last one of the run)
+    merged = []
+    run = []
+    pos = 0
+    lineno = 1
+    while pos < end:
+        m = match(data, pos)
+        if m is None:
+            raise _illegal_character(data, pos, lineno)
+        type = m.lastgroup
+        escaped = type == "BACKSLASH"
+        if escaped:
+            pos = m.end()
+            if pos >= end:
+                raise SyntaxError("EOF while escaping token %r (line %d)" %
+                                  (m.group(), lineno-1))
+            m = match(data, pos)
+            if m is None:
+                raise _illegal_character(data, pos, lineno)
+            type = m.lastgroup
+
+        tok = LexToken()
+        tok.type = type
+        tok.value = value = m.group()
+        tok.lineno = lineno
+        tok.lexpos = pos
+        pos = m.end()
+        if type == "NEWLINE":
+            lineno += len(value)
+
+        if escaped:
+            run.append(tok)
+        elif type == "WORD":
+            if run:
+                run.append(tok)
+                if not data.startswith("\\", pos):
+                    tok.value = "".join([t.value for t in run])
+                    merged.append(tok)
+                    run = []
+            elif data.startswith("\\", pos):
+                run.append(tok)
+            else:
+                merged.append(tok)
+        else:
+            if run:
+                _merge_run(run, merged)
+                run = []
+            merged.append(tok)
+    if run:
+        _merge_run(run, merged)
+
+    return _remove_comments(_generate_indents(merged))
+
+def _merge_run(run, merged):
+    last = run[-1]
+    last.value = "".join([t.value for t in run])
+    last.type = "WORD"
+    merged.append(last)
+
+def _generate_indents(merged):
+    # Same logic as indent_generator
+    indented = []
+    stack = [0]
+    former = "NEWLINE"
+    token = None
+
+    n = len(merged)
+    i = 0
+    while i < n:
+        token = merged[i]
+        i += 1
+        if former == "NEWLINE":
+            if token.type == "WS":
+                indent = len(token.value)
+            else:
+                indent = 0
+
+            if indent == stack[0]:
+                if indent > 0:
+                    if i == n:
+                        return indented
+                    token = merged[i]
+                    i += 1
+                indented.append(token)
+                former = token.type
+            elif indent > stack[0]:
+                stack.insert(0, indent)
+                indented.append(new_indent(indent, token))
+                former = "INDENT"
+            else:
+                if not indent in stack:
+                    raise ValueError("Wrong indent at line %d" % token.lineno)
+                while stack[0] > indent:
+                    indented.append(new_dedent(stack.pop(0), token))
+                if stack[0] > 0:
+                    if i == n:
+                        return indented
+                    nxt = merged[i]
+                    i += 1
+                    indented.append(nxt)
+                    former = nxt.type
+                else:
+                    indented.append(token)
+                    former = token.type
+        else:
+            indented.append(token)
+            former = token.type
+
+    while len(stack) > 1:
+        indented.append(new_dedent(stack.pop(0), token))
+    return indented
+
+def _remove_comments(indented):
+    # Same logic as remove_comments
+    tokens = []
+    n = len(indented)
+    i = 0
+    while i < n:
+        t = indented[i]
+        i += 1
+        if t.type == "SHARP":
+            if i > 1:
+                prev = indented[i-2]
+            else:
+                prev = None
+            while t.type != "NEWLINE":
+                if i == n:
+                    return tokens
+                t = indented[i]
+                i += 1
+            if prev is not None and prev.type in ("NEWLINE", "INDENT"):
+                if i == n:
+                    return tokens
+                t = indented[i]
+                i += 1
+        tokens.append(t)
+    return tokens
+
 def detect_escaped(stream):
     """Post process the given stream to generate escaped character for
     characters preceded by the escaping token."""
@@ -407,7 +592,7 @@ def singleline_tokenizer(token, state, stream):
         queue = [token]
 
     try:
-        tok = six.advance_iterator(stream)
+        tok = stream.next()
     except StopIteration:
         tok = None
 
@@ -439,7 +624,7 @@ def multiline_tokenizer(token, state, stream, internal):
         elif stream.peek().type == "DEDENT":
             try:
                 while stream.peek().type == "DEDENT":
-                    token = six.advance_iterator(stream)
+                    token = stream.next()
                     queue.insert(0, token)
                     stack.pop()
             except StopIteration:
@@ -455,7 +640,7 @@ def multiline_tokenizer(token, state, stream, internal):
         queue.insert(0, token)
 
     try:
-        token = six.advance_iterator(stream)
+        token = stream.next()
     except StopIteration:
         token = None
     return queue, token, state
@@ -468,7 +653,7 @@ def word_tokenizer(token, state, stream):
         while token.type != "NEWLINE":
             if token.type == "WORD":
                 queue.append(token)
-            token = six.advance_iterator(stream)
+            token = stream.next()
     except StopIteration:
         token = None
 
@@ -490,7 +675,7 @@ def words_tokenizer(token, state, stream, internal):
     else:
         queue = []
     try:
-        tok = six.advance_iterator(stream)
+        tok = stream.next()
     except StopIteration:
         tok = None
     return queue, tok, state
@@ -523,8 +708,8 @@ def scan_field_id(token, state, stream, lexdata):
         raise ValueError("Unknown state transition for type %s" % field_type)
 
     queue = [candidate]
-    queue.append(six.advance_iterator(stream))
-    nxt = six.advance_iterator(stream)
+    queue.append(stream.next())
+    nxt = stream.next()
     return queue, nxt, state
 
 def tokenize_conditional(stream, token):
@@ -539,7 +724,7 @@ def tokenize_conditional(stream, token):
         while nxt.type not in ["COLON", "NEWLINE"]:
             if nxt.type not in ["WS"]:
                 queue.append(nxt)
-            nxt = six.advance_iterator(stream)
+            nxt = stream.next()
         queue.append(nxt)
 
     for q in queue:
@@ -547,7 +732,7 @@ def tokenize_conditional(stream, token):
             q.type = CONDITIONAL_ID[q.value]
         ret.append(q)
 
-    return ret, six.advance_iterator(stream)
+    return ret, stream.next()
 
 def comma_list_tokenizer(token, state, stream, internal):
     queue = []
@@ -572,19 +757,19 @@ def comma_list_tokenizer(token, state, stream, internal):
             token, state = _skip_ws(token, stream, state, internal)
         while token.type not in ("NEWLINE",):
             queue.append(token)
-            token = six.advance_iterator(stream)
+            token = stream.next()
         # Eat newline
-        token = six.advance_iterator(stream)
+        token = stream.next()
         if token.type == "INDENT":
             internal.stack.append(token)
             while token.type != "DEDENT":
                 if token.type != "NEWLINE":
                     queue.append(token)
-                token = six.advance_iterator(stream)
+                token = stream.next()
             if token.type == "DEDENT":
                 internal.stack.pop(0)
             queue.append(token)
-        return _filter_ws_before_comma(queue), six.advance_iterator(stream), state
+        return _filter_ws_before_comma(queue), stream.next(), state
     except StopIteration:
         return _filter_ws_before_comma(queue), None, "EOF"
 
@@ -601,7 +786,7 @@ def find_next(token, stream, internal):
         queue.append(token)
 
     try:
-        tok = six.advance_iterator(stream)
+        tok = stream.next()
     except StopIteration:
         tok = None
 
@@ -609,6 +794,8 @@ def find_next(token, stream, internal):
 
 def post_process(stream, lexdata):
     # XXX: this is awfully complicated...
+    # Note: stream.next() is used instead of six.advance_iterator in the
+    # functions below, as the latter is a python-level wrapper on python 2
     class _Internal(object):
         def __init__(self):
             self.stack = []
@@ -619,43 +806,48 @@ def post_process(stream, lexdata):
     state = "SCANNING_FIELD_ID"
 
     stream = Peeker(stream)
-    i = six.advance_iterator(stream)
-    while i:
-        if state == "SCANNING_FIELD_ID":
-            if i.value in CONDITIONAL_ID.keys():
-                queue, i = tokenize_conditional(stream, i)
+    # Reaching the end of the stream inside a field ends the token stream,
+    # as it implicitly did before python 3.7 (PEP 479)
+    try:
+        i = stream.next()
+        while i:
+            if state == "SCANNING_FIELD_ID":
+                if i.value in CONDITIONAL_ID.keys():
+                    queue, i = tokenize_conditional(stream, i)
+                    for q in queue:
+                        yield q
+                elif i.value in META_FIELDS_ID.keys():
+                    queue, i, state = scan_field_id(i, state, stream, lexdata)
+                    for q in queue:
+                        yield q
+                else:
+                    queue, i = find_next(i, stream, internal)
+                    for q in queue:
+                        yield q
+            elif state == "SCANNING_SINGLELINE_FIELD":
+                queue, i, state = singleline_tokenizer(i, state, stream)
                 for q in queue:
                     yield q
-            elif i.value in META_FIELDS_ID.keys():
-                queue, i, state = scan_field_id(i, state, stream, lexdata)
+            elif state == "SCANNING_MULTILINE_FIELD":
+                queue, i, state = multiline_tokenizer(i, state, stream, internal)
+                while len(queue) > 0:
+                    yield queue.pop()
+            elif state == "SCANNING_WORD_FIELD":
+                queue, i, state = word_tokenizer(i, state, stream)
+                for t in queue:
+                    yield t
+            elif state == "SCANNING_WORDS_FIELD":
+                queue, i, state = words_tokenizer(i, state, stream, internal)
                 for q in queue:
                     yield q
-            else:
-                queue, i = find_next(i, stream, internal)
+            elif state == "SCANNING_COMMA_LIST_FIELD":
+                queue, i, state = comma_list_tokenizer(i, state, stream, internal)
                 for q in queue:
                     yield q
-        elif state == "SCANNING_SINGLELINE_FIELD":
-            queue, i, state = singleline_tokenizer(i, state, stream)
-            for q in queue:
-                yield q
-        elif state == "SCANNING_MULTILINE_FIELD":
-            queue, i, state = multiline_tokenizer(i, state, stream, internal)
-            while len(queue) > 0:
-                yield queue.pop()
-        elif state == "SCANNING_WORD_FIELD":
-            queue, i, state = word_tokenizer(i, state, stream)
-            for t in queue:
-                yield t
-        elif state == "SCANNING_WORDS_FIELD":
-            queue, i, state = words_tokenizer(i, state, stream, internal)
-            for q in queue:
-                yield q
-        elif state == "SCANNING_COMMA_LIST_FIELD":
-            queue, i, state = comma_list_tokenizer(i, state, stream, internal)
-            for q in queue:
-                yield q
-        else:
-            raise ValueError("Unknown state: %s" % state)
+            else:
+                raise ValueError("Unknown state: %s" % state)
+    except StopIteration:
+        return
 
 def _skip_ws(tok, stream, state, internal):
     while tok.type  in ["NEWLINE", "WS"]:
@@ -664,7 +856,7 @@ def _skip_ws(tok, stream, state, internal):
             if not nxt.type == "INDENT":
                 state = "SCANNING_FIELD_ID"
             else:
-                tok = six.advance_iterator(stream)
+                tok = stream.next()
             return tok, state
-        tok = six.advance_iterator(stream)
+        tok = stream.next()
     return tok, state
@@ -12,7 +12,7 @@ from bento.parser.parser \
         parse as _parse
 from bento.parser.visitor \
     import \
-        Dispatcher
+        CompiledAst, Dispatcher
 
 def raw_parse(data, filename=None):
     try:
@@ -28,6 +28,12 @@ def build_ast_from_raw_dict(raw_dict, user_flags=None):
     res = ast_walk(raw_dict, dispatcher)
     return res
 
+def build_asts_from_raw_dict(raw_dict, user_flags_list):
+    """Like build_ast_from_raw_dict, for each set of user flags in
+    user_flags_list. The parts which do not depend on the flags are only
+    evaluated once."""
+    return CompiledAst(raw_dict).evaluate_many(user_flags_list)
+
 def build_ast_from_data(data, user_flags=None, filename=None):
     """Parse the given data to a dictionary which is easy to exploit
     at later stages."""
@@ -1,13 +1,17 @@
+import os
+
 from unittest \
     import \
         TestCase
 
+import bento.testing.bentos
+
 from bento.utils.utils \
     import \
         extract_exception, is_string
 from bento.parser.lexer \
     import \
-        MyLexer, indent_generator, post_process
+        MyLexer, indent_generator, post_process, remove_comments, tokenize
 
 def split(s):
     ret = []
@@ -822,3 +826,45 @@ ExtraSourceFiles:
 
         ref_str = "EXTRA_SOURCE_FILES_ID COLON INDENT WORD DEDENT"
         self._test(data, split(ref_str))
+
+class TestTokenize(TestCase):
+    def _reference(self, data):
+        lexer = MyLexer(stage="indent_generated")
+        lexer.input(data)
+        return list(remove_comments(lexer.token_stream))
+
+    def _test(self, data):
+        def _key(tokens):
+            return [(t.type, t.value, t.lineno, t.lexpos) for t in tokens]
+        self.assertEqual(_key(tokenize(data)), _key(self._reference(data)))
+
+    def test_corpus(self):
+        functionals = os.path.join(os.path.dirname(__file__), "functionals")
+        for d in [os.path.dirname(bento.testing.bentos.__file__), functionals]:
+            for f in sorted(os.listdir(d)):
+                if f.endswith(".info"):
+                    fid = open(os.path.join(d, f))
+                    try:
+                        self._test(fid.read())
+                    finally:
+                        fid.close()
+
+    def test_escapes(self):
+        self._test("Files: a\\ b.txt, c\\:d, \\#e\n")
+        self._test("Files: \\\\ \\ \\\n    foo\n")
+        self._test("Summary: foo\\\nbar\n")
+
+    def test_comments(self):
+        self._test("# comment\nName: foo # comment\n")
+        self._test("Library:\n    # comment\n    Modules: foo\n# comment\n")
+        self._test("Name: foo # comment\n\n# comment\nVersion: 1.0\n")
+
+    def test_indentation(self):
+        self._test("Library:\n    Packages:\n        foo\n\n    Modules: bar\nName: foo\n")
+        self._test("Library:\r\n    Modules: foo\r\n    \r\nName: foo\r\n")
+
+    def test_errors(self):
+        self.assertRaises(SyntaxError, lambda: tokenize("Name: foo\\"))
+        self.assertRaises(SyntaxError, lambda: tokenize("Library:\n\tModules: foo\n"))
+        self.assertRaises(SyntaxError, lambda: tokenize("Name: ^foo\n"))
+        self.assertRaises(ValueError, lambda: tokenize("Library:\n    Modules: foo\n  Name: bar\n"))
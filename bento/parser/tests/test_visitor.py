@@ -12,7 +12,7 @@ from bento.parser.nodes \
         ast_walk
 from bento.parser.visitor \
     import \
-        Dispatcher
+        CompiledAst, Dispatcher
 
 def parse_and_analyse(data):
     p = parse(data)
@@ -521,3 +521,57 @@ Executable: foo
                                            "function": "main",
                                            "name": "foo"}}
         self.assertEqual(parse_and_analyse(data), self.ref)
+
+class TestCompiledAst(unittest.TestCase):
+    def test_flags(self):
+        data = """\
+Name: foo
+
+Flag: debug
+    Description: debug flag
+    Default: false
+
+Library:
+    Modules: common.py
+    if flag(debug):
+        Modules: debug.py
+    if not flag(debug):
+        Extension: _release
+            Sources: release.c
+"""
+        raw = parse(data)
+        flags = [None, {"debug": "true"}, {"debug": "false"}, {"debug": "true"}]
+        compiled = CompiledAst(raw)
+        results = compiled.evaluate_many(flags)
+        self.assertEqual(results, [ast_walk(raw, Dispatcher(f)) for f in flags])
+
+        self.assertEqual(results[1]["libraries"]["default"]["py_modules"],
+                         ["common.py", "debug.py"])
+        self.assertEqual(results[2]["libraries"]["default"]["py_modules"], ["common.py"])
+        self.assertEqual(list(results[2]["libraries"]["default"]["extensions"].keys()),
+                         ["_release"])
+
+        # Evaluating again gives the same result
+        self.assertEqual(compiled.evaluate({"debug": "true"}), results[1])
+
+    def test_subentos(self):
+        # The dispatcher extends the first Recurse list with the next ones:
+        # compiled nodes should not be modified by evaluations
+        data = """\
+Recurse: foo
+Recurse: bar
+"""
+        compiled = CompiledAst(parse(data))
+        for i in range(2):
+            self.assertEqual(compiled.evaluate()["subento"], ["foo", "bar"])
+
+    def test_missing_flag(self):
+        data = """\
+Library:
+    if flag(debug):
+        Modules: bar.py
+"""
+        compiled = CompiledAst(parse(data))
+        self.assertRaises(ValueError, lambda: compiled.evaluate())
+        self.assertEqual(compiled.evaluate({"debug": "true"})["libraries"]["default"]["py_modules"],
+                         ["bar.py"])
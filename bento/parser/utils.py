@@ -25,6 +25,11 @@ class Peeker(object):
     """
     def __init__(self, it, dummy=None):
         self._it = iter(it)
+        # Bound method, as six.advance_iterator is slower on python 2
+        try:
+            self._next = self._it.__next__
+        except AttributeError:
+            self._next = self._it.next
         self._cache = None
         if dummy is None:
             self.peek = self._peek_no_dummy
@@ -41,16 +46,14 @@ class Peeker(object):
             self._cache = None
             return i
         else:
-            return six.advance_iterator(self._it)
-        #self._cache = None
-        #return i
+            return self._next()
 
     def _peek_dummy(self):
         if self._cache:
             return self._cache
         else:
             try:
-                i = six.advance_iterator(self._it)
+                i = self._next()
             except StopIteration:
                 return self._dummy
             self._cache = i
@@ -60,7 +63,7 @@ class Peeker(object):
         if self._cache:
             return self._cache
         else:
-            i = six.advance_iterator(self._it)
+            i = self._next()
             self._cache = i
             return i
 
@@ -489,3 +489,69 @@ class Dispatcher(object):
 
     def module(self, node):
         return Node("module", value=node.value)
+
+# Node types whose action depends on the user flags or on the dispatcher
+# state, or modifies it
+_DYNAMIC_TYPES = set(["stmt_list", "flag", "conditional", "osvar", "flagvar",
+                      "not_flagvar", "bool", "hook_files", "extra_source_files",
+                      "subento"])
+
+class _Static(object):
+    def __init__(self, value):
+        self.value = value
+
+def _apply(dispatcher, node):
+    # Same as ast_walk
+    try:
+        func = dispatcher.action_dict[node.type]
+        return func(node)
+    except KeyError:
+        return node
+
+class CompiledAst(object):
+    """Raw AST prepared to be evaluated for several sets of user flags.
+
+    Subtrees which do not depend on the flags are evaluated once, at
+    creation: each evaluation only walks the conditionals, flags and top
+    statements again. Evaluations give the same result as
+    ast_walk(raw_dict, Dispatcher(user_flags)), but the results share their
+    flag-independent parts, and should be copied before being modified."""
+    def __init__(self, raw_dict):
+        self._root = self._compile(raw_dict, Dispatcher())
+
+    def _compile(self, node, dispatcher):
+        children = [self._compile(c, dispatcher) for c in node.children]
+        if node.type in _DYNAMIC_TYPES or \
+                [c for c in children if not isinstance(c, _Static)]:
+            return Node(node.type, children, node.value)
+        else:
+            values = [c.value for c in children if c.value is not None]
+            return _Static(_apply(dispatcher, Node(node.type, values, node.value)))
+
+    def evaluate(self, user_flags=None):
+        """Return the same dictionary as build_ast_from_raw_dict for the
+        given user flags."""
+        return self.evaluate_many([user_flags])[0]
+
+    def evaluate_many(self, user_flags_list):
+        """Evaluate the AST for each set of user flags in user_flags_list, in
+        one walk."""
+        dispatchers = [Dispatcher(user_flags) for user_flags in user_flags_list]
+        if isinstance(self._root, _Static):
+            return [self._root.value for d in dispatchers]
+        return self._evaluate(self._root, dispatchers)
+
+    def _evaluate(self, node, dispatchers):
+        children = []
+        for c in node.children:
+            if isinstance(c, _Static):
+                children.append([c.value] * len(dispatchers))
+            else:
+                children.append(self._evaluate(c, dispatchers))
+
+        ret = []
+        for i, dispatcher in enumerate(dispatchers):
+            values = [c[i] for c in children if c[i] is not None]
+            # Actions may modify the node value in place
+            ret.append(_apply(dispatcher, Node(node.type, values, copy.copy(node.value))))
+        return ret
@@ -17,5 +17,8 @@ HOOK_DUMP = ".hooks.pck"
 
 CONFIG_CACHE = ".config.pck"
 BUILD_CACHE = ".build.pck"
+NODE_SIGS_CACHE = ".node_sigs.pck"
+SCAN_CACHE = ".scan.pck"
+TASK_DURATIONS_CACHE = ".task_durations.pck"
 
 _OUTPUT = sys.stdout
@@ -0,0 +1,210 @@
+"""Cache of configuration probe results, shared between builds.
+
+An entry is keyed by the md5 of:
+    - the probe source code, and the kind of probe (compilation, link...)
+    - the probe environment (flags, include and library paths...)
+    - the environment variables affecting the compilers
+    - the identity of every tool of the environment: resolved path, size,
+      modification time and version
+
+Absolute paths of the source and build directories are replaced by
+placeholders, so that entries are shared between checkouts of a same
+project.
+
+The probe outputs are stored with its result, as some checks read them
+(e.g. yaku.conftests.check_type_sizes). Least recently used entries are
+evicted as in the compiled objects cache (see yaku.object_cache).
+
+Note that the cache cannot know about headers or libraries installed since
+a result was stored."""
+import os
+import sys
+import subprocess
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+from yaku.object_cache \
+    import \
+        ObjectCache, compiler_identity
+
+# Probe results and outputs are small, compared to compiled objects
+DEFAULT_MAX_SIZE = 100 * 1024 ** 2
+
+RESULT_FILE = "result"
+
+# Environment variables used by compilers and linkers
+COMPILER_ENV_VARS = ["PATH", "CPATH", "C_INCLUDE_PATH", "CPLUS_INCLUDE_PATH",
+                     "LIBRARY_PATH", "LD_LIBRARY_PATH", "INCLUDE", "LIB", "LIBPATH",
+                     "SDKROOT", "MACOSX_DEPLOYMENT_TARGET", "CC", "CXX", "CFLAGS",
+                     "CXXFLAGS", "CPPFLAGS", "LDFLAGS"]
+
+# Suffixes of the environment variables holding a tool command line
+_TOOL_SUFFIXES = ["CC", "CXX", "LINK", "SHLINK", "CXXSHLINK", "STLINK", "MODLINK",
+                  "F77", "FC", "F90"]
+
+# Environment variables which do not change the probe results
+_IGNORED_VARS = ["ENV", "BLDDIR", "VERBOSE"]
+
+def default_directory():
+    """Return the default, user-level cache directory."""
+    if "XDG_CACHE_HOME" in os.environ:
+        base = os.environ["XDG_CACHE_HOME"]
+    else:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "yaku", "conftests")
+
+_TOOL_VERSIONS = {}
+def tool_version(tool):
+    """Return the first line output by 'tool --version', or an empty string
+    if it cannot be run."""
+    try:
+        return _TOOL_VERSIONS[tool]
+    except KeyError:
+        try:
+            p = subprocess.Popen([tool, "--version"], stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT)
+            lines = p.communicate()[0].decode("utf-8", "replace").splitlines()
+            if lines:
+                ret = lines[0]
+            else:
+                ret = ""
+        except OSError:
+            ret = ""
+        _TOOL_VERSIONS[tool] = ret
+        return ret
+
+def is_tool_var(name):
+    """Return True if the environment variable name holds a tool command
+    line (e.g. CC, PYEXT_SHLINK)."""
+    return name.split("_")[-1] in _TOOL_SUFFIXES
+
+def _top_bld_root(conf):
+    # conf.bld_root is a probe specific directory while checks are run
+    node = conf.bld_root
+    while node.name.startswith(".conf-") and node.parent is not None:
+        node = node.parent
+    return node
+
+class ConfCheckCache(ObjectCache):
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        if directory is None:
+            directory = default_directory()
+        ObjectCache.__init__(self, directory, max_size)
+
+    def probe_key(self, conf, kind, code, env):
+        """Return the cache key of a probe of the given kind, compiling code
+        with the environment env."""
+        bld_root = _top_bld_root(conf)
+        # Absolute paths first, then relative ones (as used in compiler
+        # flags, e.g. -Ibuild/.conf-foo)
+        placeholders = [(bld_root.abspath(), "<blddir>"),
+                        (conf.src_root.abspath(), "<srcdir>"),
+                        (bld_root.path_from(conf.path) + os.sep, "<blddir>" + os.sep)]
+        def normalize(s):
+            for path, placeholder in placeholders:
+                s = s.replace(path, placeholder)
+            return s
+
+        items = ["kind=%s" % kind]
+        for name in sorted(env.keys()):
+            if name in _IGNORED_VARS:
+                continue
+            value = env[name]
+            items.append("%s=%s" % (name, normalize(repr(value))))
+            if is_tool_var(name) and isinstance(value, list) and value:
+                tool = value[0]
+                items.append("%s=%s:%s" % (tool, compiler_identity(tool), tool_version(tool)))
+        os_env = env.get("ENV", os.environ)
+        for name in COMPILER_ENV_VARS:
+            items.append("$%s=%s" % (name, os_env.get(name, "")))
+        items.append(code)
+
+        m = md5()
+        m.update("\0".join(items).encode("utf-8"))
+        return m.hexdigest()
+
+    def fetch_probe(self, key, outputs):
+        """Return the (succeed, explanation) result stored for key, and copy
+        the stored outputs of successful probes into outputs. Return None if
+        there is no usable entry."""
+        filename = os.path.join(self._entry_dir(key), RESULT_FILE)
+        try:
+            fid = open(filename, "rb")
+            try:
+                data = fid.read().decode("utf-8")
+            finally:
+                fid.close()
+        except (IOError, OSError):
+            self._count("misses")
+            return None
+
+        succeed = data[:1] == "1"
+        explanation = data[1:]
+        if succeed and not self.fetch(key, outputs):
+            self._count("misses")
+            return None
+        if not succeed:
+            # mark the entry as recently used
+            try:
+                os.utime(self._entry_dir(key), None)
+            except OSError:
+                pass
+        self._count("hits")
+        return succeed, explanation or None
+
+    def store_probe(self, key, outputs, succeed, explanation):
+        if succeed:
+            data = "1"
+        else:
+            data = "0" + (explanation or "")
+            outputs = []
+        try:
+            self.store(key, outputs, {RESULT_FILE: data.encode("utf-8")})
+        except (IOError, OSError):
+            # Failing to store into the cache should never fail the
+            # configuration
+            pass
+
+    def report(self):
+        """Return a report of the cumulated statistics of the cache and of
+        its content."""
+        hits, misses = self.read_stats()
+        entries = 0
+        size = 0
+        if os.path.exists(self.directory):
+            for prefix in os.listdir(self.directory):
+                d = os.path.join(self.directory, prefix)
+                if not os.path.isdir(d):
+                    continue
+                for name in os.listdir(d):
+                    entries += 1
+                    entry = os.path.join(d, name)
+                    for f in os.listdir(entry):
+                        size += os.path.getsize(os.path.join(entry, f))
+        total = hits + misses
+        if total > 0:
+            rate = 100. * hits / total
+        else:
+            rate = 0.
+        return "\n".join(["Configuration checks cache: %s" % self.directory,
+                          "    %d entries, %.1f / %.1f MB" % (entries, size / 1024. ** 2,
+                                                              self.max_size / 1024. ** 2),
+                          "    %d hits, %d misses (%.1f %% hit rate)" % (hits, misses, rate)])
+
+    def summary(self):
+        total = self.hits + self.misses
+        if total > 0:
+            rate = 100. * self.hits / total
+        else:
+            rate = 0.
+        return "Configuration checks cache: %d hits, %d misses (%.1f %% hit rate), %d stored" \
+               % (self.hits, self.misses, rate, self.stored)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        cache = ConfCheckCache(sys.argv[1])
+    else:
+        cache = ConfCheckCache()
+    print(cache.report())
@@ -1,3 +1,4 @@
+import re
 import copy
 
 def check_compiler(conf, msg=None):
@@ -85,9 +86,25 @@ def check_type_size(conf, type_name, headers=None, expect=None):
     expect : sequence
         if given, will test wether the type has the given number of
             bytes.  If not given, will automatically find the size.
+
+    The size is read from the compiled object file when possible (see
+    check_type_sizes), and searched with one compilation per tested
+    size otherwise.
     """
 
     conf.start_message("Checking for sizeof %s ..." % type_name)
+    if expect is None:
+        sizes = _type_sizes(conf, [type_name], headers)
+        if type_name in sizes:
+            size = sizes[type_name]
+            if size is None:
+                conf.end_message("no (cannot compile type)")
+                return False
+            conf.end_message("%d" % size)
+            conf.conf_results.append({"type": "type_size", "value": type_name,
+                                      "result": size})
+            return size
+
     body = r"""
 typedef %(type)s yaku_check_sizeof_type;
 int main ()
@@ -137,7 +154,7 @@ int main ()
         high = mid
         # Binary search:
         while low != high:
-            mid = (high - low) / 2 + low
+            mid = (high - low) // 2 + low
             code = body % {'type': type_name, 'size': mid}
             if conf.builders["ctasks"].try_compile("check_type_size",
                     code, headers):
@@ -342,3 +359,192 @@ int main (void)
         conf.conf_results.append({"type": "func", "value": func,
                                   "result": ret})
     return ret
+
+# Batched checks: many independent checks are merged into a single
+# translation unit. When the combined probe fails, it is split in halves
+# until the failing checks are isolated, the probes of each round running
+# concurrently (see ConfigureContext.jobs). As with autoconf-style
+# checks, a check may succeed in a batch because of an earlier item (e.g.
+# a header which needs another header to be included first).
+def _split(items, n):
+    n = max(min(n, len(items)), 1)
+    size, remainder = divmod(len(items), n)
+    groups = []
+    start = 0
+    for i in range(n):
+        end = start + size + (i < remainder)
+        groups.append(items[start:end])
+        start = end
+    return groups
+
+def _try_batches(conf, try_many, name, items, make_code):
+    """Return a dict item -> result of the check of every item.
+
+    try_many(name, bodies) must return the list of results for the given
+    code bodies, and make_code(group) the code checking every item of
+    group at once."""
+    results = {}
+    groups = _split(list(items), getattr(conf, "jobs", 1))
+    while groups:
+        rets = try_many(name, [make_code(group) for group in groups])
+        next_groups = []
+        for group, ret in zip(groups, rets):
+            if ret:
+                for item in group:
+                    results[item] = True
+            elif len(group) == 1:
+                results[group[0]] = False
+            else:
+                half = len(group) // 2
+                next_groups.extend([group[:half], group[half:]])
+        groups = next_groups
+    return results
+
+def _report(conf, msg, result, failure="no !"):
+    conf.start_message(msg)
+    if result:
+        conf.end_message("yes")
+    else:
+        conf.end_message(failure)
+
+def check_headers(conf, headers):
+    """Check for every header of headers, with as few compilations as
+    possible. Return the list of results."""
+    def make_code(group):
+        return "\n".join(["#include <%s>" % header for header in group]) + "\n"
+
+    results = _try_batches(conf, conf.builders["ctasks"].try_compile_many,
+                           "check_headers", headers, make_code)
+    for header in headers:
+        _report(conf, "Checking for header %s" % header, results[header])
+        conf.conf_results.append({"type": "header", "value": header,
+                                  "result": results[header]})
+    return [results[header] for header in headers]
+
+def check_types(conf, type_names, headers=None):
+    """Check for every type of type_names, with as few compilations as
+    possible. Return the list of results."""
+    indices = dict([(type_names[i], i) for i in range(len(type_names))])
+    def make_code(group):
+        code = []
+        for type_name in group:
+            code.append(r"""
+int yaku_check_type_%(index)d(void) {
+  if ((%(name)s *) 0)
+    return 0;
+  if (sizeof (%(name)s))
+    return 0;
+  return 0;
+}
+""" % {"name": type_name, "index": indices[type_name]})
+        return "".join(code)
+
+    try_many = lambda name, bodies: \
+            conf.builders["ctasks"].try_compile_many(name, bodies, headers)
+    results = _try_batches(conf, try_many, "check_types", type_names, make_code)
+    for type_name in type_names:
+        _report(conf, "Checking for type %s" % type_name, results[type_name], "no")
+        conf.conf_results.append({"type": "type", "value": type_name,
+                                  "result": results[type_name]})
+    return [results[type_name] for type_name in type_names]
+
+def check_funcs(conf, funcs, libs=None):
+    """Check for every function of funcs, with as few link steps as
+    possible. Unlike check_funcs_at_once, the result of every function is
+    found. Return the list of results."""
+    if libs is None:
+        libs = []
+    def make_code(group):
+        code = []
+        for func in group:
+            code.append("char %s (void);" % func)
+            # See check_func
+            code.append("#ifdef _MSC_VER")
+            code.append("#pragma function(%s)" % func)
+            code.append("#endif")
+        code.append("int main (void)\n{")
+        for func in group:
+            code.append("    %s();" % func)
+        code.append("    return 0;\n}\n")
+        return "\n".join(code)
+
+    old_lib = copy.deepcopy(conf.env["LIBS"])
+    try:
+        for lib in libs[::-1]:
+            conf.env["LIBS"].insert(0, lib)
+        results = _try_batches(conf, conf.builders["ctasks"].try_program_many,
+                               "check_funcs", funcs, make_code)
+    finally:
+        conf.env["LIBS"] = old_lib
+
+    for func in funcs:
+        if libs:
+            msg = "Checking for function %s in %s" % \
+                    (func, " ".join([conf.env["LIB_FMT"] % lib for lib in libs]))
+        else:
+            msg = "Checking for function %s" % func
+        _report(conf, msg, results[func])
+        conf.conf_results.append({"type": "func", "value": func,
+                                  "result": results[func]})
+    return [results[func] for func in funcs]
+
+# The size of a type is written in the object file as a marker string,
+# YAKU_SIZEOF_<index>[<5 digits size>], so that the sizes of many types are
+# found by a single compilation instead of a search compiling once per
+# tested value.
+_SIZEOF_MARKER = re.compile("YAKU_SIZEOF_([0-9]+)\\[([0-9]{5})\\]".encode("ascii"))
+
+def _sizeof_marker(index, type_name):
+    prefix = ", ".join(["'%s'" % c for c in "YAKU_SIZEOF_%d[" % index])
+    digits = ", ".join(["(char) ('0' + (sizeof (%s) / %d) %% 10)" % (type_name, 10 ** i) \
+                        for i in range(4, -1, -1)])
+    return "const char yaku_sizeof_%d[] = {%s, %s, ']', 0};\n" % (index, prefix, digits)
+
+def _type_sizes(conf, type_names, headers=None):
+    """Return a dict type name -> size, or None for types which cannot be
+    compiled. Types whose size could not be read from the object file are
+    not in the dict."""
+    builder = conf.builders["ctasks"]
+    indices = dict([(type_names[i], i) for i in range(len(type_names))])
+    def make_code(group):
+        return "".join([_sizeof_marker(indices[type_name], type_name) for type_name in group])
+
+    sizes = {}
+    def try_many(name, bodies):
+        rets = builder.try_compile_many(name, bodies, headers)
+        for ret, task in zip(rets, conf.last_tasks):
+            if ret:
+                for o in task.outputs:
+                    for m in _SIZEOF_MARKER.finditer(o.read(flags="rb")):
+                        sizes[type_names[int(m.group(1))]] = int(m.group(2))
+        return rets
+
+    results = _try_batches(conf, try_many, "check_type_sizes", type_names, make_code)
+    for type_name in type_names:
+        if not results[type_name]:
+            sizes[type_name] = None
+    return sizes
+
+def check_type_sizes(conf, type_names, headers=None):
+    """Find the size of every type of type_names (see check_type_size),
+    with a single compilation if possible. Return the list of sizes (False
+    for types which cannot be compiled)."""
+    sizes = _type_sizes(conf, type_names, headers)
+    ret = []
+    for type_name in type_names:
+        if type_name in sizes:
+            size = sizes[type_name]
+            conf.start_message("Checking for sizeof %s ..." % type_name)
+            if size is None:
+                conf.end_message("no (cannot compile type)")
+                ret.append(False)
+            else:
+                conf.end_message("%d" % size)
+                conf.conf_results.append({"type": "type_size", "value": type_name,
+                                          "result": size})
+                ret.append(size)
+        else:
+            # Size not found in the object file (e.g. link time
+            # optimization): search it
+            ret.append(check_type_size(conf, type_name, headers))
+    return ret
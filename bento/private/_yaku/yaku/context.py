@@ -1,6 +1,10 @@
 import os
 import sys
 import subprocess
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
 
 if sys.version_info[0] < 3:
     from cPickle \
@@ -14,7 +18,7 @@ else:
 from yaku._config \
     import \
         DEFAULT_ENV, BUILD_CONFIG, BUILD_CACHE, CONFIG_CACHE, HOOK_DUMP, \
-        _OUTPUT
+        NODE_SIGS_CACHE, SCAN_CACHE, TASK_DURATIONS_CACHE, _OUTPUT
 from yaku.environment \
     import \
         Environment
@@ -23,7 +27,7 @@ from yaku.tools \
         import_tools
 from yaku.utils \
     import \
-        ensure_dir, rename, join_bytes
+        ensure_dir, rename, join_bytes, stat_key, cpu_count
 from yaku.errors \
     import \
         UnknownTask, ConfigurationFailure, TaskRunFailure, WindowsError
@@ -64,6 +68,98 @@ def _hook_path_to_hook_id(src_root, hook_dict):
     return dict([(src_root.find_resource(k), v) for \
                  k, v in hook_dict.items()])
 
+class NodeSignatures(object):
+    """Content signatures (md5 digests) of file nodes.
+
+    Each signature is stored with the (mtime, size, inode) of the file at
+    the time it was computed, and the file is only read again when those
+    change."""
+    def __init__(self, sigs=None):
+        if sigs is None:
+            sigs = {}
+        # abspath -> (stat key, digest)
+        self._sigs = sigs
+        self._used = set()
+        self.changed = False
+
+    def get(self, node):
+        path = node.abspath()
+        try:
+            key = stat_key(path)
+        except OSError:
+            key = None
+        self._used.add(path)
+        if key is not None:
+            try:
+                old_key, digest = self._sigs[path]
+                if old_key == key:
+                    return digest
+            except KeyError:
+                pass
+        # Let node.read raise the usual IOError if the file does not exist
+        digest = md5(node.read(flags="rb")).digest()
+        if key is not None:
+            self._sigs[path] = (key, digest)
+            self.changed = True
+        return digest
+
+    def used_signatures(self):
+        # Only keep the signatures of files seen in this build, so that
+        # the cache does not grow forever
+        return dict([(k, v) for k, v in self._sigs.items() if k in self._used])
+
+class ScanCache(dict):
+    """Include scan results, see yaku.utils.scan_includes: path -> (stat
+    key, includes).
+
+    Like NodeSignatures, it records whether an entry changed and which
+    entries were used, so that it is only stored when needed, without the
+    entries of files which do not exist anymore."""
+    def __init__(self, entries=None):
+        if entries is None:
+            entries = {}
+        dict.__init__(self, entries)
+        self._used = set()
+        self.changed = False
+
+    def __getitem__(self, path):
+        self._used.add(path)
+        return dict.__getitem__(self, path)
+
+    def __setitem__(self, path, value):
+        self._used.add(path)
+        self.changed = True
+        dict.__setitem__(self, path, value)
+
+    def used_entries(self):
+        return dict([(k, v) for k, v in self.items() if k in self._used])
+
+def _load_cache(bldnode, name):
+    """Load a pickled cache from the build directory, or return None if
+    it does not exist or cannot be read."""
+    node = bldnode.find_node(name)
+    if node is None:
+        return None
+    fid = open(node.abspath(), "rb")
+    try:
+        try:
+            return load(fid)
+        except Exception:
+            # A corrupted cache only means things will be computed again
+            return None
+    finally:
+        fid.close()
+
+def _store_cache(bldnode, name, data):
+    node = bldnode.make_node(name)
+    # Use rename to avoid corrupting the cache if interrupted
+    tmp_fid = open(node.abspath() + ".tmp", "wb")
+    try:
+        dump(data, tmp_fid)
+    finally:
+        tmp_fid.close()
+    rename(node.abspath() + ".tmp", node.abspath())
+
 class ConfigureContext(object):
     def __init__(self):
         self.env = Environment()
@@ -75,6 +171,15 @@ class ConfigureContext(object):
         self._configured = {}
         self._stdout_cache = {}
         self._cmd_cache = {}
+        self.node_sigs = NodeSignatures()
+        self.scan_cache = {}
+        # Maximum number of configuration checks run concurrently
+        self.jobs = cpu_count()
+        # optional yaku.conf_cache.ConfCheckCache instance
+        self.conf_cache = None
+        # optional tracer, with now, add_span and add_instant methods (see
+        # bento.utils.trace.Tracer)
+        self.tracer = None
 
         self.src_root = None
         self.bld_root = None
@@ -215,6 +320,15 @@ class BuildContext(object):
         self.env = Environment()
         self.tools = []
         self.cache = {}
+        self.node_sigs = NodeSignatures()
+        self.scan_cache = ScanCache()
+        # task uid -> duration (in seconds) of its last execution, used to
+        # schedule the longest critical paths first
+        self.task_durations = {}
+        # optional yaku.object_cache.ObjectCache instance
+        self.object_cache = None
+        # optional tracer, see ConfigureContext
+        self.tracer = None
         self.builders = {}
         self.tasks = []
 
@@ -259,6 +373,12 @@ class BuildContext(object):
         else:
             self.cache = {}
 
+        self.node_sigs = NodeSignatures(_load_cache(bldnode, NODE_SIGS_CACHE))
+        self.scan_cache = ScanCache(_load_cache(bldnode, SCAN_CACHE))
+        self.task_durations = _load_cache(bldnode, TASK_DURATIONS_CACHE)
+        if self.task_durations is None:
+            self.task_durations = {}
+
         hook_dump = bldnode.find_node(HOOK_DUMP)
         fid = open(hook_dump.abspath(), "rb")
         try:
@@ -277,6 +397,18 @@ class BuildContext(object):
             tmp_fid.close()
         rename(build_cache.abspath() + ".tmp", build_cache.abspath())
 
+        if self.node_sigs.changed:
+            _store_cache(self.bld_root, NODE_SIGS_CACHE,
+                         self.node_sigs.used_signatures())
+        if self.scan_cache.changed:
+            _store_cache(self.bld_root, SCAN_CACHE, self.scan_cache.used_entries())
+        if self.tasks:
+            # Forget the durations of tasks which do not exist anymore
+            uids = set([t.get_uid() for t in self.tasks])
+            self.task_durations = dict([(k, v) for k, v in self.task_durations.items()
+                                        if k in uids])
+        _store_cache(self.bld_root, TASK_DURATIONS_CACHE, self.task_durations)
+
     def set_stdout_cache(self, task, stdout):
         pass
 
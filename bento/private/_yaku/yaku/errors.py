@@ -19,6 +19,9 @@ class YakuError(Exception):
 
 class TaskRunFailure(YakuError):
     def __init__(self, cmd, explain=None):
+        # Pass the arguments to the base class so that the exception can be
+        # pickled (e.g. when raised in a process pool)
+        YakuError.__init__(self, cmd, explain)
         self.cmd = cmd
         self.explain = explain
 
@@ -33,6 +36,9 @@ class TaskRunFailure(YakuError):
 class ConfigurationFailure(YakuError):
     pass
 
+class CyclicDependency(YakuError):
+    pass
+
 class UnknownTask(YakuError):
     pass
 
@@ -0,0 +1,283 @@
+"""Content-addressed cache of compiled objects, a la ccache.
+
+An entry is keyed by the md5 of the preprocessed source, the compilation
+command line (without the output path) and the compiler identity. Entries
+are stored in a local directory shared between builds, and the least
+recently used ones are evicted when the directory grows above a given
+size.
+
+Only gcc-like command lines (-c, -o and -E flags) are supported: other
+commands are always run without looking at the cache."""
+import os
+import sys
+import shutil
+import subprocess
+import threading
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+from yaku.utils \
+    import \
+        find_program, rename
+
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+STATS_FILE = "stats.txt"
+# Output of the compilation command, stored next to the cached objects
+OUTPUT_FILE = "output.txt"
+
+_COMPILER_IDS = {}
+def compiler_identity(compiler):
+    """Identity of the compiler executable: its resolved path, size and
+    modification time."""
+    try:
+        return _COMPILER_IDS[compiler]
+    except KeyError:
+        if os.path.isabs(compiler):
+            path = compiler
+        else:
+            path = find_program(compiler)
+        if path is None:
+            ret = None
+        else:
+            path = os.path.realpath(path)
+            st = os.stat(path)
+            ret = "%s:%d:%d" % (path, st.st_size, int(st.st_mtime))
+        _COMPILER_IDS[compiler] = ret
+        return ret
+
+def split_command(cmd):
+    """Split a gcc-like compilation command into a preprocessing command
+    and the output-independent part of the command.
+
+    Returns (None, None) if the command is not supported."""
+    if not "-c" in cmd or not "-o" in cmd or "-E" in cmd:
+        return None, None
+    preprocess = []
+    key = []
+    i = 0
+    while i < len(cmd):
+        c = cmd[i]
+        if c == "-o":
+            key.append(c)
+            key.append("<output>")
+            i += 2
+            continue
+        elif c == "-c":
+            preprocess.append("-E")
+        else:
+            preprocess.append(c)
+        key.append(c)
+        i += 1
+    return preprocess, key
+
+class ObjectCache(object):
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        self._lock.acquire()
+        try:
+            setattr(self, name, getattr(self, name) + 1)
+        finally:
+            self._lock.release()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def compute_key(self, cmd, cwd=None, env=None):
+        """Return the cache key for the given compilation command, or None
+        if it cannot be cached."""
+        preprocess, key_cmd = split_command(cmd)
+        if preprocess is None:
+            return None
+        identity = compiler_identity(cmd[0])
+        if identity is None:
+            return None
+
+        kw = {}
+        if env is not None:
+            kw["env"] = env
+        try:
+            p = subprocess.Popen(preprocess, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, cwd=cwd, **kw)
+            source = p.communicate()[0]
+        except OSError:
+            return None
+        if p.returncode:
+            # let the actual compilation report the error
+            return None
+
+        m = md5()
+        m.update(identity.encode("utf-8"))
+        m.update("\0".join([str(c) for c in key_cmd]).encode("utf-8"))
+        m.update(source)
+        return m.hexdigest()
+
+    def fetch(self, key, outputs):
+        """Copy the cached files for key into outputs. Returns True on
+        success."""
+        entry = self._entry_dir(key)
+        try:
+            for i, output in enumerate(outputs):
+                shutil.copyfile(os.path.join(entry, str(i)), output)
+            # mark the entry as recently used
+            os.utime(entry, None)
+        except (IOError, OSError):
+            return False
+        return True
+
+    def store(self, key, outputs, extra=None):
+        """Store the files outputs for key. extra is an optional dict
+        name -> bytes of additional files to store in the entry."""
+        entry = self._entry_dir(key)
+        if os.path.exists(entry):
+            return
+        tmp = "%s.tmp%d-%d" % (entry, os.getpid(), id(threading.currentThread()))
+        try:
+            os.makedirs(tmp)
+            for i, output in enumerate(outputs):
+                shutil.copyfile(output, os.path.join(tmp, str(i)))
+            if extra is not None:
+                for name, data in extra.items():
+                    fid = open(os.path.join(tmp, name), "wb")
+                    try:
+                        fid.write(data)
+                    finally:
+                        fid.close()
+            # Another build may have stored the same entry concurrently
+            if not os.path.exists(entry):
+                os.rename(tmp, entry)
+                self._count("stored")
+        finally:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+
+    def fetch_output(self, key):
+        """Return the command output stored for key, or an empty string if
+        none was stored."""
+        filename = os.path.join(self._entry_dir(key), OUTPUT_FILE)
+        try:
+            fid = open(filename, "rb")
+            try:
+                data = fid.read()
+            finally:
+                fid.close()
+        except (IOError, OSError):
+            return ""
+        if sys.version_info >= (3,):
+            return data.decode("utf-8")
+        else:
+            return data
+
+    def run(self, cmd, outputs, func, cwd=None, env=None):
+        """Run func, which executes the compilation command cmd producing
+        the files outputs, unless the outputs can be fetched from the cache.
+
+        func returns a (status, output) pair: it is considered to have
+        succeeded if status is None or 0, in which case its outputs are
+        added to the cache, together with output (the command output, or
+        None if not captured). Returns None if func was run, or the output
+        stored with the cached outputs if they were fetched from the
+        cache."""
+        key = self.compute_key(cmd, cwd, env)
+        if key is not None and self.fetch(key, outputs):
+            self._count("hits")
+            return self.fetch_output(key)
+
+        if key is not None:
+            self._count("misses")
+        ret, output = func()
+        if key is not None and not ret:
+            if output:
+                if not isinstance(output, bytes):
+                    output = output.encode("utf-8")
+                extra = {OUTPUT_FILE: output}
+            else:
+                extra = None
+            try:
+                self.store(key, outputs, extra)
+            except (IOError, OSError):
+                # Failing to store into the cache should never fail the build
+                pass
+        return None
+
+    def evict(self):
+        """Remove least recently used entries until the cache size is below
+        max_size."""
+        entries = []
+        total = 0
+        if not os.path.exists(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            d = os.path.join(self.directory, prefix)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                entry = os.path.join(d, name)
+                size = 0
+                try:
+                    for f in os.listdir(entry):
+                        size += os.path.getsize(os.path.join(entry, f))
+                    mtime = os.path.getmtime(entry)
+                except OSError:
+                    # entry being stored or evicted by another build
+                    continue
+                entries.append((mtime, size, entry))
+                total += size
+        entries.sort()
+        for mtime, size, entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, True)
+            total -= size
+
+    def read_stats(self):
+        """Return the cumulated (hits, misses) of every build using this
+        cache."""
+        filename = os.path.join(self.directory, STATS_FILE)
+        if not os.path.exists(filename):
+            return 0, 0
+        fid = open(filename)
+        try:
+            try:
+                hits, misses = [int(i) for i in fid.read().split()]
+            except ValueError:
+                hits, misses = 0, 0
+        finally:
+            fid.close()
+        return hits, misses
+
+    def close(self):
+        """Update the cumulated statistics, and evict old entries if new
+        ones were stored."""
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        hits, misses = self.read_stats()
+        filename = os.path.join(self.directory, STATS_FILE)
+        fid = open(filename + ".tmp", "w")
+        try:
+            fid.write("%d %d\n" % (hits + self.hits, misses + self.misses))
+        finally:
+            fid.close()
+        rename(filename + ".tmp", filename)
+
+        if self.stored > 0:
+            self.evict()
+
+    def summary(self):
+        total = self.hits + self.misses
+        if total > 0:
+            rate = 100. * self.hits / total
+        else:
+            rate = 0.
+        return "Object cache: %d hits, %d misses (%.1f %% hit rate), %d stored" \
+               % (self.hits, self.misses, rate, self.stored)
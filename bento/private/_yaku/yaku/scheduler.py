@@ -1,17 +1,33 @@
 import sys
+import heapq
 import traceback
 if sys.version_info[0] < 3:
     import Queue as queue
 else:
     import queue
 import threading
+if sys.version_info[0] < 3:
+    from cPickle \
+        import \
+            dumps
+else:
+    from pickle \
+        import \
+            dumps
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
 
 from yaku.task_manager \
     import \
-        run_task, order_tasks, TaskManager
+        run_task, order_tasks, build_task_graph, critical_path_priorities, TaskManager
 from yaku.utils \
     import \
         get_exception
+from yaku.pprint \
+    import \
+        pprint
 import yaku.errors
 
 def run_tasks(ctx, tasks=None):
@@ -30,6 +46,44 @@ def run_tasks_parallel(ctx, tasks=None, maxjobs=1):
     r.start()
     r.run()
 
+class ThreadExecutor(object):
+    """Execute every task in the calling thread."""
+    def execute(self, task):
+        task.run()
+
+    def close(self):
+        pass
+
+class ProcessPoolExecutor(object):
+    """Execute tasks which define a process_func in a pool of processes,
+    and the other ones in the calling thread.
+
+    process_func is called with process_args, and both must be
+    picklable. This is meant for tasks running python code (which would
+    otherwise be serialized by the GIL), while tasks spawning
+    subprocesses are fine in threads."""
+    def __init__(self, njobs):
+        self.pool = multiprocessing.Pool(njobs)
+
+    def execute(self, task):
+        if task.process_func is None:
+            task.run()
+            return
+        try:
+            dumps((task.process_func, task.process_args))
+        except Exception:
+            # Not picklable, run it in this thread instead
+            task.run()
+            return
+
+        pprint('GREEN', "%-16s%s" % (task.name.upper(),
+               " ".join([s.srcpath() for s in task.inputs])))
+        self.pool.apply(task.process_func, task.process_args)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
 class SerialRunner(object):
     def __init__(self, ctx, task_manager):
         self.ctx = ctx
@@ -47,65 +101,124 @@ class SerialRunner(object):
             grp = self.task_manager.next_set()
 
 class ParallelRunner(object):
-    def __init__(self, ctx, task_manager, maxjobs=1):
+    """Run tasks on a pool of worker threads.
+
+    Tasks are dispatched as soon as every task they depend on (see
+    build_task_graph) has been run, without waiting for the other tasks
+    of the same group. Among the ready tasks, the ones starting the
+    longest chains of tasks are dispatched first, using the durations of
+    the previous runs (ctx.task_durations), so that long tasks do not end
+    up at the tail of the build.
+
+    Tasks are executed through executor. If None, a ProcessPoolExecutor
+    is used when some tasks define a process_func (and multiprocessing is
+    available), and a ThreadExecutor otherwise."""
+    def __init__(self, ctx, task_manager, maxjobs=1, executor=None):
         self.njobs = maxjobs
         self.task_manager = task_manager
         self.ctx = ctx
+        self.executor = executor
+        self._own_executor = False
 
         self.worker_queue = queue.Queue()
-        self.error_out = queue.Queue()
-        self.failure_lock = threading.Lock()
+        self.done_queue = queue.Queue()
         self.stop = False
 
     def start(self):
+        if self.executor is None:
+            # The pool has to be created before starting any thread, as
+            # forking a multi-threaded process is not safe
+            process_tasks = [t for t in self.task_manager.tasks \
+                             if t.process_func is not None]
+            if process_tasks and multiprocessing is not None:
+                self.executor = ProcessPoolExecutor(self.njobs)
+            else:
+                self.executor = ThreadExecutor()
+            self._own_executor = True
+
         def _worker():
-            # XXX: this whole thing is an hack - find a better way to
-            # notify task execution failure to all worker threads
-            while not self.stop:
+            while True:
                 task = self.worker_queue.get()
+                if task is None:
+                    break
                 try:
-                    run_task(self.ctx, task)
+                    run_task(self.ctx, task, self.executor)
+                    self.done_queue.put((task, True))
                 except yaku.errors.TaskRunFailure:
                     e = get_exception()
-                    self.failure_lock.acquire()
-                    self.stop = True
-                    self.failure_lock.release()
                     task.error_msg = e.explain
                     task.error_cmd = e.cmd
-                    self.error_out.put(task)
+                    self.done_queue.put((task, False))
                 except Exception:
                     e = get_exception()
                     exc_type, exc_value, tb = sys.exc_info()
                     lines = traceback.format_exception(exc_type, exc_value, tb)
-                    self.failure_lock.acquire()
-                    self.stop = True
-                    self.failure_lock.release()
                     task.error_msg = "".join(lines)
                     task.error_cmd = []
-                    self.error_out.put(task)
-                self.worker_queue.task_done()
+                    self.done_queue.put((task, False))
 
+        self._workers = []
         for i in range(self.njobs):
             t = threading.Thread(target=_worker)
             t.setDaemon(True)
             t.start()
+            self._workers.append(t)
 
     def run(self):
-        grp = self.task_manager.next_set()
-        while grp:
-            for task in grp:
-                self.worker_queue.put(task)
-            # XXX: we only join once we detect the worker queue to be empty, to
-            # avoid blocking for a long time. This is naive, and will break if
-            # the worker_queue is filled after this point
-            while not self.stop:
-                if self.worker_queue.empty():
-                    self.worker_queue.join()
-                    break
-            if not self.error_out.empty():
-                task = self.error_out.get()
-                msg = task.error_msg
-                cmd = task.error_cmd
-                raise yaku.errors.TaskRunFailure(cmd, msg)
+        try:
+            self._run()
+        finally:
+            for t in self._workers:
+                self.worker_queue.put(None)
+            if self._own_executor:
+                self.executor.close()
 
-            grp = self.task_manager.next_set()
+    def _run(self):
+        tasks = self.task_manager.tasks
+        parents, children = build_task_graph(tasks)
+        npending = dict([(t, len(parents[t])) for t in tasks])
+
+        durations = getattr(self.ctx, "task_durations", None)
+        if durations is None:
+            durations = {}
+        priorities = critical_path_priorities(tasks, parents, children, durations)
+        # heap of (-priority, index, task): the index keeps the tasks order
+        # for equal priorities, so that tasks are never compared
+        indexes = dict([(t, i) for i, t in enumerate(tasks)])
+        ready = []
+        for t in tasks:
+            if npending[t] == 0:
+                heapq.heappush(ready, (-priorities[t], indexes[t], t))
+
+        running = 0
+        remaining = len(tasks)
+        failed = []
+        while True:
+            # At most njobs tasks are handed to the workers, so that the
+            # priorities also apply to the tasks made ready in the meantime
+            while ready and running < self.njobs and not self.stop:
+                self.worker_queue.put(heapq.heappop(ready)[2])
+                running += 1
+            if running == 0:
+                break
+
+            task, success = self.done_queue.get()
+            running -= 1
+            remaining -= 1
+            if not success:
+                # Do not schedule anything new, but let the running tasks
+                # finish before reporting the failure
+                self.stop = True
+                failed.append(task)
+            elif not self.stop:
+                for child in children[task]:
+                    npending[child] -= 1
+                    if npending[child] == 0:
+                        heapq.heappush(ready, (-priorities[child], indexes[child], child))
+
+        if failed:
+            task = failed[0]
+            raise yaku.errors.TaskRunFailure(task.error_cmd, task.error_msg)
+        if remaining > 0:
+            left = [t for t in tasks if npending[t] > 0]
+            raise yaku.errors.CyclicDependency("circular order constraint detected %r" % left)
@@ -51,6 +51,9 @@ base = _TaskFakeMetaclass('__task_base', (object,), {})
 class _Task(object):
     before = []
     after = []
+    # Whether the task outputs may be fetched from the object cache of the
+    # build context - only meaningful for gcc-like compilation tasks
+    cacheable = False
     def __init__(self, outputs, inputs, func=None, deps=None, env=None, env_vars=None):
         if is_string(inputs):
             self.inputs = [inputs]
@@ -62,11 +65,19 @@ class _Task(object):
             self.outputs = outputs
         self.uid = None
         self.func = func
+        # Optional picklable equivalent of func, called as
+        # process_func(*process_args), for tasks which may be executed in
+        # another process (see yaku.scheduler.ProcessPoolExecutor)
+        self.process_func = None
+        self.process_args = ()
         if deps is None:
             self.deps = []
         else:
             self.deps = deps
         self.cache = None
+        # NodeSignatures instance used to compute the signature of inputs
+        # and deps - set by run_task from the context
+        self.node_sigs = None
         self.env = env
         self.env_vars = env_vars
         self.scan = None
@@ -97,19 +108,32 @@ class _Task(object):
         m = md5()
 
         self._sig_explicit_deps(m)
+        self._sig_implicit_deps(m)
         for k in self.env_vars:
             m.update(dumps(self.env[k]))
         if self.func:
             m.update(function_code(self.func).co_code)
         return m.digest()
 
+    def _node_sig(self, node):
+        if self.node_sigs is None:
+            return node.read(flags="rb")
+        else:
+            return self.node_sigs.get(node)
+
     def _sig_explicit_deps(self, m):
         for s in self.inputs + self.deps:
-            #if os.path.exists(s):
-            #    m.update(open(s).read())
-            m.update(s.read(flags="rb"))
+            m.update(self._node_sig(s))
         return m.digest()
-        
+
+    def _sig_implicit_deps(self, m):
+        # scan, if set, returns the dependencies found by scanning the
+        # inputs (e.g. included headers)
+        if self.scan is not None:
+            for s in self.scan():
+                m.update(self._node_sig(s))
+        return m.digest()
+
     # execution
     #----------
     def run(self):
@@ -128,21 +152,41 @@ class _Task(object):
                 pprint('GREEN', "%-16s%s" % (self.name.upper(), " ".join([i.bldpath() for i in self.inputs])))
 
         self.gen.bld.set_cmd_cache(self, cmd)
+        object_cache = getattr(self.gen.bld, "object_cache", None)
+        if self.cacheable and object_cache is not None:
+            outputs = [o.abspath() for o in self.outputs]
+            stdout = object_cache.run(cmd, outputs,
+                                      lambda: (None, self._exec_command(cmd, cwd, kw)),
+                                      cwd, env)
+            if stdout is not None:
+                # Compiler warnings are replayed on cache hits
+                self._write_stdout(stdout)
+                tracer = getattr(self.gen.bld, "tracer", None)
+                if tracer is not None:
+                    tracer.add_instant("object cache hit", "cache",
+                                       {"task": repr(self).strip("'")})
+        else:
+            self._exec_command(cmd, cwd, kw)
+
+    def _exec_command(self, cmd, cwd, kw):
+        tracer = getattr(self.gen.bld, "tracer", None)
         try:
+            if tracer is not None:
+                start = tracer.now()
             p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT, cwd=cwd, **kw)
             stdout = p.communicate()[0].decode("utf-8")
+            if tracer is not None:
+                tracer.add_span(os.path.basename(str(cmd[0])), "subprocess", start, tracer.now(),
+                                {"cmd": " ".join([str(c) for c in cmd])})
             if p.returncode:
                 raise TaskRunFailure(cmd, stdout)
             if sys.version_info >= (3,):
                 stdout = stdout
             else:
                 stdout = stdout.encode("utf-8")
-            if self.disable_output:
-                self.log.write(stdout)
-            else:
-                sys.stderr.write(stdout)
-            self.gen.bld.set_stdout_cache(self, stdout)
+            self._write_stdout(stdout)
+            return stdout
         except OSError:
             e = get_exception()
             raise TaskRunFailure(cmd, str(e))
@@ -150,6 +194,13 @@ class _Task(object):
             e = get_exception()
             raise TaskRunFailure(cmd, str(e))
 
+    def _write_stdout(self, stdout):
+        if self.disable_output:
+            self.log.write(stdout)
+        else:
+            sys.stderr.write(stdout)
+        self.gen.bld.set_stdout_cache(self, stdout)
+
     def __repr__(self):
         ins = ",".join([i.name for i in self.inputs])
         outs = ",".join([i.name for i in self.outputs])
@@ -1,8 +1,12 @@
 import os
+import time
 
 from yaku.environment \
     import \
         Environment
+from yaku.errors \
+    import \
+        CyclicDependency
 
 RULES_REGISTRY = {}
 FILES_REGISTRY = {}
@@ -38,128 +42,147 @@ def set_file_hook(ctx, source, hook):
 class NoHookException(Exception):
     pass
 
+def _task_exts(nodes):
+    return tuple([os.path.splitext(n.name)[1] for n in nodes])
+
+def group_key(t):
+    """Key under which tasks which may run in parallel are grouped.
+
+    Unlike hash_task, the key is the tuple itself, so two different
+    groups can never be merged by a hash collision."""
+    return (t.__class__.__name__, _task_exts(t.inputs), _task_exts(t.outputs),
+            tuple(t.before), tuple(t.after))
+
 def hash_task(t):
     # FIXME: ext_in and ext_out should not be computed from the files
-    ext_in = [os.path.splitext(s.name)[1] for s in t.inputs]
-    ext_out = [os.path.splitext(s.name)[1] for s in t.outputs]
-    tup = tuple(ext_in + ext_out + t.before + t.after)
-    return hash((t.__class__.__name__, tup))
+    return hash(group_key(t))
 
 class TaskManager(object):
+    """Split tasks into groups, and yield those groups in dependency
+    order.
+
+    The group graph is built once from maps of the extensions (and
+    task classes) each group produces and consumes, so the cost is
+    linear in the number of tasks plus the number of group edges."""
     def __init__(self, tasks):
         self.tasks = tasks
 
         self.groups = {}
+        # order[a] is the set of group keys which need to run after group a
         self.order = {}
+        self._npredecessors = {}
+        # (a, b) edges coming from explicit class constraints
+        self._explicit = set()
         self.make_groups()
         self.make_order()
 
-    def set_order(self, a, b):
+    def set_order(self, a, b, explicit=False):
+        """Make group a run before group b. Conflicting constraints are all
+        recorded, and reported as a cycle by next_set, except for inferred
+        constraints conflicting with an explicit one."""
+        if a == b:
+            return
+        if explicit:
+            self._explicit.add((a, b))
+        elif (b, a) in self._explicit:
+            # explicit class constraints take precedence over the ones
+            # inferred from extensions
+            return
         if not a in self.order:
             self.order[a] = set()
-        self.order[a].add(b)
+        if not b in self.order[a]:
+            self.order[a].add(b)
+            self._npredecessors[b] += 1
 
     def make_order(self):
-        keys = list(self.groups.keys())
-        max = len(keys)
-        for i in range(max):
-            t1 = self.groups[keys[i]][0]
-            for j in range(i + 1, max):
-                t2 = self.groups[keys[j]][0]
-
-                if t2.__class__.__name__ in t1.before:
-                    self.set_order(keys[j], keys[i])
-                elif t1.__class__.__name__ in t2.before:
-                    self.set_order(keys[i], keys[j])
+        producers = {}
+        by_class = {}
+        for key in self.groups:
+            class_name, exts_in, exts_out = key[:3]
+            for ext in set(exts_out):
+                if ext in producers:
+                    producers[ext].append(key)
                 else:
-                    # add the constraints based on the comparisons
-                    val = self.compare_exts(t1, t2)
-                    if val > 0:
-                        self.set_order(keys[i], keys[j])
-                    elif val < 0:
-                        self.set_order(keys[j], keys[i])
+                    producers[ext] = [key]
+            if class_name in by_class:
+                by_class[class_name].append(key)
+            else:
+                by_class[class_name] = [key]
+
+        # explicit class constraints first, as they take precedence over the
+        # ones inferred from extensions
+        for key in self.groups:
+            for name in key[3]:
+                # before may be shared between task classes, see
+                # build_task_graph
+                if name != key[0]:
+                    for other in by_class.get(name, []):
+                        self.set_order(other, key, True)
+        for key in self.groups:
+            for ext in set(key[1]):
+                for other in producers.get(ext, []):
+                    self.set_order(other, key)
 
     def make_groups(self):
         # XXX: we assume tasks with same input/output suffix can run
         # in // (naive emulation of csr-like scheduler in waf)
         groups = self.groups
         for t in self.tasks:
-            h = hash_task(t)
+            h = group_key(t)
             if h in groups:
                 groups[h].append(t)
             else:
                 groups[h] = [t]
+                self._npredecessors[h] = 0
 
     def next_set(self):
-        keys = self.groups.keys()
-
-        unconnected = []
-        remainder = []
-
-        for u in keys:
-            for k in self.order.values():
-                if u in k:
-                    remainder.append(u)
-                    break
-            else:
-                unconnected.append(u)
+        unconnected = [k for k, n in self._npredecessors.items() if n == 0]
 
         toreturn = []
         for y in unconnected:
-            toreturn.extend(self.groups[y])
-
+            toreturn.extend(self.groups.pop(y))
+            del self._npredecessors[y]
         # remove stuff only after
         for y in unconnected:
-                try:
-                    self.order.__delitem__(y)
-                except KeyError:
-                    pass
-                self.groups.__delitem__(y)
+            for k in self.order.pop(y, ()):
+                self._npredecessors[k] -= 1
 
-        if not toreturn and remainder:
-            raise Exception("circular order constraint detected %r" % remainder)
+        if not toreturn and self.groups:
+            raise CyclicDependency("circular order constraint detected %r" \
+                                   % list(self.groups.keys()))
 
         return toreturn
 
+def run_task(ctx, task, executor=None):
+    """Run the task if it is out of date. If given, executor.execute(task)
+    is used instead of task.run() to actually run it."""
+    task.node_sigs = getattr(ctx, "node_sigs", None)
 
-    def compare_exts(self, t1, t2):
-        "extension production"
-        def _get_in(t):
-            return [os.path.splitext(s.name)[1] for s in t.inputs]
-        def _get_out(t):
-            return [os.path.splitext(s.name)[1] for s in t.outputs]
-
-        in_ = _get_in(t1)
-        out_ = _get_out(t2)
-        for k in in_:
-            if k in out_:
-                return -1
-        in_ = _get_in(t2)
-        out_ = _get_out(t1)
-        for k in in_:
-            if k in out_:
-                return 1
-        return 0
-
-def run_task(ctx, task):
-    def _run(t):
-        t.run()
-        ctx.cache[tuid] = t.signature()
+    def _outputs_exist():
+        for o in task.outputs:
+            if not os.path.exists(o.abspath()):
+                return False
+        return True
 
     tuid = task.get_uid()
-    # XXX: there may be a better way to do this without stating output
+    # Outputs are only stat'ed once the signature is known to match
     # (we want to know if the task has already been executed in a
     # previous run)
-    for o in task.outputs:
-        if not os.path.exists(o.abspath()):
-            _run(task)
-            break
-    if not tuid in ctx.cache:
-        _run(task)
-    else:
-        sig = task.signature()
-        if sig != ctx.cache[tuid]:
-            _run(task)
+    if ctx.cache.get(tuid, None) != task.signature() or not _outputs_exist():
+        tracer = getattr(ctx, "tracer", None)
+        if tracer is not None:
+            start = tracer.now()
+        tic = time.time()
+        if executor is None:
+            task.run()
+        else:
+            executor.execute(task)
+        durations = getattr(ctx, "task_durations", None)
+        if durations is not None:
+            durations[tuid] = time.time() - tic
+        if tracer is not None:
+            tracer.add_span(repr(task).strip("'"), "task", start, tracer.now())
+        ctx.cache[tuid] = task.signature()
 
 def build_dag(tasks):
     # Build dependency graph (DAG)
@@ -177,28 +200,122 @@ def build_dag(tasks):
             output_to_tuid[o] = t.get_uid()
     return task_deps, output_to_tuid
 
+def build_task_graph(tasks):
+    """Build the task-level dependency graph.
+
+    A task depends on the tasks producing any of its inputs or deps, as
+    well as on every task whose class name appears in its before list.
+
+    Returns a pair (parents, children) of dictionaries indexed by task:
+    parents[t] is the set of tasks which have to be run before t, and
+    children[t] the list of tasks waiting on t."""
+    tuid_to_task = dict([(t.get_uid(), t) for t in tasks])
+    task_deps, output_to_tuid = build_dag(tasks)
+
+    by_class = {}
+    for t in tasks:
+        name = t.__class__.__name__
+        if name in by_class:
+            by_class[name].append(t)
+        else:
+            by_class[name] = [t]
+
+    parents = {}
+    children = dict([(t, []) for t in tasks])
+    for t in tasks:
+        deps = set()
+        for node in t.inputs + t.deps:
+            tuid = output_to_tuid.get(node, None)
+            if tuid is not None:
+                deps.add(tuid_to_task[tuid])
+        name = t.__class__.__name__
+        for before in t.before:
+            # before is a class attribute potentially shared between task
+            # classes, so we ignore constraints on the task own class
+            if before != name:
+                deps.update(by_class.get(before, []))
+        deps.discard(t)
+        parents[t] = deps
+        for p in deps:
+            children[p].append(t)
+    return parents, children
+
+def critical_path_priorities(tasks, parents, children, durations):
+    """Return the {task: priority} dict, where the priority of a task is
+    the duration of the longest chain of tasks starting with it (its own
+    duration included).
+
+    parents and children are the task graph, as returned by
+    build_task_graph. Durations are looked up in the durations dictionary
+    by task uid; tasks never run before are given the median of the known
+    durations (or 1 if there is none), so that without any history the
+    priority is the length of the longest chain."""
+    known = sorted([durations[t.get_uid()] for t in tasks if t.get_uid() in durations])
+    if known:
+        default = known[len(known) // 2]
+    else:
+        default = 1.0
+
+    priorities = {}
+    # Visit the graph from its leaves, a task being ready once all its
+    # children have a priority
+    nchildren = dict([(t, len(children[t])) for t in tasks])
+    stack = [t for t in tasks if nchildren[t] == 0]
+    while stack:
+        t = stack.pop()
+        longest = 0
+        for c in children[t]:
+            longest = max(longest, priorities[c])
+        priorities[t] = durations.get(t.get_uid(), default) + longest
+        for p in parents[t]:
+            nchildren[p] -= 1
+            if nchildren[p] == 0:
+                stack.append(p)
+    # Tasks in a cycle (reported by the runner)
+    for t in tasks:
+        if not t in priorities:
+            priorities[t] = durations.get(t.get_uid(), default)
+    return priorities
+
 def topo_sort(task_deps):
-    # Topological sort (depth-first search)
-    # XXX: cycle detection is missing
-    tmp = []
+    """Topological sort (depth-first search) of the dependency graph.
+
+    Raises CyclicDependency if task_deps contains a cycle."""
     nodes = []
     for dep in task_deps.values():
         nodes.extend(dep)
     nodes.extend(task_deps.keys())
-    nodes = set(nodes)
 
+    tmp = []
+    # nodes currently on the DFS stack are in visiting, fully processed ones
+    # in visited
+    visiting = set()
     visited = set()
-    def visit(node):
-        if not node in visited:
-           visited.add(node)
-           deps = task_deps.get(node, None)
-           if deps:
-               for c in deps:
-                   visit(c)
-           tmp.append(node)
-
-    for node in nodes:
-        visit(node)
+    for root in nodes:
+        if root in visited:
+            continue
+        # explicit stack instead of recursion, as dependency chains may be
+        # deeper than the recursion limit
+        stack = [(root, iter(task_deps.get(root, ())))]
+        visiting.add(root)
+        while stack:
+            node, children = stack[-1]
+            for c in children:
+                if c in visited:
+                    continue
+                if c in visiting:
+                    cycle = [n for n, _ in stack]
+                    cycle = cycle[cycle.index(c):] + [c]
+                    raise CyclicDependency("cycle detected in dependency graph: %s" \
+                                           % " -> ".join([str(n) for n in cycle]))
+                visiting.add(c)
+                stack.append((c, iter(task_deps.get(c, ()))))
+                break
+            else:
+                stack.pop()
+                visiting.remove(node)
+                visited.add(node)
+                tmp.append(node)
 
     return tmp
 
@@ -217,6 +334,8 @@ class TaskGen(object):
         self.name = name
         self.sources = sources
         self.target = target
+        # absolute include directories, used by include scanners
+        self.include_dirs = []
 
         self.env = Environment()
 
@@ -1,3 +1,5 @@
+import os
+
 from yaku.tests.test_helpers \
     import \
         TmpContextBase
@@ -7,6 +9,26 @@ from yaku.context \
 from yaku.conftests \
     import \
         check_compiler
+from yaku.scheduler \
+    import \
+        run_tasks
+from yaku.utils \
+    import \
+        find_program
+
+def _write(filename, content):
+    fid = open(filename, "w")
+    try:
+        fid.write(content)
+    finally:
+        fid.close()
+
+def _read(filename):
+    fid = open(filename, "rb")
+    try:
+        return fid.read()
+    finally:
+        fid.close()
 
 class ContextTest(TmpContextBase):
     def test_load_store_simple(self):
@@ -25,3 +47,30 @@ class SimpleCCTest(TmpContextBase):
         ctx = get_bld()
         ctx.store()
 
+class IncludeScanTest(TmpContextBase):
+    def _build(self):
+        ctx = get_bld()
+        outputs = ctx.builders["ctasks"].compile("foo", ["src/foo.c"])
+        run_tasks(ctx)
+        ctx.store()
+        return _read(outputs[0].abspath())
+
+    def test_build_directory_header(self):
+        """Test a header found by the compiler in the build directory is
+        tracked."""
+        if find_program("gcc") is None:
+            self.skipTest("gcc not available")
+        ctx = get_cfg()
+        ctx.use_tools(["ctasks"])
+        ctx.store()
+
+        os.makedirs("src")
+        _write(os.path.join("src", "foo.c"), '#include "gen.h"\nint foo(void) { return GEN; }\n')
+        # Generated header, only seen by the compiler through the implicit
+        # include path relative to the build directory
+        os.makedirs(os.path.join("build", "src"))
+        _write(os.path.join("build", "src", "gen.h"), "#define GEN 1\n")
+        first = self._build()
+
+        _write(os.path.join("build", "src", "gen.h"), "#define GEN 12\n")
+        self.assertNotEqual(self._build(), first)
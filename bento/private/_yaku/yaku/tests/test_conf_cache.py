@@ -0,0 +1,74 @@
+import os
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        get_cfg
+from yaku.conf_cache \
+    import \
+        ConfCheckCache
+from yaku.conftests \
+    import \
+        check_header, check_headers, check_type_sizes
+
+def _read(filename):
+    fid = open(filename)
+    try:
+        return fid.read()
+    finally:
+        fid.close()
+
+class TestConfCheckCache(TmpContextBase):
+    def setUp(self):
+        super(TestConfCheckCache, self).setUp()
+        self.cache = ConfCheckCache("cache")
+        self.confs = []
+
+    def tearDown(self):
+        for conf in self.confs:
+            conf.log.close()
+        super(TestConfCheckCache, self).tearDown()
+
+    def _conf(self, build_path="build"):
+        conf = get_cfg(build_path=build_path)
+        conf.use_tools(["ctasks"])
+        conf.conf_cache = self.cache
+        self.confs.append(conf)
+        return conf
+
+    def test_hit(self):
+        conf = self._conf()
+        self.assertEqual(check_headers(conf, ["stdio.h", "yaku_nonexistent.h"]), [True, False])
+        self.assertEqual(self.cache.hits, 0)
+        misses = self.cache.misses
+
+        # Results are shared between build directories
+        conf = self._conf("build2")
+        self.assertEqual(check_headers(conf, ["stdio.h", "yaku_nonexistent.h"]), [True, False])
+        self.assertEqual((self.cache.hits, self.cache.misses), (misses, misses))
+        conf.log.flush()
+        self.assertTrue("configuration checks cache" in _read(os.path.join("build2", "config.log")))
+
+    def test_env(self):
+        conf = self._conf()
+        self.assertTrue(check_header(conf, "stdio.h"))
+        os.makedirs("yaku_include")
+        conf.env["CPPPATH"] = ["yaku_include"]
+        self.assertTrue(check_header(conf, "stdio.h"))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_outputs(self):
+        # Successful probes restore their outputs (the object file is read
+        # to find the type sizes)
+        self.assertEqual(check_type_sizes(self._conf(), ["char[17]"]), [17])
+        self.assertEqual(check_type_sizes(self._conf("build2"), ["char[17]"]), [17])
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_report(self):
+        self.assertTrue(check_header(self._conf(), "stdio.h"))
+        self.cache.close()
+        report = ConfCheckCache("cache").report()
+        self.assertTrue("1 entries" in report)
+        self.assertTrue("0 hits, 1 misses" in report)
@@ -0,0 +1,104 @@
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        get_cfg
+from yaku.conftests \
+    import \
+        check_headers, check_types, check_type_size, check_type_sizes, check_funcs
+from yaku.conftests.conftests \
+    import \
+        _split, _try_batches
+from yaku.tools \
+    import \
+        ProbeEngine
+
+class FakeConf(object):
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+class TestBatches(TmpContextBase):
+    def test_split(self):
+        self.assertEqual(_split([1, 2, 3, 4, 5], 2), [[1, 2, 3], [4, 5]])
+        self.assertEqual(_split([1, 2], 4), [[1], [2]])
+        self.assertEqual(_split([], 4), [[]])
+
+    def test_bisect(self):
+        bad = set([3, 6])
+        rounds = []
+        def try_many(name, bodies):
+            rounds.append(len(bodies))
+            return [not (bad & set(body)) for body in bodies]
+
+        for jobs in [1, 3]:
+            rounds = []
+            results = _try_batches(FakeConf(jobs), try_many, "check", range(8), lambda g: g)
+            self.assertEqual(results, dict([(i, not i in bad) for i in range(8)]))
+        # Failing groups are split in halves, each round in one call
+        self.assertEqual(rounds, [3, 4])
+
+class TestConfTests(TmpContextBase):
+    def setUp(self):
+        super(TestConfTests, self).setUp()
+        self.conf = get_cfg()
+        self.conf.use_tools(["ctasks"])
+
+    def tearDown(self):
+        self.conf.log.close()
+        super(TestConfTests, self).tearDown()
+
+    def test_headers(self):
+        self.assertEqual(check_headers(self.conf, ["stdio.h", "yaku_nonexistent.h", "stdlib.h"]),
+                         [True, False, True])
+        self.assertEqual([r["result"] for r in self.conf.conf_results],
+                         [True, False, True])
+
+    def test_types(self):
+        self.assertEqual(check_types(self.conf, ["size_t", "yaku_nonexistent_t"], ["stddef.h"]),
+                         [True, False])
+
+    def test_type_sizes(self):
+        sizes = check_type_sizes(self.conf, ["char", "yaku_nonexistent_t", "char[123]"])
+        self.assertEqual(sizes, [1, False, 123])
+        self.assertEqual(check_type_size(self.conf, "char[45]"), 45)
+
+    def test_funcs(self):
+        self.assertEqual(check_funcs(self.conf, ["malloc", "yaku_nonexistent_func"]),
+                         [True, False])
+
+class TestProbeEngine(TmpContextBase):
+    def setUp(self):
+        super(TestProbeEngine, self).setUp()
+        self.conf = get_cfg()
+        self.conf.use_tools(["ctasks"])
+        self.builder = self.conf.builders["ctasks"]
+
+    def tearDown(self):
+        self.conf.log.close()
+        super(TestProbeEngine, self).tearDown()
+
+    def test_shared_env(self):
+        engine = ProbeEngine(self.conf, self.builder._compile, {"DEFINES": ["YAKU_FOO"]})
+        bodies = ["#ifndef YAKU_FOO\n#error\n#endif", "int x = YAKU_UNDEFINED;"]
+        self.assertEqual(engine.try_probes("check", bodies), [True, False])
+        # Probes only get a copy of the engine environment
+        self.assertFalse("APP_DEFINES" in engine.env)
+        self.assertFalse("YAKU_FOO" in self.conf.env["DEFINES"])
+
+    def test_precompile_headers(self):
+        engine = ProbeEngine(self.conf, self.builder._compile)
+        if not engine.precompile_headers(["stdio.h", "stdlib.h"]):
+            self.skipTest("precompiled headers not supported")
+        self.assertTrue("-include" in engine.env["CFLAGS"])
+        self.assertEqual(engine.try_probes("check", ["int x = sizeof(FILE);", "int y = FOO;"],
+                                           ["stdio.h"]),
+                         [True, False])
+
+    def test_concurrent(self):
+        engine = ProbeEngine(self.conf, self.builder._compile, jobs=4)
+        bodies = ["int x%d = %d;" % (i, i) for i in range(8)] + ["int y = FOO;"]
+        self.assertEqual(engine.try_probes("check", bodies), [True] * 8 + [False])
+        # Every successful probe was recorded in the shared context
+        for task in self.conf.last_tasks[:8]:
+            self.assertEqual(self.conf.cache[task.get_uid()], task.signature())
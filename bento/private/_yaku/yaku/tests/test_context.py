@@ -0,0 +1,95 @@
+import os
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        create_top_nodes, get_cfg, get_bld, NodeSignatures, ScanCache
+from yaku.utils \
+    import \
+        scan_includes
+from yaku._config \
+    import \
+        SCAN_CACHE
+import yaku.node
+
+class TestNodeSignatures(TmpContextBase):
+    def setUp(self):
+        super(TestNodeSignatures, self).setUp()
+        self.src_root, self.bld_root = create_top_nodes(self.d, os.path.join(self.d, "build"))
+
+    def test_unchanged(self):
+        node = self.src_root.make_node("foo.h")
+        node.write("#define FOO 1\n")
+
+        sigs = NodeSignatures()
+        sig = sigs.get(node)
+
+        # The file should not be read again if its stat data did not change
+        def _read(*a, **kw):
+            raise AssertionError("file read again")
+        old_read = yaku.node.Node.read
+        yaku.node.Node.read = _read
+        try:
+            self.assertEqual(sigs.get(node), sig)
+        finally:
+            yaku.node.Node.read = old_read
+
+    def test_changed(self):
+        node = self.src_root.make_node("foo.h")
+        node.write("#define FOO 1\n")
+
+        sigs = NodeSignatures()
+        sig = sigs.get(node)
+        node.write("#define FOO 12\n")
+        self.assertNotEqual(sigs.get(node), sig)
+
+    def test_persistence(self):
+        ctx = get_cfg()
+        ctx.store()
+
+        node = self.src_root.make_node("foo.h")
+        node.write("#define FOO 1\n")
+
+        ctx = get_bld()
+        sig = ctx.node_sigs.get(node)
+        ctx.store()
+
+        ctx = get_bld()
+        self.assertEqual(ctx.node_sigs._sigs[node.abspath()][1], sig)
+
+class TestScanCache(TmpContextBase):
+    def test_persistence(self):
+        ctx = get_cfg()
+        ctx.store()
+
+        foo = os.path.join(self.d, "foo.c")
+        bar = os.path.join(self.d, "bar.c")
+        for filename in [foo, bar]:
+            fid = open(filename, "w")
+            try:
+                fid.write('#include "foo.h"\n')
+            finally:
+                fid.close()
+
+        ctx = get_bld()
+        scan_includes(foo, ctx.scan_cache)
+        scan_includes(bar, ctx.scan_cache)
+        ctx.store()
+        cache_file = os.path.join("build", SCAN_CACHE)
+
+        # Not written again if nothing changed
+        ctx = get_bld()
+        self.assertFalse(ctx.scan_cache.changed)
+        os.remove(cache_file)
+        scan_includes(foo, ctx.scan_cache)
+        ctx.store()
+        self.assertFalse(os.path.exists(cache_file))
+
+        # Unused entries are dropped
+        ctx.scan_cache[foo] = (None, [])
+        ctx.store()
+        ctx = get_bld()
+        self.assertEqual(list(ctx.scan_cache.keys()), [foo])
+        self.assertEqual(scan_includes(foo, ctx.scan_cache), [('"', "foo.h")])
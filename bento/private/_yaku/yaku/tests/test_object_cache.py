@@ -0,0 +1,85 @@
+import os
+import subprocess
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.object_cache \
+    import \
+        ObjectCache, split_command
+from yaku.utils \
+    import \
+        find_program
+
+def _write(filename, content):
+    fid = open(filename, "w")
+    try:
+        fid.write(content)
+    finally:
+        fid.close()
+
+class TestSplitCommand(TmpContextBase):
+    def test_simple(self):
+        cmd = ["gcc", "-O2", "-c", "-o", "/tmp/foo.o", "foo.c"]
+        preprocess, key = split_command(cmd)
+        self.assertEqual(preprocess, ["gcc", "-O2", "-E", "foo.c"])
+        self.assertEqual(key, ["gcc", "-O2", "-c", "-o", "<output>", "foo.c"])
+
+    def test_unsupported(self):
+        self.assertEqual(split_command(["gcc", "-o", "foo", "foo.o"]), (None, None))
+        self.assertEqual(split_command(["cl.exe", "/c", "/Fofoo.obj", "foo.c"]), (None, None))
+
+class TestObjectCache(TmpContextBase):
+    def setUp(self):
+        super(TestObjectCache, self).setUp()
+        if find_program("gcc") is None:
+            self.skipTest("gcc not available")
+        _write("foo.c", "int foo() { return 0; }\n")
+        self.cache = ObjectCache("cache")
+        self.ncompiles = 0
+
+    def _compile(self, output):
+        cmd = ["gcc", "-c", "-o", output, "foo.c"]
+        def _run():
+            self.ncompiles += 1
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            stdout = p.communicate()[0]
+            return p.returncode, stdout
+        return self.cache.run(cmd, [output], _run)
+
+    def test_hit(self):
+        self.assertEqual(self._compile("foo.o"), None)
+        self.assertEqual(self._compile("bar.o"), "")
+        self.assertEqual(self.ncompiles, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertTrue(os.path.exists("bar.o"))
+
+    def test_changed_source(self):
+        self._compile("foo.o")
+        _write("foo.c", "int foo() { return 1; }\n")
+        self.assertEqual(self._compile("foo.o"), None)
+        self.assertEqual(self.ncompiles, 2)
+
+    def test_hit_output(self):
+        _write("foo.c", "#warning cached warning\nint foo() { return 0; }\n")
+        self._compile("foo.o")
+        output = self._compile("bar.o")
+        self.assertEqual(self.ncompiles, 1)
+        self.assertTrue("cached warning" in output)
+
+    def test_stats_and_eviction(self):
+        self._compile("foo.o")
+        self._compile("foo.o")
+        self.cache.close()
+        self.assertEqual(self.cache.read_stats(), (1, 1))
+
+        def _entries():
+            ret = []
+            for root, dirs, files in os.walk("cache"):
+                ret.extend([f for f in files if f != "stats.txt"])
+            return ret
+        self.assertEqual(len(_entries()), 1)
+
+        cache = ObjectCache("cache", max_size=0)
+        cache.evict()
+        self.assertEqual(_entries(), [])
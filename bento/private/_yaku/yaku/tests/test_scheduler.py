@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        create_top_nodes
+from yaku.task \
+    import \
+        task_factory
+from yaku.task_manager \
+    import \
+        TaskManager, build_task_graph, critical_path_priorities
+from yaku.scheduler \
+    import \
+        ParallelRunner, ProcessPoolExecutor, multiprocessing
+import yaku.errors
+
+class _FakeContext(object):
+    def __init__(self):
+        self.cache = {}
+        self.task_durations = {}
+
+def _write_pid(target):
+    fid = open(target, "w")
+    try:
+        fid.write(str(os.getpid()))
+    finally:
+        fid.close()
+
+def _fail(target):
+    raise yaku.errors.TaskRunFailure(["fail"], "boom")
+
+def _make_task(name, inputs, outputs, func):
+    task = task_factory(name)(inputs=inputs, outputs=outputs)
+    task.env_vars = []
+    task.env = {}
+    task.func = func
+    return task
+
+class TestParallelRunner(TmpContextBase):
+    def setUp(self):
+        super(TestParallelRunner, self).setUp()
+        self.src_root, self.bld_root = create_top_nodes(self.d, os.path.join(self.d, "build"))
+        self.lock = threading.Lock()
+        self.events = []
+
+    def _record(self, event):
+        self.lock.acquire()
+        try:
+            self.events.append(event)
+        finally:
+            self.lock.release()
+
+    def _copy(self, delay=0):
+        def _f(task):
+            self._record(("start", task.outputs[0].name))
+            time.sleep(delay)
+            task.outputs[0].write("".join([i.read() for i in task.inputs]))
+            self._record(("end", task.outputs[0].name))
+        return _f
+
+    def _setup_tasks(self):
+        sources = []
+        for name in ["slow", "fast"]:
+            n = self.src_root.make_node(name + ".c")
+            n.write(name)
+            sources.append(n)
+
+        slow_o = self.bld_root.make_node("slow.o")
+        fast_o = self.bld_root.make_node("fast.o")
+        slow_so = self.bld_root.make_node("slow.so")
+        fast_so = self.bld_root.make_node("fast.so")
+
+        return [
+            _make_task("sched_cc", [sources[0]], [slow_o], self._copy(0.3)),
+            _make_task("sched_cc", [sources[1]], [fast_o], self._copy()),
+            _make_task("sched_link", [slow_o], [slow_so], self._copy()),
+            _make_task("sched_link", [fast_o], [fast_so], self._copy()),
+        ]
+
+    def test_graph(self):
+        tasks = self._setup_tasks()
+        parents, children = build_task_graph(tasks)
+        self.assertEqual(parents[tasks[0]], set())
+        self.assertEqual(parents[tasks[2]], set([tasks[0]]))
+        self.assertEqual(parents[tasks[3]], set([tasks[1]]))
+        self.assertEqual(children[tasks[1]], [tasks[3]])
+
+    def test_no_group_barrier(self):
+        # fast.so should be linked while slow.o is still compiling
+        tasks = self._setup_tasks()
+        runner = ParallelRunner(_FakeContext(), TaskManager(tasks), 2)
+        runner.start()
+        runner.run()
+
+        self.assertTrue(self.events.index(("end", "fast.so")) < self.events.index(("end", "slow.o")))
+        self.assertTrue(self.events.index(("end", "slow.o")) < self.events.index(("start", "slow.so")))
+        self.assertEqual(self.bld_root.find_node("slow.so").read(), "slow")
+
+    def test_critical_path_priorities(self):
+        tasks = self._setup_tasks()
+        parents, children = build_task_graph(tasks)
+
+        priorities = critical_path_priorities(tasks, parents, children, {})
+        self.assertEqual([priorities[t] for t in tasks], [2, 2, 1, 1])
+
+        durations = {tasks[0].get_uid(): 1, tasks[1].get_uid(): 10, tasks[3].get_uid(): 3}
+        priorities = critical_path_priorities(tasks, parents, children, durations)
+        # slow.so was never run: median of the known durations
+        self.assertEqual([priorities[t] for t in tasks], [4, 13, 3, 3])
+
+    def test_priorities(self):
+        tasks = self._setup_tasks()
+        ctx = _FakeContext()
+        runner = ParallelRunner(ctx, TaskManager(tasks), 1)
+        runner.start()
+        runner.run()
+        # Without history, tasks are run in order
+        self.assertEqual(self.events[0], ("start", "slow.o"))
+        self.assertEqual(set(ctx.task_durations.keys()), set([t.get_uid() for t in tasks]))
+        self.assertTrue(ctx.task_durations[tasks[0].get_uid()] >= 0.3)
+
+        # fast.c is now known to take longer
+        ctx.cache = {}
+        ctx.task_durations[tasks[1].get_uid()] = 10
+        self.events = []
+        runner = ParallelRunner(ctx, TaskManager(self._setup_tasks()), 1)
+        runner.start()
+        runner.run()
+        self.assertEqual(self.events[:2], [("start", "fast.o"), ("end", "fast.o")])
+
+    def test_failure(self):
+        def _fail(task):
+            raise yaku.errors.TaskRunFailure(["cc"], "boom")
+
+        tasks = self._setup_tasks()
+        tasks[1].func = _fail
+        runner = ParallelRunner(_FakeContext(), TaskManager(tasks), 2)
+        runner.start()
+        self.assertRaises(yaku.errors.TaskRunFailure, runner.run)
+        self.assertTrue(("start", "fast.so") not in self.events)
+
+class TestProcessPoolExecutor(TmpContextBase):
+    def setUp(self):
+        super(TestProcessPoolExecutor, self).setUp()
+        if multiprocessing is None:
+            self.skipTest("multiprocessing not available")
+        self.src_root, self.bld_root = create_top_nodes(self.d, os.path.join(self.d, "build"))
+
+    def _setup_tasks(self, process_func):
+        def _thread_func(task):
+            _write_pid(task.outputs[0].abspath())
+
+        tasks = []
+        for i in range(4):
+            source = self.src_root.make_node("src%d.py" % i)
+            source.write("")
+            target = self.bld_root.make_node("src%d.py" % i)
+            task = _make_task("sched_py", [source], [target], _thread_func)
+            if process_func is not None:
+                task.process_func = process_func
+                task.process_args = (target.abspath(),)
+            tasks.append(task)
+        return tasks
+
+    def test_process_func(self):
+        tasks = self._setup_tasks(_write_pid)
+        runner = ParallelRunner(_FakeContext(), TaskManager(tasks), 2)
+        runner.start()
+        self.assertTrue(isinstance(runner.executor, ProcessPoolExecutor))
+        runner.run()
+
+        for t in tasks:
+            self.assertNotEqual(int(t.outputs[0].read()), os.getpid())
+
+    def test_thread_func(self):
+        tasks = self._setup_tasks(None)
+        runner = ParallelRunner(_FakeContext(), TaskManager(tasks), 2)
+        runner.start()
+        runner.run()
+
+        for t in tasks:
+            self.assertEqual(int(t.outputs[0].read()), os.getpid())
+
+    def test_failure(self):
+        tasks = self._setup_tasks(_fail)
+        runner = ParallelRunner(_FakeContext(), TaskManager(tasks), 2)
+        runner.start()
+        self.assertRaises(yaku.errors.TaskRunFailure, runner.run)
@@ -0,0 +1,81 @@
+import os
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.context \
+    import \
+        create_top_nodes
+from yaku.task \
+    import \
+        task_factory
+from yaku.task_manager \
+    import \
+        TaskManager, topo_sort, order_tasks
+from yaku.errors \
+    import \
+        CyclicDependency
+
+class TestTaskManager(TmpContextBase):
+    def setUp(self):
+        super(TestTaskManager, self).setUp()
+        self.src_root, self.bld_root = create_top_nodes(self.d, os.path.join(self.d, "build"))
+
+    def _task(self, name, inputs, outputs):
+        inputs = [self.bld_root.make_node(i) for i in inputs]
+        outputs = [self.bld_root.make_node(o) for o in outputs]
+        return task_factory(name)(inputs=inputs, outputs=outputs)
+
+    def test_next_set(self):
+        link = self._task("tm_link", ["a.o", "b.o"], ["a.so"])
+        cc_a = self._task("tm_cc", ["a.c"], ["a.o"])
+        cc_b = self._task("tm_cc", ["b.c"], ["b.o"])
+        cython = self._task("tm_cython", ["b.pyx"], ["b.c"])
+
+        manager = TaskManager([link, cc_a, cc_b, cython])
+        self.assertEqual(manager.next_set(), [cython])
+        self.assertEqual(set(manager.next_set()), set([cc_a, cc_b]))
+        self.assertEqual(manager.next_set(), [link])
+        self.assertEqual(manager.next_set(), [])
+
+    def test_next_set_cycle(self):
+        t1 = self._task("tm_foo", ["a.x"], ["a.y"])
+        t2 = self._task("tm_bar", ["b.y"], ["b.z"])
+        t3 = self._task("tm_baz", ["c.z"], ["c.x"])
+
+        manager = TaskManager([t1, t2, t3])
+        self.assertRaises(CyclicDependency, manager.next_set)
+
+    def test_next_set_reverse_cycle(self):
+        # Each group consumes what the other one produces
+        t1 = self._task("tm_foo", ["a.x"], ["a.y"])
+        t2 = self._task("tm_bar", ["b.y"], ["b.x"])
+
+        manager = TaskManager([t1, t2])
+        self.assertRaises(CyclicDependency, manager.next_set)
+
+    def test_next_set_explicit_order(self):
+        # An explicit class constraint wins over the inferred one
+        t1 = self._task("tm_foo2", ["a.x"], ["a.y"])
+        t2 = self._task("tm_bar2", ["b.y"], ["b.z"])
+        t1.before = ["tm_bar2Task"]
+
+        manager = TaskManager([t1, t2])
+        self.assertEqual(manager.next_set(), [t2])
+        self.assertEqual(manager.next_set(), [t1])
+
+    def test_topo_sort(self):
+        deps = {"c": ["b"], "b": ["a"], "d": ["a", "c"]}
+        order = topo_sort(deps)
+        for target, sources in deps.items():
+            for s in sources:
+                self.assertTrue(order.index(s) < order.index(target))
+
+    def test_topo_sort_cycle(self):
+        deps = {"c": ["b"], "b": ["a"], "a": ["c"]}
+        self.assertRaises(CyclicDependency, lambda: topo_sort(deps))
+
+    def test_order_tasks(self):
+        link = self._task("tm_link", ["a.o"], ["a.so"])
+        cc = self._task("tm_cc", ["a.c"], ["a.o"])
+        self.assertEqual(order_tasks([link, cc]), [cc, link])
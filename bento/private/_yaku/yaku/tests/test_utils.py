@@ -0,0 +1,50 @@
+import os
+
+from yaku.tests.test_helpers \
+    import \
+        TmpContextBase
+from yaku.utils \
+    import \
+        find_deps, scan_includes
+
+def _write(filename, content):
+    dirname = os.path.dirname(filename)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+    fid = open(filename, "w")
+    try:
+        fid.write(content)
+    finally:
+        fid.close()
+
+class TestFindDeps(TmpContextBase):
+    def setUp(self):
+        super(TestFindDeps, self).setUp()
+        _write("src/foo.c", """\
+#include <stdio.h>
+#include "foo.h"
+/* #include "commented.h" */
+#include <bar.h>
+""")
+        _write("src/foo.h", "#include <bar.h>\n")
+        _write("include/bar.h", '#include "bar_private.h"\n')
+        _write("include/bar_private.h", "")
+
+    def test_simple(self):
+        deps = find_deps("src/foo.c", ["include"])
+        self.assertEqual(deps, [os.path.join("src", "foo.h"),
+                                os.path.join("include", "bar.h"),
+                                os.path.join("include", "bar_private.h")])
+
+    def test_cache(self):
+        cache = {}
+        deps = find_deps("src/foo.c", ["include"], cache)
+        self.assertEqual(len(cache), 4)
+
+        # Cached includes are reused as long as the file is not modified
+        key, includes = cache["src/foo.c"]
+        cache["src/foo.c"] = (key, [])
+        self.assertEqual(find_deps("src/foo.c", ["include"], cache), [])
+
+        _write("src/foo.c", '#include "foo.h"\n#include "foo.h"\n')
+        self.assertEqual(scan_includes("src/foo.c", cache), [('"', "foo.h"), ('"', "foo.h")])
@@ -1,13 +1,24 @@
 import os
 import sys
 import copy
+import threading
+if sys.version_info[0] < 3:
+    import Queue as queue
+    from cStringIO \
+        import \
+            StringIO
+else:
+    import queue
+    from io \
+        import \
+            StringIO
 
 from yaku._config \
     import \
         TOOLDIRS
 from yaku.task_manager \
     import \
-        CompiledTaskGen, TaskGen
+        CompiledTaskGen, TaskGen, TaskManager, run_task
 from yaku.errors \
     import \
         TaskRunFailure
@@ -76,20 +87,94 @@ class Builder(object):
         outputs = tasks[0].outputs[:]
         return outputs
 
-def try_task_maker(conf, task_maker, name, body, headers, env=None):
+def _probe_code(body, headers):
     if headers:
         head = "\n".join(["#include <%s>" % h for h in headers])
     else:
         head = ""
-    code = "\n".join([c for c in [head, body]])
+    return "\n".join([c for c in [head, body]])
+
+def _probe_env(conf, env):
+    # Environment of the probes, computed once and shared (through shallow
+    # copies) by every probe using it
+    ret = _merge_env(copy.deepcopy(conf.env), env)
+    ret.prepend("LIBDIR", conf.path.declare(".").abspath())
+    return ret
+
+def _prepare_probe(conf, task_maker, name, code, env):
     sources = [create_file(conf, code, name, ".c")]
 
     task_gen = CompiledTaskGen("conf", conf, sources, name)
-    task_gen.env.update(copy.deepcopy(conf.env))
-    task_gen.env = _merge_env(task_gen.env, env)
-    task_gen.env.prepend("LIBDIR", conf.path.declare(".").abspath())
+    # task makers only ever replace variables of their environment, so a
+    # shallow copy is enough
+    task_gen.env = copy.copy(env)
+
+    return task_maker(task_gen, name)
+
+class _ProbeExecutor(object):
+    """run_task executor for probes run concurrently on one configure
+    context.
+
+    run_task reads and updates the context (task signatures cache, node
+    signatures, task durations) with lock held, and the lock is only released
+    while a task runs its compiler process. Running tasks only store their
+    command and output in the context, under their own uid."""
+    def __init__(self, lock):
+        self.lock = lock
+
+    def execute(self, task):
+        self.lock.release()
+        try:
+            task.run()
+        finally:
+            self.lock.acquire()
 
-    tasks = task_maker(task_gen, name)
+def _run_probe_tasks(conf, tasks, lock=None):
+    if lock is None:
+        run_tasks(conf, tasks)
+        return
+
+    executor = _ProbeExecutor(lock)
+    lock.acquire()
+    try:
+        task_manager = TaskManager(tasks)
+        grp = task_manager.next_set()
+        while grp:
+            for task in grp:
+                run_task(conf, task, executor)
+            grp = task_manager.next_set()
+    finally:
+        lock.release()
+
+def _run_probe(conf, task_maker, code, tasks, lock=None):
+    # Return (succeed, explanation), from the configuration checks cache
+    # if any. lock protects conf if probes are run concurrently (the cache
+    # is safe to use concurrently)
+    cache = getattr(conf, "conf_cache", None)
+    if cache is not None:
+        key = cache.probe_key(conf, task_maker.__name__, code, tasks[0].env)
+        outputs = [o.abspath() for t in tasks for o in t.outputs]
+        ret = cache.fetch_probe(key, outputs)
+        if ret is not None:
+            tasks[-1].log.write("(result from the configuration checks cache)\n")
+            tracer = getattr(conf, "tracer", None)
+            if tracer is not None:
+                tracer.add_instant("configuration checks cache hit", "cache", {"probe": code})
+            return ret
+
+    try:
+        _run_probe_tasks(conf, tasks, lock)
+        ret = True, None
+    except TaskRunFailure:
+        e = get_exception()
+        ret = False, str(e)
+    if cache is not None:
+        cache.store_probe(key, outputs, ret[0], ret[1])
+    return ret
+
+def try_task_maker(conf, task_maker, name, body, headers, env=None):
+    code = _probe_code(body, headers)
+    tasks = _prepare_probe(conf, task_maker, name, code, _probe_env(conf, env))
     conf.last_task = tasks[-1]
 
     for t in tasks:
@@ -99,17 +184,137 @@ def try_task_maker(conf, task_maker, name, body, headers, env=None):
     succeed = False
     explanation = None
     try:
-        try:
-            run_tasks(conf, tasks)
-            succeed = True
-        except TaskRunFailure:
-            e = get_exception()
-            explanation = str(e)
-            #raise
+        succeed, explanation = _run_probe(conf, task_maker, code, tasks)
     finally:
         write_log(conf, conf.log, tasks, code, succeed, explanation)
     return succeed
 
+def _run_concurrently(func, args, jobs):
+    args = list(args)
+    if jobs <= 1 or len(args) <= 1:
+        for arg in args:
+            func(arg)
+        return
+
+    pending = queue.Queue()
+    for arg in args:
+        pending.put(arg)
+    errors = []
+    def _worker():
+        while True:
+            try:
+                arg = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                func(arg)
+            except Exception:
+                errors.append(get_exception())
+
+    threads = []
+    for i in range(min(jobs, len(args))):
+        t = threading.Thread(target=_worker)
+        t.setDaemon(True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+def try_task_makers(conf, task_maker, name, bodies, headers, env=None, jobs=1):
+    """Like try_task_maker for each body of bodies, the probes running
+    concurrently in up to jobs threads sharing conf.
+
+    The probes are created in the current build directory, each under its
+    own name. Return the list of results, in the order of bodies. The last
+    task of every probe is stored in conf.last_tasks."""
+    return ProbeEngine(conf, task_maker, env, jobs).try_probes(name, bodies, headers)
+
+class ProbeEngine(object):
+    """Run batches of probes sharing one task maker and one environment.
+
+    The environment is prepared once instead of once per probe, every probe
+    task generator only getting a shallow copy of it. The probes of a batch
+    are run concurrently by a pool of jobs threads: they share the configure
+    context, which is only updated with a lock held, the compiler processes
+    running in parallel. Headers included by
+    every probe (e.g. Python.h) may be precompiled once for the whole
+    engine with precompile_headers."""
+    def __init__(self, conf, task_maker, env=None, jobs=None):
+        if jobs is None:
+            jobs = getattr(conf, "jobs", 1)
+        self.conf = conf
+        self.task_maker = task_maker
+        self.jobs = jobs
+        self.env = _probe_env(conf, env)
+        self.precompiled_headers = None
+
+    def precompile_headers(self, headers):
+        """Precompile the given headers, and make every later probe of the
+        engine use them.
+
+        Only supported with gcc-like compilers: return False (and leave the
+        engine unchanged) if the precompiled header could not be built."""
+        conf = self.conf
+        code = _probe_code("", headers)
+        tasks = _prepare_probe(conf, self.task_maker, "pch_", code, self.env)
+        task = tasks[0]
+        cflags = [v for v in task.env_vars if v.endswith("CFLAGS")]
+        if len(cflags) != 1:
+            return False
+        cflags = cflags[0]
+
+        # The compile task of a probe including the headers, made to compile
+        # them as a header instead
+        header = create_file(conf, code, "pch_", ".h")
+        task.inputs = [header]
+        task.outputs = [header.parent.declare(header.name + ".gch")]
+        task.env = copy.copy(task.env)
+        task.env[cflags] = task.env[cflags] + ["-x", "c-header"]
+        task.disable_output = True
+        task.log = conf.log
+
+        conf.log.write("Precompiling headers %s\n" % ", ".join(headers))
+        succeed, explanation = _run_probe(conf, self.task_maker, code, [task])
+        write_log(conf, conf.log, [task], code, succeed, explanation)
+        if succeed:
+            # gcc uses header.h.gch instead of header.h when valid, and
+            # silently falls back on header.h otherwise. The headers are
+            # expected to be protected against multiple inclusion.
+            self.env[cflags] = self.env[cflags] + ["-include", header.abspath()]
+            self.precompiled_headers = headers
+        return succeed
+
+    def try_probes(self, name, bodies, headers=None):
+        """Build every probe body of bodies (prefixed with the include of
+        headers), and return the list of results in the order of bodies. The
+        last task of every probe is stored in conf.last_tasks."""
+        conf = self.conf
+        probes = []
+        for i in range(len(bodies)):
+            code = _probe_code(bodies[i], headers)
+            tasks = _prepare_probe(conf, self.task_maker, "%s_%d" % (name, i), code, self.env)
+            # Each probe output is logged separately, to keep the log readable
+            log = StringIO()
+            for t in tasks:
+                t.disable_output = True
+                t.log = log
+            probes.append((code, tasks, log))
+        conf.last_tasks = [tasks[-1] for code, tasks, log in probes]
+
+        results = [(False, None)] * len(probes)
+        lock = threading.Lock()
+        def _run(i):
+            code, tasks, log = probes[i]
+            results[i] = _run_probe(conf, self.task_maker, code, tasks, lock)
+        _run_concurrently(_run, range(len(probes)), self.jobs)
+
+        for (code, tasks, log), (succeed, explanation) in zip(probes, results):
+            conf.log.write(log.getvalue())
+            write_log(conf, conf.log, tasks, code, succeed, explanation)
+        return [succeed for succeed, explanation in results]
+
 def _merge_env(_env, new_env):
     if new_env is not None:
         ret = copy.copy(_env)
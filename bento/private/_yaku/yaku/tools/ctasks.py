@@ -40,6 +40,28 @@ cshlink, cshlink_vars = compile_fun("cshlib", "${SHLINK} ${APP_LIBDIR} ${APP_LIB
 
 clink, clink_vars = compile_fun("clib", "${STLINK} ${STLINKFLAGS} ${STLINK_TGT_F}${TGT[0].abspath()} ${STLINK_SRC_F}${SRC}", False)
 
+def include_scanner(task):
+    """Return a scan function for a compilation task, which returns the
+    nodes of the headers included by the task source.
+
+    Headers are looked for in the task generator include_dirs, and scan
+    results are memoized in the build context scan_cache."""
+    def _scan():
+        source = task.inputs[0]
+        cache = getattr(task.gen.bld, "scan_cache", None)
+        paths = find_deps(source.abspath(), task.gen.include_dirs, cache)
+
+        root = source
+        while root.parent:
+            root = root.parent
+        deps = []
+        for p in paths:
+            node = root.find_node(p)
+            if node is not None:
+                deps.append(node)
+        return deps
+    return _scan
+
 @extension('.c')
 def c_hook(self, node):
     tasks = ccompile_task(self, node)
@@ -54,6 +76,8 @@ def ccompile_task(self, node):
     task = task_factory("cc")(inputs=[node], outputs=[target], func=ccompile, env=self.env)
     task.gen = self
     task.env_vars = cc_vars
+    task.scan = include_scanner(task)
+    task.cacheable = True
     return [task]
 
 def shared_c_hook(self, node):
@@ -69,6 +93,8 @@ def shared_ccompile_task(self, node):
     task = task_factory("shcc")(inputs=[node], outputs=[target], func=shccompile, env=self.env)
     task.gen = self
     task.env_vars = cc_vars
+    task.scan = include_scanner(task)
+    task.cacheable = True
     return [task]
 
 def shlink_task(self, name):
@@ -115,6 +141,18 @@ def apply_define(task_gen):
     defines = task_gen.env["DEFINES"]
     task_gen.env["APP_DEFINES"] = [task_gen.env["DEFINES_FMT"] % p for p in defines]
 
+def get_include_dirs(task_gen, cpppaths):
+    # Absolute include directories, in the order the compiler sees them:
+    # relative paths are given to the compiler, which runs from the build
+    # directory
+    bldnode = task_gen.sources[0].ctx.bldnode
+    dirs = []
+    for p in cpppaths:
+        d = os.path.normpath(os.path.join(bldnode.abspath(), p))
+        if not d in dirs:
+            dirs.append(d)
+    return dirs
+
 def apply_cpppath(task_gen):
     cpppaths = task_gen.env["CPPPATH"]
     implicit_paths = set([s.parent.srcpath() \
@@ -130,6 +168,7 @@ def apply_cpppath(task_gen):
         else:
             relcpppaths.append(p)
     cpppaths = list(implicit_paths) + relcpppaths
+    task_gen.include_dirs = get_include_dirs(task_gen, cpppaths)
     task_gen.env["INCPATH"] = [
             task_gen.env["CPPPATH_FMT"] % p
             for p in cpppaths]
@@ -179,6 +218,11 @@ class CCBuilder(yaku.tools.Builder):
     def try_compile_no_blddir(self, name, body, headers=None, env=None):
         return yaku.tools.try_task_maker(self.ctx, self._compile, name, body, headers, env)
 
+    def try_compile_many(self, name, bodies, headers=None, jobs=None):
+        """Like try_compile for every body of bodies, compiled concurrently.
+        Return the list of results."""
+        return self._try_many(self._compile, name, bodies, headers, None, jobs)
+
     def static_library(self, name, sources, env=None):
         sources = self.to_nodes(sources)
         task_gen = CompiledTaskGen("ccstaticlib", self.ctx, sources, name)
@@ -283,6 +327,18 @@ class CCBuilder(yaku.tools.Builder):
     def try_program_no_blddir(self, name, body, headers=None, env=None):
         return yaku.tools.try_task_maker(self.ctx, self._program, name, body, headers, env)
 
+    def try_program_many(self, name, bodies, headers=None, env=None, jobs=None):
+        """Like try_program for every body of bodies, built concurrently.
+        Return the list of results."""
+        return self._try_many(self._program, name, bodies, headers, env, jobs)
+
+    def _try_many(self, task_maker, name, bodies, headers, env, jobs):
+        if jobs is None:
+            jobs = getattr(self.ctx, "jobs", 1)
+        return with_conf_blddir(self.ctx, name, "".join(bodies),
+                                lambda : yaku.tools.try_task_makers(self.ctx, task_maker, name,
+                                                                    bodies, headers, env, jobs))
+
     def configure(self, candidates=None):
         ctx = self.ctx
         if candidates is None:
@@ -18,7 +18,7 @@ from yaku.compiled_fun \
         compile_fun
 from yaku.tools.ctasks \
     import \
-        apply_cpppath, apply_libdir, apply_libs, apply_define
+        apply_cpppath, apply_libdir, apply_libs, apply_define, include_scanner
 import yaku.tools
 
 cxxcompile, cxx_vars = compile_fun("cxx", "${CXX} ${CXXFLAGS} ${INCPATH} ${APP_DEFINES} ${CXX_TGT_F}${TGT[0].abspath()} ${CXX_SRC_F}${SRC}", False)
@@ -39,9 +39,8 @@ def cxxcompile_task(self, node):
     task = task_factory("cxx")(inputs=[node], outputs=[target])
     task.gen = self
     task.env_vars = cxx_vars
-    #print find_deps("foo.c", ["."])
-    #task.scan = lambda : find_deps(node, ["."])
-    #task.deps.extend(task.scan())
+    task.scan = include_scanner(task)
+    task.cacheable = True
     task.env = self.env
     task.func = cxxcompile
     return [task]
@@ -35,7 +35,7 @@ from yaku.conftests \
         check_compiler, check_header
 from yaku.tools.ctasks \
     import \
-        apply_define
+        apply_define, include_scanner, get_include_dirs
 from yaku.scheduler \
     import \
         run_tasks
@@ -155,6 +155,8 @@ def pycc_task(self, node):
     task.env_vars = pycc_vars
     task.env = self.env
     task.func = pycc
+    task.scan = include_scanner(task)
+    task.cacheable = True
     return [task]
 
 def pycxx_hook(self, node):
@@ -173,6 +175,8 @@ def pycxx_task(self, node):
     task.env_vars = pycxx_vars
     task.env = self.env
     task.func = pycxx
+    task.scan = include_scanner(task)
+    task.cacheable = True
     return [task]
 
 def pylink_task(self, name):
@@ -219,6 +223,22 @@ class PythonBuilder(yaku.tools.Builder):
         finally:
             set_extension_hook(".c", old_hook)
 
+    def try_compile_many(self, name, bodies, headers=None, jobs=None):
+        """Like try_compile for every body of bodies, compiled concurrently.
+
+        The headers (e.g. Python.h) are precompiled once for all the probes
+        when the compiler supports it."""
+        def _try_many():
+            engine = yaku.tools.ProbeEngine(self.ctx, self._compile, jobs=jobs)
+            if headers:
+                engine.precompile_headers(headers)
+            return engine.try_probes(name, bodies, headers)
+        old_hook = set_extension_hook(".c", pycc_task)
+        try:
+            return with_conf_blddir(self.ctx, name, "".join(bodies), _try_many)
+        finally:
+            set_extension_hook(".c", old_hook)
+
     def try_extension(self, name, body, headers=None):
         old_hook = set_extension_hook(".c", pycc_task)
         try:
@@ -533,6 +553,7 @@ def apply_cpppath(task_gen):
         else:
             relcpppaths.append(p)
     cpppaths = list(implicit_paths) + relcpppaths
+    task_gen.include_dirs = get_include_dirs(task_gen, cpppaths)
     task_gen.env["PYEXT_INCPATH"] = [
             task_gen.env["PYEXT_CPPPATH_FMT"] % p
             for p in cpppaths]
@@ -39,6 +39,28 @@ def convert_func(self):
         raise TaskRunFailure(cmd)
     target.write(source.read())
 
+def convert_file(source, target):
+    """Run 2to3 in place on the file source, and copy the result into
+    target.
+
+    Same as convert_func, but running lib2to3 in the current process: this
+    is used when the task is executed in a process pool, where stdout can
+    be safely redirected."""
+    cmd = ["2to3", "-w", "--no-diffs", "-n", source]
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    out = StringIO()
+    sys.stdout = sys.stderr = out
+    try:
+        try:
+            st = lib2to3.main.main("lib2to3.fixes", cmd[1:])
+        except SystemExit:
+            st = 1
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+    if st != 0:
+        raise TaskRunFailure(cmd, out.getvalue())
+    shutil.copyfile(source, target)
+
 def copy_func(self):
     source, target = self.inputs[0], self.outputs[0]
     pprint('YELLOW', "%-16s%s" % (self.name.upper(),
@@ -109,6 +131,8 @@ class Py3kConverterBuilder(yaku.tools.Builder):
                 target = py3k_top.declare(source.path_from(py3k_tmp))
                 task = convert_tf(inputs=[source], outputs=[target])
                 task.func = convert_func
+                task.process_func = convert_file
+                task.process_args = (source.abspath(), target.abspath())
                 task.env_vars = {}
                 task.env = env
                 tasks.append(task)
@@ -52,35 +52,75 @@ def lines_includes(filename):
     code = re_cpp.sub(repl, code)
     return [(m.group(2), m.group(3)) for m in re.finditer(re_inc, code)]
 
-def find_deps(node, cpppaths=["/usr/include", "."]):
+def stat_key(path):
+    """Return a key which changes whenever the file content is likely to
+    have changed."""
+    st = os.stat(path)
+    # st_mtime_ns is only available from python 3.3
+    return (getattr(st, "st_mtime_ns", st.st_mtime), st.st_size, st.st_ino)
+
+def scan_includes(filename, cache=None):
+    """Return the list of (kind, name) for each include in filename, kind
+    being either '<' or '"'.
+
+    If given, cache is a dictionary used to memoize the result, keyed by
+    filename, and invalidated when the file stat_key changes."""
+    if cache is not None:
+        key = stat_key(filename)
+        try:
+            old_key, includes = cache[filename]
+            if old_key == key:
+                return includes
+        except KeyError:
+            pass
+
+    includes = []
+    for (_, line) in lines_includes(filename):
+        t, name = extract_include(line, None)
+        if t is not None:
+            includes.append((t, name))
+
+    if cache is not None:
+        cache[filename] = (key, includes)
+    return includes
+
+def find_deps(node, cpppaths=["/usr/include", "."], cache=None):
+    """Return the list of headers included, directly or not, by the file
+    node, looking for them in cpppaths.
+
+    Headers included with quotes are also looked for in the directory of
+    the including file. Headers which cannot be found are ignored. cache
+    is passed to scan_includes."""
     nodes = []
-    names = []
-
-    def _find_deps(node):
-        lst = lines_includes(node)
-
-        for (_, line) in lst:
-            t, filename = extract_include(line, None)
-            if t is None:
-                continue
-            if filename in names:
-                continue
-
+    seen = set()
+    # (directory or None, filename) -> found path or None
+    resolved = {}
+
+    def _resolve(kind, dirname, filename):
+        if kind == '"':
+            k = (dirname, filename)
+            paths = [dirname] + cpppaths
+        else:
+            k = (None, filename)
+            paths = cpppaths
+        try:
+            return resolved[k]
+        except KeyError:
             found = None
-            for n in cpppaths:
-                if found:
+            for n in paths:
+                candidate = os.path.normpath(os.path.join(n, filename))
+                if os.path.exists(candidate):
+                    found = candidate
                     break
-                if os.path.exists(os.path.join(n, filename)):
-                    found = os.path.join(n, filename)
-                #else:
-                #    # XXX: most likely wrong
-                #    found = os.path.join(n, filename)
-                #    nodes.append(found)
-
-            if not found:
-                if not filename in names:
-                    names.append(filename)
-            elif not found in nodes:
+            resolved[k] = found
+            return found
+
+    def _find_deps(node):
+        dirname = os.path.dirname(node)
+        for (kind, filename) in scan_includes(node, cache):
+            found = _resolve(kind, dirname, filename)
+            if found is not None and not found in seen:
+                seen.add(found)
                 nodes.append(found)
                 _find_deps(found)
 
@@ -104,6 +144,14 @@ def find_program(program, path_list=None):
 
     return None
 
+def cpu_count():
+    """Return the number of CPUs, or 1 if it cannot be found."""
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
 if sys.version_info[0] < 3:
     from yaku._utils_py2 import join_bytes, function_code
     def is_string(s):
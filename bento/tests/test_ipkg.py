@@ -13,12 +13,15 @@ from bento.compat.api.moves \
 from bento.core.node \
     import \
         create_root_with_source_tree
+from bento.utils.utils \
+    import \
+        extract_exception
 from bento.testing.misc \
     import \
         create_simple_ipkg_args
 from bento.installed_package_description \
     import \
-        BuildManifest, InstalledSection, iter_files
+        BuildManifest, FileDigests, InstalledSection, iter_files
 
 class TestInstalledSection(unittest.TestCase):
     def test_simple(self):
@@ -68,6 +71,38 @@ class TestIPKG(unittest.TestCase):
         
         self.assertEqual(json.loads(r_s), json.loads(s))
 
+    def test_binary_roundtrip(self):
+        sections = {"datafiles": {"data": InstalledSection("datafiles", "data", "$_srcrootdir/data",
+                        "$sharedir/foo", [("a/b/c.dat", "a/b/c.dat"), ("a/d.dat", "e.dat"),
+                                          ("f.dat", "g/h.dat")])}}
+        sections.update(self.sections)
+        r_ipkg = BuildManifest(sections, self.meta, {})
+        filename = os.path.join(self.src_root, "build_manifest")
+        r_ipkg.write(filename)
+
+        ipkg = BuildManifest.from_file(filename)
+        self.assertEqual(ipkg.meta, r_ipkg.meta)
+        self.assertEqual(ipkg._path_variables, r_ipkg._path_variables)
+        for category in sections:
+            for name, section in sections[category].items():
+                self.assertEqual(ipkg.file_sections[category][name], section)
+                self.assertEqual(len(ipkg.file_sections[category][name].files),
+                                 len(section.files))
+
+        fid = open(filename, "rb")
+        try:
+            ipkg = BuildManifest.from_string(fid.read())
+        finally:
+            fid.close()
+        self.assertEqual(ipkg.file_sections["datafiles"]["data"], sections["datafiles"]["data"])
+
+        # json export
+        json_filename = os.path.join(self.src_root, "build_manifest.json")
+        ipkg.write_json(json_filename)
+        section = BuildManifest.from_file(json_filename).file_sections["datafiles"]["data"]
+        self.assertEqual([tuple(f) for f in section.files],
+                         list(sections["datafiles"]["data"].files))
+
 class TestIterFiles(unittest.TestCase):
     def setUp(self):
         self.src_root = tempfile.mkdtemp()
@@ -94,3 +129,116 @@ class TestIterFiles(unittest.TestCase):
                ("pythonfiles", os.path.join(self.top_node.abspath(), "source", "scripts", "foo.py"),
                                os.path.join(target_dir, "scripts", "foo.py"))]
         self.assertEqual(res, ref)
+
+    def test_iter_built_files(self):
+        ipkg = BuildManifest(self.sections, self.meta, {})
+        ref = [(kind, source.abspath(), target.abspath()) \
+               for kind, source, target in iter_files(ipkg.resolve_paths(self.top_node))]
+        res = [(kind, source.abspath(), target.abspath()) \
+               for kind, source, target in ipkg.iter_built_files(self.top_node)]
+        self.assertEqual(res, ref)
+
+    def _duplicate_sections(self, contents):
+        # Every file of contents is installed twice, from two directories
+        files = sorted(contents.keys())
+        for d in ["source1", "source2"]:
+            for f in files:
+                n = self.top_node.make_node(os.path.join(d, f))
+                n.parent.mkdir()
+                n.write(contents[f][d == "source2"])
+        sections = {}
+        for d in ["source1", "source2"]:
+            sections[d] = InstalledSection.from_source_target_directories("datafiles", d,
+                            os.path.join("$_srcrootdir", d), "$prefix/target", files)
+        return {"datafiles": sections}
+
+    def test_duplicates(self):
+        sections = self._duplicate_sections({"a.dat": ("same", "same"), "b.dat": ("bb", "bb")})
+        ipkg = BuildManifest(sections, self.meta, {})
+        res = sorted([target.path_from(self.top_node) for kind, source, target \
+                      in ipkg.iter_built_files(self.top_node, {"prefix": self.top_node.abspath()})])
+        self.assertEqual(res, [os.path.join("target", "a.dat"), os.path.join("target", "b.dat")])
+
+        # The digests are stored in the manifest
+        filename = os.path.join(self.src_root, "build_manifest")
+        ipkg.write(filename)
+        digests = BuildManifest.from_file(filename).file_digests.to_json_dict()
+        self.assertEqual(len(digests), 4)
+
+    def test_conflicts(self):
+        sections = self._duplicate_sections({"a.dat": ("a", "b"), "b.dat": ("same", "same"),
+                                             "c.dat": ("aaa", "bbb")})
+        ipkg = BuildManifest(sections, self.meta, {})
+        try:
+            list(ipkg.iter_built_files(self.top_node, {"prefix": self.top_node.abspath()}))
+            self.fail("conflicting sources not detected")
+        except IOError:
+            e = extract_exception()
+            # Every conflict is reported
+            self.assertTrue("a.dat" in str(e))
+            self.assertTrue("c.dat" in str(e))
+            self.assertFalse("b.dat" in str(e))
+
+    def test_source_over_build(self):
+        # A target installed from both the build directory and the source
+        # tree, with different contents: the source file is always installed,
+        # the build one only if it comes first
+        d = tempfile.mkdtemp()
+        try:
+            root = create_root_with_source_tree(d, os.path.join(d, "build"))
+            top_node = root.find_node(d)
+            for source_dir in ["build", "src"]:
+                n = top_node.make_node(os.path.join(source_dir, "a.dat"))
+                n.parent.mkdir()
+                n.write(source_dir)
+
+            sections = {}
+            for source_dir in ["build", "src"]:
+                sections[source_dir] = InstalledSection.from_source_target_directories(
+                    "datafiles", source_dir, os.path.join("$_srcrootdir", source_dir),
+                    "$prefix/target", ["a.dat"])
+            ipkg = BuildManifest({"datafiles": sections}, self.meta, {})
+            ipkg.update_paths({"prefix": d})
+
+            res = [source.path_from(top_node) for kind, source, target
+                   in ipkg.iter_built_files(top_node)]
+            ref = [source.path_from(top_node) for kind, source, target
+                   in iter_files(ipkg.resolve_paths(top_node))]
+            self.assertEqual(res, ref)
+            self.assertEqual(res[-1], os.path.join("src", "a.dat"))
+        finally:
+            shutil.rmtree(d)
+
+class TestFileDigests(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.files = []
+        for i, content in enumerate(["a", "b", "cc", "a"]):
+            filename = os.path.join(self.d, "file%d" % i)
+            fid = open(filename, "w")
+            try:
+                fid.write(content)
+            finally:
+                fid.close()
+            self.files.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.d)
+
+    def test_same_content(self):
+        digests = FileDigests()
+        f = self.files
+        self.assertTrue(digests.same_content(f[0], f[3]))
+        self.assertFalse(digests.same_content(f[0], f[1]))
+        # Different sizes: no digest needed
+        self.assertFalse(digests.same_content(f[1], f[2]))
+        self.assertEqual(sorted(digests.to_json_dict().keys()), [f[0], f[1], f[3]])
+
+    def test_stored(self):
+        f = self.files
+        entries = {f[0]: [1, os.stat(f[0]).st_mtime, "stored"],
+                   f[1]: [2, os.stat(f[1]).st_mtime, "stale"]}
+        digests = FileDigests(entries)
+        self.assertEqual(digests.digest(f[0]), "stored")
+        # Size changed: digest computed again
+        self.assertNotEqual(digests.digest(f[1]), "stale")
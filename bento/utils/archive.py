@@ -0,0 +1,305 @@
+"""Reproducible archive writers, compressing in parallel.
+
+Members are written in sorted order, with normalized metadata (mtime,
+owner, permissions), so that archives of unchanged trees are byte-identical.
+The mtime is taken from the SOURCE_DATE_EPOCH environment variable if
+defined.
+
+Compression is done by a pool of threads (zlib releases the GIL):
+    - tar.gz archives are compressed by independent blocks, pigz-like, in a
+      single gzip member readable by any gzip implementation
+    - zip archives are compressed member by member
+"""
+import os
+import sys
+import stat
+import time
+import struct
+import tarfile
+import zlib
+
+import bento.compat.api as compat
+
+from bento.utils.parallel \
+    import \
+        ThreadPool
+
+# 1980/01/01, the earliest date representable in zip archives
+DEFAULT_MTIME = 315532800
+
+BLOCK_SIZE = 256 * 1024
+
+# zlib supports preset dictionaries from python 3.3
+_HAS_ZDICT = sys.version_info >= (3, 3)
+
+_DICT_SIZE = 32 * 1024
+
+def archive_mtime():
+    """Return the mtime to use for every archive member."""
+    try:
+        return int(os.environ["SOURCE_DATE_EPOCH"])
+    except (KeyError, ValueError):
+        return DEFAULT_MTIME
+
+def _normalized_mode(filename):
+    if os.stat(filename).st_mode & stat.S_IXUSR:
+        return int("755", 8)
+    else:
+        return int("644", 8)
+
+def _deflate_block(block, zdict, level, last):
+    if zdict:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL,
+                             zlib.Z_DEFAULT_STRATEGY, zdict)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = c.compress(block)
+    if last:
+        return data + c.flush(zlib.Z_FINISH)
+    else:
+        # Byte-align the block without ending the deflate stream, so that
+        # compressed blocks can be concatenated
+        return data + c.flush(zlib.Z_SYNC_FLUSH)
+
+class ParallelGzipFile(object):
+    """Write-only, gzip file object compressing blocks of data in parallel.
+
+    The output only depends on the data, mtime and compression level, not on
+    the number of threads."""
+    def __init__(self, fileobj, mtime=0, compresslevel=9, jobs=None, block_size=BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+
+        self._pool = ThreadPool(jobs)
+        self._pending = []
+        self._buffer = []
+        self._buffered = 0
+        self._previous = None
+        self._crc = zlib.crc32("".encode("ascii")) & 0xffffffff
+        self._size = 0
+
+        if compresslevel == 9:
+            xfl = 2
+        elif compresslevel == 1:
+            xfl = 4
+        else:
+            xfl = 0
+        # magic, deflate, no flags, mtime, extra flags, unknown OS
+        self.fileobj.write(struct.pack("<BBBBIBB", 0x1f, 0x8b, 8, 0, mtime, xfl, 255))
+
+    def tell(self):
+        return self._size
+
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc) & 0xffffffff
+        self._size += len(data)
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.block_size:
+            data = "".encode("ascii").join(self._buffer)
+            n = len(data) - len(data) % self.block_size
+            for i in range(0, n, self.block_size):
+                self._submit(data[i:i+self.block_size], False)
+            self._buffer = [data[n:]]
+            self._buffered = len(data) - n
+
+    def _submit(self, block, last):
+        if _HAS_ZDICT and self._previous is not None:
+            zdict = self._previous[-_DICT_SIZE:]
+        else:
+            zdict = None
+        self._previous = block
+        self._pending.append(self._pool.submit(_deflate_block, block, zdict, self.compresslevel, last))
+        if len(self._pending) >= 2 * self._pool.jobs:
+            self.fileobj.write(self._pending.pop(0).get())
+
+    def close(self):
+        if self._pool is None:
+            return
+        try:
+            self._submit("".encode("ascii").join(self._buffer), True)
+            for job in self._pending:
+                self.fileobj.write(job.get())
+            self.fileobj.write(struct.pack("<II", self._crc, self._size & 0xffffffff))
+        finally:
+            self._pool.close()
+            self._pool = None
+
+def write_tarball(archive_name, files, jobs=None, mtime=None):
+    """Write a gzip-compressed tarball.
+
+    Parameters
+    ----------
+    archive_name: str
+        path of the archive to create
+    files: seq
+        list of (filename, archive path) pairs
+    """
+    if mtime is None:
+        mtime = archive_mtime()
+    fid = open(archive_name, "wb")
+    try:
+        gzip_file = ParallelGzipFile(fid, mtime, jobs=jobs)
+        try:
+            tf = tarfile.open(fileobj=gzip_file, mode="w", format=tarfile.GNU_FORMAT)
+            try:
+                for filename, alias in sorted(files, key=lambda f: f[1]):
+                    info = tarfile.TarInfo(alias.replace(os.sep, "/"))
+                    info.size = os.stat(filename).st_size
+                    info.mtime = mtime
+                    info.mode = _normalized_mode(filename)
+                    member = open(filename, "rb")
+                    try:
+                        tf.addfile(info, member)
+                    finally:
+                        member.close()
+            finally:
+                tf.close()
+        finally:
+            gzip_file.close()
+    finally:
+        fid.close()
+
+# Above those limits, zip64 extensions are needed
+_ZIP_MAX_SIZE = 0x7fffffff
+_ZIP_MAX_ENTRIES = 0xffff
+
+def _dos_date_time(date_time):
+    dos_date = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    dos_time = date_time[3] << 11 | date_time[4] << 5 | (date_time[5] // 2)
+    return dos_date, dos_time
+
+def deflate(data, crc=None):
+    """Return (crc32, size, raw deflate-compressed data) for data. The crc32
+    is only computed if not given."""
+    c = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = c.compress(data) + c.flush()
+    if crc is None:
+        crc = zlib.crc32(data) & 0xffffffff
+    return crc, len(data), compressed
+
+def _compress_member(filename):
+    fid = open(filename, "rb")
+    try:
+        return deflate(fid.read())
+    finally:
+        fid.close()
+
+class ZipWriter(object):
+    """Low-level writer of zip archives, whose members are given already
+    compressed. zip64 extensions are not supported."""
+    def __init__(self, fid):
+        self.fid = fid
+        self._directory = []
+        self._offset = 0
+
+    def add(self, name, crc, size, compressed, date_time, external_attr,
+            compress_type=zlib.DEFLATED):
+        """Add a member.
+
+        Parameters
+        ----------
+        name: str
+            name of the member in the archive
+        crc: int
+            crc32 of the uncompressed data
+        size: int
+            size of the uncompressed data
+        compressed: bytes
+            compressed data
+        date_time: tuple
+            (year, month, day, hour, min, sec) modification time
+        external_attr: int
+            external attributes (unix permissions << 16)
+        """
+        name = name.replace(os.sep, "/")
+        if not isinstance(name, bytes):
+            name = name.encode("utf-8")
+        try:
+            name.decode("ascii")
+            flags = 0
+        except UnicodeDecodeError:
+            flags = 0x800
+        dos_date, dos_time = _dos_date_time(date_time)
+        if self._offset > _ZIP_MAX_SIZE or len(self._directory) >= _ZIP_MAX_ENTRIES:
+            raise ValueError("Archive too large (zip64 not supported)")
+
+        header = struct.pack("<IHHHHHIIIHH", 0x04034b50, 20, flags, compress_type,
+                             dos_time, dos_date, crc, len(compressed), size, len(name), 0)
+        self.fid.write(header)
+        self.fid.write(name)
+        self.fid.write(compressed)
+
+        self._directory.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50,
+                                           3 << 8 | 20, 20, flags, compress_type,
+                                           dos_time, dos_date, crc, len(compressed), size,
+                                           len(name), 0, 0, 0, 0, external_attr,
+                                           self._offset) + name)
+        self._offset += len(header) + len(name) + len(compressed)
+
+    def close(self):
+        directory = "".encode("ascii").join(self._directory)
+        self.fid.write(directory)
+        self.fid.write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, len(self._directory),
+                                   len(self._directory), len(directory), self._offset, 0))
+
+def read_raw_member(fid, info):
+    """Return the compressed data of the member info (a ZipInfo instance) of
+    the zip file opened as fid."""
+    fid.seek(info.header_offset)
+    header = fid.read(30)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    fid.seek(info.header_offset + 30 + name_length + extra_length)
+    return fid.read(info.compress_size)
+
+def write_zip(archive_name, files, jobs=None, mtime=None):
+    """Write a deflate-compressed zip archive.
+
+    Parameters
+    ----------
+    archive_name: str
+        path of the archive to create
+    files: seq
+        list of (filename, archive path) pairs
+    """
+    if mtime is None:
+        mtime = archive_mtime()
+    files = sorted(files, key=lambda f: f[1])
+    total_size = sum([os.stat(filename).st_size for filename, alias in files])
+    if total_size > _ZIP_MAX_SIZE or len(files) > _ZIP_MAX_ENTRIES:
+        _write_zip64(archive_name, files, mtime)
+        return
+
+    date_time = time.gmtime(max(mtime, DEFAULT_MTIME))[:6]
+    pool = ThreadPool(jobs)
+    try:
+        fid = open(archive_name, "wb")
+        try:
+            writer = ZipWriter(fid)
+            members = pool.imap(_compress_member, [filename for filename, alias in files])
+            for (filename, alias), (crc, size, compressed) in zip(files, members):
+                external_attr = (stat.S_IFREG | _normalized_mode(filename)) << 16
+                writer.add(alias, crc, size, compressed, date_time, external_attr)
+            writer.close()
+        finally:
+            fid.close()
+    finally:
+        pool.close()
+
+def _write_zip64(archive_name, files, mtime):
+    # Serial fallback for very large archives, through zipfile
+    date_time = time.gmtime(max(mtime, DEFAULT_MTIME))[:6]
+    zid = compat.ZipFile(archive_name, "w", compat.ZIP_DEFLATED, True)
+    try:
+        for filename, alias in files:
+            info = compat.ZipInfo(alias.replace(os.sep, "/"), date_time)
+            info.compress_type = compat.ZIP_DEFLATED
+            info.external_attr = (stat.S_IFREG | _normalized_mode(filename)) << 16
+            fid = open(filename, "rb")
+            try:
+                zid.writestr(info, fid.read())
+            finally:
+                fid.close()
+    finally:
+        zid.close()
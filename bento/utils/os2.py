@@ -1,3 +1,5 @@
+import os
+import sys
 import errno
 import shutil
 
@@ -18,3 +20,57 @@ def rename(source, target):
         else:
             raise
 
+
+# errnos for which in-kernel copies are not supported for the given files
+_NO_KERNEL_COPY_ERRNOS = set([errno.EINVAL, errno.ENOSYS, errno.EXDEV,
+                              errno.EBADF, getattr(errno, "ENOTSUP", errno.EINVAL),
+                              getattr(errno, "EOPNOTSUPP", errno.EINVAL),
+                              getattr(errno, "ENOTSOCK", errno.EINVAL)])
+
+def _kernel_copy(fsrc, fdst, size):
+    copy_file_range = getattr(os, "copy_file_range", None)
+    # Outside linux (e.g. macOS, FreeBSD), sendfile only writes to sockets
+    if sys.platform.startswith("linux"):
+        sendfile = getattr(os, "sendfile", None)
+    else:
+        sendfile = None
+    if copy_file_range is None and sendfile is None:
+        return False
+
+    infd, outfd = fsrc.fileno(), fdst.fileno()
+    offset = 0
+    try:
+        while offset < size:
+            if copy_file_range is not None:
+                n = copy_file_range(infd, outfd, size - offset)
+            else:
+                n = sendfile(outfd, infd, offset, size - offset)
+            if n == 0:
+                break
+            offset += n
+    except OSError:
+        e = extract_exception()
+        if e.errno in _NO_KERNEL_COPY_ERRNOS:
+            return False
+        raise
+    return True
+
+def copyfile(source, target):
+    """Copy the content of source into target.
+
+    The copy is done by the kernel (copy_file_range or sendfile) when
+    possible, avoiding to go through python buffers."""
+    fsrc = open(source, "rb")
+    try:
+        fdst = open(target, "wb")
+        try:
+            size = os.fstat(fsrc.fileno()).st_size
+            if not _kernel_copy(fsrc, fdst, size):
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst)
+        finally:
+            fdst.close()
+    finally:
+        fsrc.close()
@@ -0,0 +1,110 @@
+"""Minimal thread pool, usable on every python version supported by bento,
+and a map over a pool of processes.
+
+Threads are only useful for work which releases the GIL (I/O, zlib
+compression, etc...). Processes are needed for pure python work, like
+byte-compilation."""
+import sys
+import threading
+import collections
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+from six.moves \
+    import \
+        queue
+
+from bento.utils.utils \
+    import \
+        cpu_count
+
+class _Job(object):
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+
+    def run(self):
+        try:
+            self._result = self.func(*self.args)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        self._done.set()
+
+    def get(self):
+        """Wait for the job to finish, and return its result. Exceptions
+        raised by the job are raised again here."""
+        self._done.wait()
+        if self._exc_info is not None:
+            exc_info, self._exc_info = self._exc_info, None
+            raise exc_info[1]
+        return self._result
+
+class ThreadPool(object):
+    def __init__(self, jobs=None):
+        if jobs is None:
+            jobs = cpu_count()
+        self.jobs = max(jobs, 1)
+        self._queue = queue.Queue()
+        self._threads = []
+        for i in range(self.jobs):
+            t = threading.Thread(target=self._worker)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.run()
+
+    def submit(self, func, *args):
+        """Schedule func(*args), and return a job whose get method returns
+        the result."""
+        job = _Job(func, args)
+        self._queue.put(job)
+        return job
+
+    def imap(self, func, iterable):
+        """Like itertools.imap, but func is run in the pool. Results are
+        returned in order, and at most twice as many items as there are
+        threads are scheduled in advance."""
+        pending = collections.deque()
+        for item in iterable:
+            pending.append(self.submit(func, item))
+            if len(pending) >= 2 * self.jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def close(self):
+        for t in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+def process_map(func, items, jobs=None):
+    """Return [func(item) for item in items], computed in a pool of processes
+    if possible (multiprocessing available, and more than one job and item).
+
+    func and items must be picklable (func being a module-level function)."""
+    items = list(items)
+    if jobs is None:
+        jobs = cpu_count()
+    jobs = min(jobs, len(items))
+    if multiprocessing is None or jobs < 2:
+        return [func(item) for item in items]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,105 @@
+import os
+import gzip
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+import os.path as op
+
+from bento.compat.api.moves \
+    import \
+        unittest
+
+from bento.utils.archive \
+    import \
+        ParallelGzipFile, write_tarball, write_zip
+
+def _read(filename):
+    fid = open(filename, "rb")
+    try:
+        return fid.read()
+    finally:
+        fid.close()
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.files = []
+        for i in range(10):
+            filename = op.join(self.d, "file%d.txt" % i)
+            fid = open(filename, "wb")
+            try:
+                fid.write(("line %d\n" % i).encode("ascii") * (i * 1000))
+            finally:
+                fid.close()
+            self.files.append((filename, op.join("foo-1.0", "file%d.txt" % i)))
+        os.chmod(self.files[0][0], int("755", 8))
+
+    def tearDown(self):
+        shutil.rmtree(self.d)
+
+    def test_gzip(self):
+        data = "".join(["line %d\n" % (i * i % 1013) for i in range(50000)]).encode("ascii")
+        outputs = []
+        for jobs in [1, 4]:
+            filename = op.join(self.d, "out%d.gz" % jobs)
+            fid = open(filename, "wb")
+            try:
+                gzip_file = ParallelGzipFile(fid, jobs=jobs, block_size=4096)
+                for i in range(0, len(data), 1000):
+                    gzip_file.write(data[i:i+1000])
+                gzip_file.close()
+            finally:
+                fid.close()
+
+            fid = gzip.open(filename, "rb")
+            try:
+                self.assertEqual(fid.read(), data)
+            finally:
+                fid.close()
+            outputs.append(_read(filename))
+        # The output should not depend on the number of threads
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_tarball(self):
+        archive = op.join(self.d, "foo.tar.gz")
+        write_tarball(archive, self.files[::-1], jobs=4)
+
+        tf = tarfile.open(archive, "r:gz")
+        try:
+            members = tf.getmembers()
+            self.assertEqual([m.name for m in members], sorted([alias for f, alias in self.files]))
+            for (filename, alias), member in zip(self.files, members):
+                self.assertEqual(tf.extractfile(member).read(), _read(filename))
+                self.assertEqual(member.uid, 0)
+            self.assertEqual(members[0].mode, int("755", 8))
+            self.assertEqual(members[1].mode, int("644", 8))
+        finally:
+            tf.close()
+
+    def test_zip(self):
+        archive = op.join(self.d, "foo.zip")
+        write_zip(archive, self.files[::-1], jobs=4)
+
+        zid = zipfile.ZipFile(archive)
+        try:
+            self.assertEqual(zid.testzip(), None)
+            self.assertEqual(zid.namelist(), sorted([alias for f, alias in self.files]))
+            for filename, alias in self.files:
+                self.assertEqual(zid.read(alias), _read(filename))
+            self.assertEqual(zid.getinfo(self.files[0][1]).external_attr >> 16 & int("777", 8),
+                             int("755", 8))
+        finally:
+            zid.close()
+
+    def test_reproducible(self):
+        for writer, name in [(write_tarball, "foo.tar.gz"), (write_zip, "foo.zip")]:
+            archive = op.join(self.d, name)
+            writer(archive, self.files, jobs=2)
+            content = _read(archive)
+
+            for filename, alias in self.files:
+                os.utime(filename, (1000000000, 1000000000))
+            writer(archive, self.files, jobs=3)
+            self.assertEqual(_read(archive), content)
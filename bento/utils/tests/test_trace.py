@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from bento.compat.api \
+    import \
+        json
+from bento.compat.api.moves \
+    import \
+        unittest
+
+from bento.utils.trace \
+    import \
+        Tracer
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+
+    def test_span(self):
+        self.assertEqual(self.tracer.span("sum", "task", sum, [1, 2]), 3)
+        self.assertRaises(ValueError, self.tracer.span, "int", "task", int, "a")
+
+        events = self.tracer.trace_events()
+        self.assertEqual([(e["name"], e["cat"], e["ph"]) for e in events],
+                         [("sum", "task", "X"), ("int", "task", "X")])
+        self.assertTrue(events[0]["ts"] >= 0 and events[0]["dur"] >= 0)
+
+    def test_threads(self):
+        def _f():
+            start = self.tracer.now()
+            self.tracer.add_span("thread", "task", start, start + 1)
+        t = threading.Thread(target=_f)
+        t.start()
+        t.join()
+        _f()
+
+        tids = set([e["tid"] for e in self.tracer.trace_events()])
+        self.assertEqual(len(tids), 2)
+
+    def test_summary(self):
+        start = self.tracer.now()
+        self.tracer.add_span("slow", "task", start, start + 2)
+        self.tracer.add_span("fast", "task", start, start + 1)
+        self.tracer.add_span("gcc", "subprocess", start, start + 0.5)
+        self.tracer.add_instant("object cache hit", "cache")
+        self.tracer.add_instant("object cache hit", "cache")
+
+        lines = self.tracer.summary(2).splitlines()
+        self.assertEqual(lines[1].split(), ["task", "2", "3.000"])
+        self.assertEqual(lines[2].split(), ["subprocess", "1", "0.500"])
+        self.assertEqual(lines[3].split(), ["cache", "(object", "cache", "hit)", "2"])
+        self.assertEqual([l.split()[:2] for l in lines[-2:]], [["task:", "slow"], ["task:", "fast"]])
+
+    def test_write(self):
+        self.tracer.span("sum", "task", sum, [1, 2])
+        self.tracer.add_instant("object cache hit", "cache", {"task": "foo"})
+
+        d = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(d, "trace.json")
+            self.tracer.write(filename)
+            fid = open(filename)
+            try:
+                data = json.load(fid)
+            finally:
+                fid.close()
+        finally:
+            shutil.rmtree(d)
+        self.assertEqual([e["ph"] for e in data["traceEvents"]], ["X", "i"])
+        self.assertEqual(data["traceEvents"][1]["args"], {"task": "foo"})
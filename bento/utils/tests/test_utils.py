@@ -28,7 +28,7 @@ from bento.utils.io2 \
         safe_write
 from bento.utils.os2 \
     import \
-        rename
+        rename, copyfile
 import bento.utils.path
 
 def raise_oserror(err):
@@ -155,6 +155,36 @@ class TestMisc(unittest.TestCase):
     def test_rename_failure(self):
         self.assertRaises(OSError, self._test_rename)
 
+    def _test_copyfile(self):
+        d = tempfile.mkdtemp()
+        try:
+            f = op.join(d, "f.bin")
+            fid = open(f, "wb")
+            try:
+                fid.write("".join(["line %d\n" % i for i in range(10000)]).encode("ascii"))
+            finally:
+                fid.close()
+            g = op.join(d, "g.bin")
+            copyfile(f, g)
+            self.assertTrue(same_content(f, g))
+        finally:
+            shutil.rmtree(d)
+
+    def test_copyfile(self):
+        self._test_copyfile()
+
+    @mock.patch("os.copy_file_range", lambda *a: raise_oserror(errno.ENOTSOCK), create=True)
+    @mock.patch("os.sendfile", lambda *a: raise_oserror(errno.ENOTSOCK), create=True)
+    def test_copyfile_fallback(self):
+        self._test_copyfile()
+
+    @mock.patch("os.copy_file_range", None, create=True)
+    @mock.patch("os.sendfile", lambda *a: raise_oserror(errno.EIO), create=True)
+    @mock.patch("sys.platform", "darwin")
+    def test_copyfile_no_sendfile(self):
+        # sendfile only supports sockets outside linux, and must not be used
+        self._test_copyfile()
+
 class TestMemoize(unittest.TestCase):
     def test_simple_no_arguments(self):
         lst = []
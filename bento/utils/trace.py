@@ -0,0 +1,99 @@
+"""Build tracing: time spans of commands, hooks and build tasks.
+
+Spans are exported in the Chrome trace-event format (to be loaded in
+chrome://tracing or https://ui.perfetto.dev), and summarized as text.
+
+A tracer is also handed to yaku contexts (as ctx.tracer), which only use its
+now, add_span and add_instant methods."""
+import os
+import time
+import threading
+
+from bento.compat.api \
+    import \
+        json
+
+class Tracer(object):
+    def __init__(self):
+        self.pid = os.getpid()
+        self._origin = time.time()
+        self._spans = []
+        self._instants = []
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.time()
+
+    def _add(self, events, event):
+        self._lock.acquire()
+        try:
+            events.append(event)
+        finally:
+            self._lock.release()
+
+    def add_span(self, name, category, start, end, args=None):
+        """Record a span of the current thread, start and end being given by
+        now."""
+        self._add(self._spans, (name, category, start, end, threading.current_thread().ident,
+                                args or {}))
+
+    def add_instant(self, name, category, args=None):
+        """Record an event without duration (e.g. a cache hit)."""
+        self._add(self._instants, (name, category, self.now(), threading.current_thread().ident,
+                                   args or {}))
+
+    def span(self, name, category, func, *a, **kw):
+        """Call func(*a, **kw) within a span, and return its result."""
+        start = self.now()
+        try:
+            return func(*a, **kw)
+        finally:
+            self.add_span(name, category, start, self.now())
+
+    def trace_events(self):
+        """Return the recorded events, in the Chrome trace-event format."""
+        def _us(t):
+            return int((t - self._origin) * 1e6)
+        events = []
+        for name, category, start, end, tid, args in self._spans:
+            events.append({"name": name, "cat": category, "ph": "X", "ts": _us(start),
+                           "dur": _us(end) - _us(start), "pid": self.pid, "tid": tid,
+                           "args": args})
+        for name, category, t, tid, args in self._instants:
+            events.append({"name": name, "cat": category, "ph": "i", "s": "t", "ts": _us(t),
+                           "pid": self.pid, "tid": tid, "args": args})
+        events.sort(key=lambda e: e["ts"])
+        return events
+
+    def write(self, filename):
+        fid = open(filename, "w")
+        try:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, fid)
+        finally:
+            fid.close()
+
+    def summary(self, n=10):
+        """Return a text summary: the total time spent per category, and the
+        n slowest spans."""
+        totals = {}
+        counts = {}
+        for name, category, start, end, tid, args in self._spans:
+            totals[category] = totals.get(category, 0) + end - start
+            counts[category] = counts.get(category, 0) + 1
+        instants = {}
+        for name, category, t, tid, args in self._instants:
+            key = (category, name)
+            instants[key] = instants.get(key, 0) + 1
+
+        lines = ["%-60s %8s %10s" % ("category", "count", "total (s)")]
+        for category in sorted(totals, key=lambda c: -totals[c]):
+            lines.append("%-60s %8d %10.3f" % (category, counts[category], totals[category]))
+        for category, name in sorted(instants):
+            lines.append("%-60s %8d" % ("%s (%s)" % (category, name), instants[(category, name)]))
+
+        lines.append("")
+        lines.append("%-60s %8s %10s" % ("%d slowest" % n, "", "time (s)"))
+        spans = sorted(self._spans, key=lambda s: s[2] - s[3])[:n]
+        for name, category, start, end, tid, args in spans:
+            lines.append("%-60s %8s %10.3f" % (("%s: %s" % (category, name))[:60], "", end - start))
+        return "\n".join(lines)
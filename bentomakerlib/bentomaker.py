@@ -19,27 +19,9 @@ from bento.core \
         PackageDescription
 from bento.compat.api \
     import \
-        defaultdict, input
+        input
 import bento.core.node
 
-from bento.commands.build \
-    import \
-        BuildCommand
-from bento.commands.build_egg \
-    import \
-        BuildEggCommand
-from bento.commands.build_pkg_info \
-    import \
-        BuildPkgInfoCommand
-from bento.commands.build_wininst \
-    import \
-        BuildWininstCommand
-from bento.commands.configure \
-    import \
-        ConfigureCommand
-from bento.commands.core \
-    import \
-        HelpCommand
 from bento.commands.dependency \
     import \
         CommandScheduler
@@ -47,27 +29,9 @@ from bento.commands.hooks \
     import \
         find_pre_hooks, find_post_hooks, find_startup_hooks, \
         find_shutdown_hooks, find_options_hooks, find_command_hooks
-from bento.commands.install \
-    import \
-        InstallCommand
-from bento.commands.parse \
-    import \
-        ParseCommand
-from bento.commands.register \
-    import \
-        RegisterPyPI
 from bento.commands.registries \
     import \
         CommandRegistry, ContextRegistry, OptionsRegistry
-from bento.commands.sdist \
-    import \
-        SdistCommand
-from bento.commands.sphinx_command \
-    import \
-        SphinxCommand
-from bento.commands.upload \
-    import \
-        UploadPyPI
 from bento.commands.options \
     import \
         OptionsContext, Option
@@ -75,21 +39,12 @@ from bento.commands.options \
 from bento.backends.utils \
     import \
         load_backend
-from bento.backends.yaku_backend \
-    import \
-        BuildYakuContext, ConfigureYakuContext
-from bento.commands.command_contexts \
-    import \
-        HelpContext, SdistContext, ContextWithBuildDirectory
 from bento.commands.wrapper_utils \
     import \
         set_main, run_with_dependencies
 from bento.commands.contexts \
     import \
         GlobalContext
-from bento.convert \
-    import \
-        ConvertCommand, DetectTypeCommand
 import bento.errors
 
 from bentomakerlib.package_cache \
@@ -111,7 +66,8 @@ CMD_DATA_DUMP = os.path.join(_SUB_BUILD_DIR, "cmd_data.db")
 
 class GlobalOptions(object):
     def __init__(self, cmd_name, cmd_argv, show_usage, build_directory,
-            bento_info, show_version, show_full_version, disable_autoconfigure):
+            bento_info, show_version, show_full_version, disable_autoconfigure,
+            trace=None, trace_top=10):
         self.cmd_name = cmd_name
         self.cmd_argv = cmd_argv
         self.show_usage = show_usage
@@ -120,47 +76,64 @@ class GlobalOptions(object):
         self.show_version = show_version
         self.show_full_version = show_full_version
         self.disable_autoconfigure = disable_autoconfigure
+        self.trace = trace
+        self.trace_top = trace_top
 
 #================================
 #   Create the command line UI
 #================================
+# Commands and contexts are registered by module and class names, so that
+# only the modules of the commands actually run are imported
+_COMMANDS = [
+    # (command name, module, class, public)
+    ("help", "bento.commands.core", "HelpCommand", True),
+    ("configure", "bento.commands.configure", "ConfigureCommand", True),
+    ("build", "bento.commands.build", "BuildCommand", True),
+    ("install", "bento.commands.install", "InstallCommand", True),
+    ("convert", "bento.convert", "ConvertCommand", True),
+    ("sdist", "bento.commands.sdist", "SdistCommand", True),
+    ("build_egg", "bento.commands.build_egg", "BuildEggCommand", True),
+    ("build_wininst", "bento.commands.build_wininst", "BuildWininstCommand", True),
+    ("sphinx", "bento.commands.sphinx_command", "SphinxCommand", True),
+    ("register_pypi", "bento.commands.register", "RegisterPyPI", True),
+    ("upload_pypi", "bento.commands.upload", "UploadPyPI", True),
+    ("build_pkg_info", "bento.commands.build_pkg_info", "BuildPkgInfoCommand", False),
+    ("parse", "bento.commands.parse", "ParseCommand", False),
+    ("detect_type", "bento.convert", "DetectTypeCommand", False),
+]
+
+_COMMAND_CONTEXTS = {
+    "configure": ("bento.backends.yaku_backend", "ConfigureYakuContext"),
+    "build": ("bento.backends.yaku_backend", "BuildYakuContext"),
+    "sdist": ("bento.commands.command_contexts", "SdistContext"),
+    "help": ("bento.commands.command_contexts", "HelpContext"),
+}
+_DEFAULT_COMMAND_CONTEXT = ("bento.commands.command_contexts", "ContextWithBuildDirectory")
+
 def register_commands(global_context):
-    global_context.register_command("help", HelpCommand())
-    global_context.register_command("configure", ConfigureCommand())
-    global_context.register_command("build", BuildCommand())
-    global_context.register_command("install", InstallCommand())
-    global_context.register_command("convert", ConvertCommand())
-    global_context.register_command("sdist", SdistCommand())
-    global_context.register_command("build_egg", BuildEggCommand())
-    global_context.register_command("build_wininst", BuildWininstCommand())
-    global_context.register_command("sphinx", SphinxCommand())
-    global_context.register_command("register_pypi", RegisterPyPI())
-    global_context.register_command("upload_pypi", UploadPyPI())
-
-    global_context.register_command("build_pkg_info", BuildPkgInfoCommand(), public=False)
-    global_context.register_command("parse", ParseCommand(), public=False)
-    global_context.register_command("detect_type", DetectTypeCommand(), public=False)
- 
+    for cmd_name, module_name, klass_name, public in _COMMANDS:
+        global_context.register_command_lazy(cmd_name, module_name, klass_name, public)
+
     if sys.platform == "darwin":
-        import bento.commands.build_mpkg
-        global_context.register_command("build_mpkg",
-            bento.commands.build_mpkg.BuildMpkgCommand(), public=False)
+        global_context.register_command_lazy("build_mpkg",
+            "bento.commands.build_mpkg", "BuildMpkgCommand", public=False)
         global_context.set_before("build_mpkg", "build")
 
     if sys.platform == "win32":
-        from bento.commands.build_msi \
-            import \
-                BuildMsiCommand
-        global_context.register_command("build_msi", BuildMsiCommand())
+        global_context.register_command_lazy("build_msi",
+            "bento.commands.build_msi", "BuildMsiCommand")
         global_context.set_before("build_msi", "build")
 
 def register_options(global_context, cmd_name):
-    """Register options for the given command."""
-    cmd = global_context.retrieve_command(cmd_name)
-    context = OptionsContext.from_command(cmd)
+    """Register options for the given command.
+
+    The options context is only created when first retrieved."""
+    def _create_options_context():
+        cmd = global_context.retrieve_command(cmd_name)
+        return OptionsContext.from_command(cmd)
 
     if not global_context.is_options_context_registered(cmd_name):
-        global_context.register_options_context(cmd_name, context)
+        global_context.register_options_context_lazy(cmd_name, _create_options_context)
 
 def register_options_special(global_context):
     # Register options for special topics not attached to a "real" command
@@ -180,21 +153,10 @@ def register_options_special(global_context):
     global_context.register_options_context_without_command("globals", context)
 
 def register_command_contexts(global_context):
-   # global_context.register_default_context(CmdContext)
-    default_mapping = defaultdict(lambda: ContextWithBuildDirectory)
-    default_mapping.update(dict([
-            ("configure", ConfigureYakuContext),
-            ("build", BuildYakuContext),
-            ("build_egg", ContextWithBuildDirectory),
-            ("build_wininst", ContextWithBuildDirectory),
-            ("build_mpkg", ContextWithBuildDirectory),
-            ("install", ContextWithBuildDirectory),
-            ("sdist", SdistContext),
-            ("help", HelpContext)]))
-
     for cmd_name in global_context.command_names(public_only=False):
         if not global_context.is_command_context_registered(cmd_name):
-            global_context.register_command_context(cmd_name, default_mapping[cmd_name])
+            module_name, klass_name = _COMMAND_CONTEXTS.get(cmd_name, _DEFAULT_COMMAND_CONTEXT)
+            global_context.register_command_context_lazy(cmd_name, module_name, klass_name)
 
 # All the global state/registration stuff goes here
 def register_stuff(global_context):
@@ -240,21 +202,39 @@ def main(argv=None):
                                    OptionsRegistry(), CommandScheduler())
     global_context.register_options_context_without_command("", options_context)
 
-    if not popts.disable_autoconfigure:
-        global_context.set_before("build", "configure")
-    global_context.set_before("build_egg", "build")
-    global_context.set_before("build_wininst", "build")
-    global_context.set_before("install", "build")
-
-    if cmd_name and cmd_name not in ["convert"]:
-        return _wrapped_main(global_context, popts, run_node, top_node, build_node)
-    else:
-        # XXX: is cached package necessary here ?
-        cached_package = None
-        register_stuff(global_context)
-        for cmd_name in global_context.command_names():
-            register_options(global_context, cmd_name)
-        return _main(global_context, cached_package, popts, run_node, top_node, build_node)
+    if popts.trace:
+        from bento.utils.trace import Tracer
+        global_context.tracer = Tracer()
+    try:
+        if not popts.disable_autoconfigure:
+            global_context.set_before("build", "configure")
+        global_context.set_before("build_egg", "build")
+        global_context.set_before("build_wininst", "build")
+        global_context.set_before("install", "build")
+
+        if cmd_name and cmd_name not in ["convert"]:
+            return _wrapped_main(global_context, popts, run_node, top_node, build_node)
+        else:
+            # XXX: is cached package necessary here ?
+            cached_package = None
+            register_stuff(global_context)
+            for cmd_name in global_context.command_names():
+                register_options(global_context, cmd_name)
+            return _main(global_context, cached_package, popts, run_node, top_node, build_node)
+    finally:
+        if global_context.tracer is not None:
+            # Do not hide the command exception, if any, behind a failure to
+            # write the trace
+            try:
+                _write_trace(global_context.tracer, popts)
+            except Exception:
+                e = extract_exception()
+                pprint('RED', "Could not write trace in %s: %s" % (popts.trace, e))
+
+def _write_trace(tracer, popts):
+    tracer.write(popts.trace)
+    print(tracer.summary(popts.trace_top))
+    print("Trace written in %s (chrome trace-event format)" % popts.trace)
 
 def _wrapped_main(global_context, popts, run_node, top_node, build_node):
     # Some commands work without a bento description file (convert, help)
@@ -343,11 +323,22 @@ def create_global_options_context():
                               help="""\
 Do not automatically run configure before build. In this mode, the user is
 expected to know what he is doing. This is mainly useful for developers, to
-avoid running configure everytime (default: '%default')."""))
+avoid running configure everytime. Without this option, configure is still
+skipped when none of its inputs (arguments, bento.info and hook files, python,
+compilers and their environment variables) changed since its last successful
+run (default: '%default')."""))
+    context.add_option(Option("--trace", dest="trace",
+                              help="Record the time spent in commands, hooks, build tasks and "
+                                   "subprocesses, and write it in the given file, in the chrome "
+                                   "trace-event format (to load in chrome://tracing)"))
+    context.add_option(Option("--trace-top", dest="trace_top", type="int",
+                              help="Number of slowest items listed in the trace summary "
+                                   "(default: %default)"))
     context.add_option(Option("-h", "--help", dest="show_help", action="store_true",
                               help="Display help and exit"))
     context.parser.set_defaults(show_version=False, show_full_version=False, show_help=False,
-                                build_directory="build", bento_info="bento.info")
+                                build_directory="build", bento_info="bento.info",
+                                trace=None, trace_top=10)
     return context
 
 def parse_global_options(context, argv):
@@ -378,7 +369,7 @@ def parse_global_options(context, argv):
 
     global_options = GlobalOptions(cmd_name, cmd_argv, show_usage,
             build_directory, bento_info, show_version, show_full_version,
-            o.disable_autoconfigure)
+            o.disable_autoconfigure, o.trace, o.trace_top)
     return global_options
 
 def _main(global_context, cached_package, popts, run_node, top_node, build_node):
@@ -1,14 +1,18 @@
 """
-Cache version 1
+Cache version 3
 
 db["version"] : version number
 db["magic"]   : "BENTOMAGIC"
-db["bento_checkums"] : pickled dictionary {filename: checksum(filename)} for
-                       each bento.info (including subentos)
-db["package_description"] : pickled PackageDescription instance
-db["user_flags"] : pickled user_flags dict
+db["bentos_checksums"] : pickled dictionary {filename: (stat_key, checksum)}
+                         for each bento.info (including subentos) and hook
+                         file. The md5 checksum is only recomputed when the
+                         stat key (mtime, size) of the file changed.
 db["parsed_dict"]: pickled raw parsed dictionary (as returned by
                    raw_parse, before having been seen by the visitor)
+db["package_options"] : pickled PackageOptions instance
+db["packages"] : dictionary {user_flags key: pickled PackageDescription},
+                 one entry for each set of user flags seen since the last
+                 modification of the bento files.
 """
 import os
 import sys
@@ -41,23 +45,46 @@ except ImportError:
 class CachedPackage(object):
     def __init__(self, db_node):
         self._db_location = db_node
+        self._cache = None
+
+    def _get_cache(self):
+        if self._cache is None:
+            self._cache = _CachedPackageImpl(self._db_location.abspath())
+        return self._cache
 
     def get_package(self, bento_info, user_flags=None):
-        cache = _CachedPackageImpl(self._db_location.abspath())
+        cache = self._get_cache()
         try:
             return cache.get_package(bento_info, user_flags)
         finally:
             cache.close()
 
     def get_options(self, bento_info):
-        cache = _CachedPackageImpl(self._db_location.abspath())
+        cache = self._get_cache()
         try:
             return cache.get_options(bento_info)
         finally:
             cache.close()
 
+def _stat_key(filename):
+    st = os.stat(filename)
+    return (st.st_mtime, st.st_size)
+
+def _checksum(filename):
+    fid = open(filename, "rb")
+    try:
+        return md5(fid.read()).hexdigest()
+    finally:
+        fid.close()
+
+def _user_flags_key(user_flags):
+    if user_flags is None:
+        return None
+    else:
+        return tuple(sorted(user_flags.items()))
+
 class _CachedPackageImpl(object):
-    __version__ = "2"
+    __version__ = "3"
     __magic__ = "CACHED_PACKAGE_BENTOMAGIC"
 
     def _has_valid_magic(self, db):
@@ -74,50 +101,75 @@ class _CachedPackageImpl(object):
         self.db = {}
         self.db["magic"] = self.__magic__
         self.db["version"] = self.__version__
-        self._first_time = True
+        self.db["packages"] = {}
+        self._modified = True
+        self._validated = False
 
     def _load_existing_cache(self, db_location):
         fid = open(db_location, "rb")
         try:
             db = pickle.load(fid)
-            if not self._has_valid_magic(db):
-                warnings.warn("Resetting invalid cached db")
-                self._reset()
         finally:
             fid.close()
 
-        version = db["version"]
-        if version != self.__version__:
+        if not self._has_valid_magic(db):
+            warnings.warn("Resetting invalid cached db")
+            self._reset()
+        elif db["version"] != self.__version__:
             warnings.warn("Resetting invalid version of cached db")
             self._reset()
-
-        return db
+        else:
+            self.db = db
 
     def __init__(self, db_location):
         self._location = db_location
-        self._first_time = False
+        # True if the db needs to be written back
+        self._modified = False
+        # True once the bento files have been checked against the db
+        self._validated = False
         if not os.path.exists(db_location):
             bento.utils.path.ensure_dir(db_location)
             self._reset()
         else:
             try:
-                self.db = self._load_existing_cache(db_location)
+                self._load_existing_cache(db_location)
             except Exception:
                 e = extract_exception()
                 warnings.warn("Resetting invalid cached db: (reason: %r)" % e)
                 self._reset()
 
     def _has_invalidated_cache(self):
-        if "bentos_checksums" in self.db:
-            r_checksums = pickle.loads(self.db["bentos_checksums"])
-            for f in r_checksums:
-                checksum = md5(open(f, "rb").read()).hexdigest()
-                if checksum != r_checksums[f]:
-                    return True
-            return False
-        else:
+        if not "bentos_checksums" in self.db:
             return True
 
+        r_checksums = pickle.loads(self.db["bentos_checksums"])
+        updated = False
+        for f in r_checksums:
+            stat_key, checksum = r_checksums[f]
+            try:
+                new_stat_key = _stat_key(f)
+            except OSError:
+                return True
+            if new_stat_key != stat_key:
+                if _checksum(f) != checksum:
+                    return True
+                # Touched but unchanged: remember the new stat key to avoid
+                # computing the checksum again next time
+                r_checksums[f] = (new_stat_key, checksum)
+                updated = True
+        if updated:
+            self.db["bentos_checksums"] = pickle.dumps(r_checksums)
+            self._modified = True
+        return False
+
+    def _validate(self):
+        """Drop every cached entry if any bento file changed. Files are only
+        checked once per instance."""
+        if not self._validated:
+            if self._has_invalidated_cache():
+                self._reset()
+            self._validated = True
+
     def get_package(self, bento_info, user_flags=None):
         try:
             return self._get_package(bento_info, user_flags)
@@ -128,23 +180,21 @@ class _CachedPackageImpl(object):
             return self._get_package(bento_info, user_flags)
 
     def _get_package(self, bento_info, user_flags=None):
-        if self._first_time:
-            self._first_time = False
-            return _create_package_nocached(bento_info, user_flags, self.db)
+        self._validate()
+        key = _user_flags_key(user_flags)
+        packages = self.db["packages"]
+        if key in packages:
+            return pickle.loads(packages[key])
+        elif "parsed_dict" in self.db:
+            raw = pickle.loads(self.db["parsed_dict"])
+            pkg, files = _raw_to_pkg(raw, user_flags, bento_info)
+            _update_checksums(bento_info, files, self.db)
+            packages[key] = pickle.dumps(pkg)
+            self._modified = True
+            return pkg
         else:
-            if self._has_invalidated_cache():
-                return _create_package_nocached(bento_info, user_flags, self.db)
-            else:
-                r_user_flags = pickle.loads(self.db["user_flags"])
-                if user_flags is None:
-                    # FIXME: this case is wrong
-                    return pickle.loads(self.db["package_description"])
-                elif r_user_flags != user_flags:
-                    return _create_package_nocached(bento_info, user_flags, self.db)
-                else:
-                    raw = pickle.loads(self.db["parsed_dict"])
-                    pkg, files = _raw_to_pkg(raw, user_flags, bento_info)
-                    return pkg
+            self._modified = True
+            return _create_package_nocached(bento_info, user_flags, self.db)
 
     def get_options(self, bento_info):
         try:
@@ -156,18 +206,17 @@ class _CachedPackageImpl(object):
             return self._get_options(bento_info)
 
     def _get_options(self, bento_info):
-        if self._first_time:
-            self._first_time = False
-            return _create_options_nocached(bento_info, {}, self.db)
+        self._validate()
+        if "package_options" in self.db:
+            return pickle.loads(self.db["package_options"])
         else:
-            if self._has_invalidated_cache():
-                return _create_options_nocached(bento_info, {}, self.db)
-            else:
-                raw = pickle.loads(self.db["parsed_dict"])
-                return _raw_to_options(raw)
+            self._modified = True
+            return _create_options_nocached(bento_info, {}, self.db)
 
     def close(self):
-        bento.utils.io2.safe_write(self._location, lambda fd: pickle.dump(self.db, fd))
+        if self._modified:
+            bento.utils.io2.safe_write(self._location, lambda fd: pickle.dump(self.db, fd))
+            self._modified = False
 
 def _create_package_nocached(bento_info, user_flags, db):
     pkg, options = _create_objects_no_cached(bento_info, user_flags, db)
@@ -186,21 +235,32 @@ def _raw_to_pkg(raw, user_flags, bento_info):
     pkg = PackageDescription(**kw)
     return pkg, files
 
-def _create_objects_no_cached(bento_info, user_flags, db):
+def _update_checksums(bento_info, files, db):
+    """Add the given files, relative to bento_info, to the checksums of db.
+
+    Subentos and hook files may depend on the user flags, hence this is
+    done for every set of user flags."""
     d = os.path.dirname(bento_info.abspath())
+    checksums = pickle.loads(db["bentos_checksums"])
+    for f in files:
+        f = os.path.join(d, f)
+        if not f in checksums:
+            checksums[f] = (_stat_key(f), _checksum(f))
+    db["bentos_checksums"] = pickle.dumps(checksums)
+
+def _create_objects_no_cached(bento_info, user_flags, db):
     info_file = open(bento_info.abspath(), 'r')
     try:
         data = info_file.read()
         raw = raw_parse(data, bento_info.abspath())
 
         pkg, files = _raw_to_pkg(raw, user_flags, bento_info)
-        files = [os.path.join(d, f) for f in files]
         options = _raw_to_options(raw)
 
-        checksums = [md5(open(f, "rb").read()).hexdigest() for f in files]
-        db["bentos_checksums"] = pickle.dumps(dict(zip(files, checksums)))
-        db["package_description"] = pickle.dumps(pkg)
-        db["user_flags"] = pickle.dumps(user_flags)
+        db["bentos_checksums"] = pickle.dumps({})
+        _update_checksums(bento_info, files, db)
+        db["packages"][_user_flags_key(user_flags)] = pickle.dumps(pkg)
+        db["package_options"] = pickle.dumps(options)
         db["parsed_dict"] = pickle.dumps(raw)
 
         return pkg, options
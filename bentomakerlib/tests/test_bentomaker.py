@@ -90,6 +90,11 @@ class TestMain(Common):
     def test_help_non_existing_command(self):
         self.assertRaises(UsageException, lambda: main(["help", "floupi"]))
 
+    def test_trace_write_failure(self):
+        # A trace which cannot be written must not hide the command error
+        trace = op.join(self.d, "nonexistent", "trace.json")
+        self.assertRaises(UsageException, lambda: main(["--trace=%s" % trace, "help", "floupi"]))
+
     def test_configure_help(self):
         bento_info = """\
 Name: foo
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+
+import os.path as op
+
+from bento.compat.api.moves \
+    import \
+        unittest
+from bento.core.node \
+    import \
+        create_base_nodes
+
+import bentomakerlib.package_cache
+from bentomakerlib.package_cache \
+    import \
+        CachedPackage
+
+BENTO_INFO = """\
+Name: foo
+
+Flag: debug
+    Description: debug flag
+    Default: true
+
+Library:
+    if flag(debug):
+        Modules: foo
+    else:
+        Modules: bar
+"""
+
+class TestCachedPackage(unittest.TestCase):
+    def setUp(self):
+        self.d = tempfile.mkdtemp()
+        self.top_node, self.build_node, self.run_node = \
+            create_base_nodes(self.d, op.join(self.d, "build"), self.d)
+        self.bento_info = self.top_node.make_node("bento.info")
+        self.bento_info.write(BENTO_INFO)
+        self.db_node = self.build_node.make_node("cache.db")
+
+        self.nparses = 0
+        self.old_raw_parse = bentomakerlib.package_cache.raw_parse
+        def _raw_parse(*a, **kw):
+            self.nparses += 1
+            return self.old_raw_parse(*a, **kw)
+        bentomakerlib.package_cache.raw_parse = _raw_parse
+
+    def tearDown(self):
+        bentomakerlib.package_cache.raw_parse = self.old_raw_parse
+        shutil.rmtree(self.d)
+
+    def _get_package(self, user_flags):
+        return CachedPackage(self.db_node).get_package(self.bento_info, user_flags)
+
+    def test_multiple_flags(self):
+        pkg = self._get_package({"debug": True})
+        self.assertEqual(pkg.py_modules, ["foo"])
+        pkg = self._get_package({"debug": False})
+        self.assertEqual(pkg.py_modules, ["bar"])
+        self.assertEqual(self.nparses, 1)
+
+        # Both configurations are now cached
+        mtime = os.stat(self.db_node.abspath()).st_mtime
+        for i in range(2):
+            self.assertEqual(self._get_package({"debug": True}).py_modules, ["foo"])
+            self.assertEqual(self._get_package({"debug": False}).py_modules, ["bar"])
+        self.assertEqual(self.nparses, 1)
+
+        # Nothing changed, so the db should not have been rewritten
+        self.assertEqual(os.stat(self.db_node.abspath()).st_mtime, mtime)
+
+    def test_options(self):
+        cached_package = CachedPackage(self.db_node)
+        options = cached_package.get_options(self.bento_info)
+        self.assertEqual(list(options.flag_options.keys()), ["debug"])
+        cached_package.get_package(self.bento_info, {"debug": False})
+        self.assertEqual(self.nparses, 1)
+
+    def test_invalidation(self):
+        self._get_package({"debug": True})
+
+        # Touching the file without modifying it keeps the cache valid
+        st = os.stat(self.bento_info.abspath())
+        os.utime(self.bento_info.abspath(), (st.st_atime, st.st_mtime + 10))
+        self._get_package({"debug": True})
+        self.assertEqual(self.nparses, 1)
+
+        self.bento_info.write(BENTO_INFO.replace("Modules: bar", "Modules: fubar"))
+        st = os.stat(self.bento_info.abspath())
+        os.utime(self.bento_info.abspath(), (st.st_atime, st.st_mtime + 20))
+        pkg = self._get_package({"debug": False})
+        self.assertEqual(pkg.py_modules, ["fubar"])
+        self.assertEqual(self.nparses, 2)
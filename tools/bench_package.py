@@ -0,0 +1,249 @@
+"""
+Benchmark bentomaker on a synthetic package of configurable size.
+
+The package is generated with the bento.core.testing helpers: packages,
+modules, C extensions, data files globs and subentos. Each bentomaker step
+(configure, cold build, no-op build, install, sdist and build_egg) is run in
+a fresh interpreter, from a clean build directory for each run. Parsing of
+the package description (subentos included) is timed in-process, with the
+subentos cache cleared before each run.
+
+Results may be saved as JSON, and compared against a previously saved
+baseline: the script exits with status 1 if the median time of any step
+regressed by more than the given tolerance. Example::
+
+    python tools/bench_package.py --packages 200 --extensions 20 -o base.json
+    # ... change bento ...
+    python tools/bench_package.py --packages 200 --extensions 20 --baseline base.json
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+import os.path as op
+
+ROOT = op.abspath(op.join(op.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+
+import bento.core.package
+
+from bento.compat.api \
+    import \
+        json
+from bento.core.node \
+    import \
+        create_base_nodes
+from bento.core.package \
+    import \
+        PackageDescription
+from bento.core.testing \
+    import \
+        create_fake_package_from_bento_infos
+
+STEPS = ["parse", "configure", "build (cold)", "build (no-op)", "install", "sdist", "build_egg"]
+
+# Only compiled and linked, never imported: no python 2/3 specific API
+EXTENSION_C = r"""\
+#include <Python.h>
+
+int bench_%(name)s(void)
+{
+    return Py_None != NULL;
+}
+"""
+
+DATA_FILES_PER_GLOB = 10
+
+def generate_bento_infos(n_packages, n_modules, n_extensions, n_data_files, n_subentos):
+    """Return the bento.info files of the synthetic package, as a
+    {relative path: content} dict."""
+    lines = ["Name: bench", "Version: 1.0", "Summary: synthetic package", ""]
+    for i in range(n_data_files):
+        lines += ["DataFiles: data%d" % i,
+                  "    SourceDir: data/data%d" % i,
+                  "    TargetDir: $pkgdatadir/data%d" % i,
+                  "    Files: *.txt", ""]
+    if n_subentos > 0:
+        lines += ["Recurse: " + ", ".join(["sub%d" % i for i in range(n_subentos)]), ""]
+    lines += ["Library:",
+              "    Packages: " + ", ".join(["bench"] + ["bench.pkg%d" % i for i in range(n_packages)])]
+    if n_modules > 0:
+        lines.append("    Modules: " + ", ".join(["bench_mod%d" % i for i in range(n_modules)]))
+    for i in range(n_extensions):
+        lines += ["    Extension: bench._ext%d" % i,
+                  "        Sources: src/ext%d.c" % i]
+    lines.append("")
+
+    bento_infos = {"bento.info": "\n".join(lines)}
+    for i in range(n_subentos):
+        bento_infos["sub%d/bento.info" % i] = "Library:\n    Packages: subpkg%d\n" % i
+    return bento_infos
+
+def setup_package(d, o):
+    bento_infos = generate_bento_infos(o.packages, o.modules, o.extensions, o.data_files,
+                                       o.subentos)
+    top_node, build_node, run_node = create_base_nodes(d, op.join(d, "build"), d)
+    # subentos are looked up from the current directory
+    old_cwd = os.getcwd()
+    os.chdir(d)
+    try:
+        create_fake_package_from_bento_infos(top_node, bento_infos)
+    finally:
+        os.chdir(old_cwd)
+
+    for i in range(o.extensions):
+        top_node.make_node("src/ext%d.c" % i).write(EXTENSION_C % {"name": "ext%d" % i})
+    for i in range(o.data_files):
+        data_node = top_node.make_node("data/data%d" % i)
+        data_node.mkdir()
+        for j in range(DATA_FILES_PER_GLOB):
+            data_node.make_node("file%d.txt" % j).write("data %d\n" % j)
+
+def run_bentomaker(python, argv, cwd):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT] + [p for p in [env.get("PYTHONPATH")] if p])
+    p = subprocess.Popen([python, "-m", "bentomakerlib.bentomaker"] + argv, cwd=cwd, env=env,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    # Answer the confirmation asked when run as root
+    out = p.communicate("y\n".encode("ascii"))[0]
+    if p.returncode != 0:
+        raise RuntimeError("bentomaker %s failed:\n%s" % (" ".join(argv), out.decode("utf-8", "replace")))
+
+def time_parse(d):
+    old_cwd = os.getcwd()
+    os.chdir(d)
+    try:
+        # Parsed subentos are cached in-process: time a cold parse each run
+        bento.core.package._SUBENTOS_CACHE.clear()
+        tic = time.time()
+        PackageDescription.from_file("bento.info")
+        return time.time() - tic
+    finally:
+        os.chdir(old_cwd)
+
+def time_bentomaker(python, argv, cwd):
+    tic = time.time()
+    run_bentomaker(python, argv, cwd)
+    return time.time() - tic
+
+def run_steps(python, d):
+    """Run every step once from a clean build directory, and return the
+    {step: time} dict."""
+    for name in ["build", "dist", "inst"]:
+        if op.exists(op.join(d, name)):
+            shutil.rmtree(op.join(d, name))
+
+    ret = {}
+    ret["parse"] = time_parse(d)
+    ret["configure"] = time_bentomaker(python, ["configure", "--prefix=%s" % op.join(d, "inst")], d)
+    ret["build (cold)"] = time_bentomaker(python, ["build"], d)
+    ret["build (no-op)"] = time_bentomaker(python, ["build"], d)
+    ret["install"] = time_bentomaker(python, ["install"], d)
+    ret["sdist"] = time_bentomaker(python, ["sdist"], d)
+    ret["build_egg"] = time_bentomaker(python, ["build_egg"], d)
+    return ret
+
+def summarize(timings):
+    summary = {}
+    for step, values in timings.items():
+        values = sorted(values)
+        summary[step] = {"min": values[0], "median": values[len(values) // 2]}
+    return summary
+
+def compare(results, baseline, tolerance):
+    """Print the comparison of the results against the baseline, and return
+    the list of the steps whose median time regressed by more than
+    tolerance."""
+    if results["parameters"] != baseline["parameters"]:
+        print("Warning: baseline generated with different parameters: %r" % baseline["parameters"])
+    regressions = []
+    print("%-16s %14s %14s %8s" % ("step", "baseline (s)", "median (s)", "ratio"))
+    for step in STEPS:
+        if step not in baseline["summary"]:
+            continue
+        ref = baseline["summary"][step]["median"]
+        value = results["summary"][step]["median"]
+        ratio = value / max(ref, 1e-6)
+        if ratio > 1 + tolerance:
+            regressions.append(step)
+            flag = "  REGRESSION"
+        else:
+            flag = ""
+        print("%-16s %14.3f %14.3f %8.2f%s" % (step, ref, value, ratio, flag))
+    return regressions
+
+def read_json(filename):
+    fid = open(filename)
+    try:
+        return json.load(fid)
+    finally:
+        fid.close()
+
+def write_json(filename, data):
+    fid = open(filename, "w")
+    try:
+        json.dump(data, fid, indent=2, sort_keys=True)
+    finally:
+        fid.close()
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-n", "--repeat", type="int", default=3,
+                      help="Number of runs of each step (default: %default)")
+    parser.add_option("--python", default=sys.executable,
+                      help="Python interpreter running bentomaker (default: %default)")
+    parser.add_option("--packages", type="int", default=50,
+                      help="Number of packages (default: %default)")
+    parser.add_option("--modules", type="int", default=50,
+                      help="Number of modules (default: %default)")
+    parser.add_option("--extensions", type="int", default=5,
+                      help="Number of C extensions (default: %default)")
+    parser.add_option("--data-files", type="int", default=10, dest="data_files",
+                      help="Number of data files sections, each with a glob matching %d files "
+                           "(default: %%default)" % DATA_FILES_PER_GLOB)
+    parser.add_option("--subentos", type="int", default=10,
+                      help="Number of subentos (default: %default)")
+    parser.add_option("-o", "--output",
+                      help="Save the results in the given JSON file")
+    parser.add_option("--baseline",
+                      help="Compare the results against the given JSON file, saved with -o")
+    parser.add_option("--tolerance", type="float", default=0.2,
+                      help="Relative slow down of a step median time above which it is a "
+                           "regression (default: %default)")
+    o, a = parser.parse_args(argv)
+
+    parameters = {"packages": o.packages, "modules": o.modules, "extensions": o.extensions,
+                  "data_files": o.data_files, "subentos": o.subentos}
+    timings = dict([(step, []) for step in STEPS])
+
+    d = tempfile.mkdtemp()
+    try:
+        setup_package(d, o)
+        for i in range(o.repeat):
+            for step, value in run_steps(o.python, d).items():
+                timings[step].append(value)
+    finally:
+        shutil.rmtree(d)
+
+    results = {"parameters": parameters, "python": o.python, "timings": timings,
+               "summary": summarize(timings)}
+
+    print("%-16s %10s %10s" % ("step", "min (s)", "median (s)"))
+    for step in STEPS:
+        print("%-16s %10.3f %10.3f" % (step, results["summary"][step]["min"],
+                                       results["summary"][step]["median"]))
+
+    if o.output:
+        write_json(o.output, results)
+    if o.baseline:
+        print("")
+        if compare(results, read_json(o.baseline), o.tolerance):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Benchmark the bento.info lexer and parser.
+
+Every .info file of the bento/testing/bentos corpus is lexed and parsed,
+together with generated bento.info files declaring many extensions and
+subentos. The single pass tokenizer is compared with the reference PLY based
+lexing stages. Example::
+
+    python tools/bench_parser.py -n 10 --extensions 500
+"""
+import os
+import sys
+import time
+import optparse
+
+import os.path as op
+
+ROOT = op.abspath(op.join(op.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+
+import bento.testing.bentos
+
+from bento.parser.lexer \
+    import \
+        MyLexer, remove_comments, tokenize
+from bento.parser.parser \
+    import \
+        parse
+
+def generate_bento_info(n_extensions, n_subentos):
+    lines = ["Name: bench", "Version: 1.0", "Summary: generated package",
+             "Description:", "    Generated package, # not a comment", "",
+             "Flag: debug", "    Description: debug build", "    Default: false", "",
+             "Library:", "    Packages:", "        bench, bench.sub", "    if flag(debug):",
+             "        Modules: bench_debug"]
+    for i in range(n_extensions):
+        lines += ["    Extension: bench._ext%d" % i,
+                  "        Sources:",
+                  "            src/ext%d/module.c," % i,
+                  "            src/ext%d/helper\\ file.c # escaped space" % i,
+                  "        IncludeDirs: include", ""]
+    if n_subentos > 0:
+        lines.append("Recurse: " + ", ".join(["sub%d" % i for i in range(n_subentos)]))
+    lines.append("")
+    return "\n".join(lines)
+
+def reference_lex(data):
+    lexer = MyLexer(stage="indent_generated")
+    lexer.input(data)
+    return list(remove_comments(lexer.token_stream))
+
+def fast_lex(data):
+    return tokenize(data)
+
+def post_processed_lex(data):
+    lexer = MyLexer(stage="post_processed")
+    lexer.input(data)
+    return list(lexer)
+
+def timeit(func, data, repeat):
+    timings = []
+    for i in range(repeat):
+        tic = time.time()
+        func(data)
+        timings.append(time.time() - tic)
+    timings.sort()
+    return timings[0], timings[len(timings) // 2]
+
+def corpus():
+    d = op.dirname(bento.testing.bentos.__file__)
+    ret = []
+    for f in sorted(os.listdir(d)):
+        if f.endswith(".info"):
+            fid = open(op.join(d, f))
+            try:
+                ret.append((f, fid.read()))
+            finally:
+                fid.close()
+    return ret
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-n", "--repeat", type="int", default=5,
+                      help="Number of runs for each file (default: %default)")
+    parser.add_option("--extensions", type="int", default=200,
+                      help="Number of extensions in the generated bento.info (default: %default)")
+    parser.add_option("--subentos", type="int", default=100,
+                      help="Number of subentos in the generated bento.info (default: %default)")
+    o, a = parser.parse_args(argv)
+
+    inputs = corpus()
+    inputs.append(("generated (%d ext.)" % o.extensions,
+                   generate_bento_info(o.extensions, o.subentos)))
+
+    benchmarks = [("reference lex", reference_lex), ("tokenize", fast_lex),
+                  ("post_processed", post_processed_lex), ("parse", parse)]
+    print("%-24s %-16s %10s %10s" % ("file", "step", "min (ms)", "median (ms)"))
+    for name, data in inputs:
+        if [(t.type, t.value) for t in reference_lex(data)] != \
+                [(t.type, t.value) for t in fast_lex(data)]:
+            raise RuntimeError("tokenize and reference lexer disagree on %s" % name)
+        for step, func in benchmarks:
+            best, median = timeit(func, data, o.repeat)
+            print("%-24s %-16s %10.3f %10.3f" % (name, step, 1e3 * best, 1e3 * median))
+
+if __name__ == "__main__":
+    main()
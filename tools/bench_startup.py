@@ -0,0 +1,82 @@
+"""
+Benchmark bentomaker startup time.
+
+Each command is run in a fresh interpreter on a small pure python package,
+after an initial configure + build so that build is a no-op. Example::
+
+    python tools/bench_startup.py -n 10
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import optparse
+import subprocess
+
+import os.path as op
+
+ROOT = op.abspath(op.join(op.dirname(__file__), os.pardir))
+
+BENTO_INFO = """\
+Name: bench
+Version: 1.0
+
+Library:
+    Packages: bench
+"""
+
+COMMANDS = [
+    ["--version"],
+    ["help"],
+    ["build"],
+    ["build", "--help"],
+]
+
+def run_bentomaker(python, argv, cwd):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT] + [p for p in [env.get("PYTHONPATH")] if p])
+    p = subprocess.Popen([python, "-m", "bentomakerlib.bentomaker"] + argv, cwd=cwd, env=env,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    # Answer the confirmation asked when run as root
+    out = p.communicate("y\n".encode("ascii"))[0]
+    if p.returncode != 0:
+        raise RuntimeError("bentomaker %s failed:\n%s" % (" ".join(argv), out.decode("utf-8", "replace")))
+
+def setup_package(d):
+    f = open(op.join(d, "bento.info"), "w")
+    try:
+        f.write(BENTO_INFO)
+    finally:
+        f.close()
+    os.makedirs(op.join(d, "bench"))
+    open(op.join(d, "bench", "__init__.py"), "w").close()
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-n", "--repeat", type="int", default=5,
+                      help="Number of runs for each command (default: %default)")
+    parser.add_option("--python", default=sys.executable,
+                      help="Python interpreter to benchmark (default: %default)")
+    o, a = parser.parse_args(argv)
+
+    d = tempfile.mkdtemp()
+    try:
+        setup_package(d)
+        run_bentomaker(o.python, ["configure"], d)
+        run_bentomaker(o.python, ["build"], d)
+
+        print("%-20s %10s %10s" % ("command", "min (s)", "median (s)"))
+        for cmd in COMMANDS:
+            timings = []
+            for i in range(o.repeat):
+                tic = time.time()
+                run_bentomaker(o.python, cmd, d)
+                timings.append(time.time() - tic)
+            timings.sort()
+            print("%-20s %10.3f %10.3f" % (" ".join(cmd), timings[0], timings[len(timings) // 2]))
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()